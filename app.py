@@ -18,38 +18,53 @@
 # You should have received a copy of the GNU General Public License along
 # with this program.  If not, see <http://www.gnu.org/licenses/>.
 """Web UI for exploring a Toolfroge Kubernetes cluster."""
-import collections
-import datetime
+import functools
 import logging
 import os
+import time
 
 import flask
-import natsort
 import yaml
 
+import k8s.api
+import k8s.cache
+import k8s.circuit
 import k8s.client
+import k8s.instrumentation
+import k8s.pages
+import k8s.records
+import k8s.tables
 
 
 app = flask.Flask(__name__)
 
-# Load configuration from YAML file(s).
+# Load configuration from YAML file(s), with the libyaml parser if available.
 # See default_config.yaml for more information
 __dir__ = os.path.dirname(__file__)
+_loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 app.config.update(
-    yaml.safe_load(open(os.path.join(__dir__, "default_config.yaml")))
+    yaml.load(open(os.path.join(__dir__, "default_config.yaml")), _loader)
 )
 try:
     app.config.update(
-        yaml.safe_load(open(os.path.join(__dir__, "config.yaml")))
+        yaml.load(open(os.path.join(__dir__, "config.yaml")), _loader)
     )
 except IOError:
     # It is ok if there is no local config file
     pass
 
 logging.getLogger().addHandler(flask.logging.default_handler)
+k8s.instrumentation.init_app(app)
+app.add_template_global(k8s.tables.url, "table_url")
+app.register_blueprint(k8s.api.blueprint)
 
 
 @app.route("/")
+@k8s.pages.cached_page
+@k8s.pages.batched(
+    k8s.client.get_namespace_summary.key(),
+    k8s.client.get_summary_metrics.key(),
+)
 def home():
     """Show basic cluster info."""
     ctx = {}
@@ -58,15 +73,13 @@ def home():
         ctx.update(
             {
                 "version": k8s.client.get_version(),
-                "pods": k8s.client.get_pods_by_namespace(cached=cached),
+                "namespaces": k8s.client.get_namespace_summary(cached=cached),
                 "metrics": k8s.client.get_summary_metrics(cached=cached),
-                "namespaces": k8s.client.get_active_namespaces(cached=cached)[
-                    "namespaces"
-                ],
             }
         )
     except Exception:
         app.logger.exception("Error collecting statistics")
+        k8s.pages.incomplete()
     return flask.render_template("home.html", **ctx)
 
 
@@ -84,39 +97,38 @@ def healthz():
     return "ok"
 
 
+@app.route("/metrics")
+def metrics():
+    """Expose Prometheus metrics."""
+    body, content_type = k8s.instrumentation.exposition()
+    return flask.Response(body, content_type=content_type)
+
+
 @app.route("/nodes/")
+@k8s.pages.cached_page
+@k8s.pages.batched(k8s.client.get_node_table.key())
 def nodes():
     """List nodes."""
     ctx = {}
     try:
         cached = "purge" not in flask.request.args
-        pods = collections.defaultdict(int)
-        for pod in k8s.client.get_all_pods(cached=cached)["items"]:
-            if pod.status.phase == "Succeeded":
-                continue
-            pods[pod.spec.node_name] += 1
-
-        ctx.update(
-            {
-                "nodes": natsort.natsorted(
-                    k8s.client.get_nodes(cached=cached)["items"],
-                    key=lambda node: node.metadata.name,
-                ),
-                "metrics": {
-                    m["metadata"]["name"]: m
-                    for m in k8s.client.get_nodes_metrics(cached=cached)[
-                        "items"
-                    ]
-                },
-                "pods": pods,
-            }
-        )
+        table = k8s.client.get_node_table(cached=cached)["table"]
+        ctx.update({"nodes": k8s.tables.window(table)})
     except Exception:
         app.logger.exception("Error collecting nodes")
+        k8s.pages.incomplete()
     return flask.render_template("nodes.html", **ctx)
 
 
 @app.route("/nodes/<name>/")
+@k8s.pages.batched(
+    k8s.client.get_pod_usage.key(),
+    lambda name: [
+        k8s.client.get_node.key(name),
+        k8s.client.get_node_metrics.key(name),
+        k8s.client.get_node_pods.key(name),
+    ],
+)
 def node(name):
     """Describe a node."""
     ctx = {}
@@ -125,41 +137,50 @@ def node(name):
         ctx.update(
             {
                 "node": k8s.client.get_node(name, cached=cached)["node"],
-                "metrics": k8s.client.get_node_metrics(name, cached=cached)[
-                    "metrics"
-                ],
-                "pods": [
-                    pod
-                    for pod in k8s.client.get_all_pods(cached=cached)["items"]
-                    if pod.spec.node_name == name
-                ],
+                "metrics": k8s.client.node_metrics(name, cached=cached),
             }
         )
+        pods = k8s.client.get_node_pods(name, cached=cached)["items"]
+        table = k8s.client.pod_table(pods)
+        ctx.update({"pod_count": len(table), "pods": k8s.tables.window(table)})
+        usage = k8s.client.get_pod_usage(cached=cached)["nodes"]
+        ctx.update({"usage": usage.get(name)})
+    except k8s.cache.NotFound:
+        flask.flash("Node {} not found.".format(name), "danger")
+        return flask.redirect(flask.url_for("nodes"))
     except Exception:
         app.logger.exception("Error collecting node")
     return flask.render_template("node.html", **ctx)
 
 
 @app.route("/namespaces/")
+@k8s.pages.cached_page
+@k8s.pages.batched(k8s.client.get_namespace_summary.key())
 def namespaces():
     """List namespaces."""
     ctx = {}
     try:
         cached = "purge" not in flask.request.args
+        summary = k8s.client.get_namespace_summary(cached=cached)
         ctx.update(
             {
-                "namespaces": k8s.client.get_namespaces(cached=cached),
-                "active": k8s.client.get_active_namespaces(cached=cached)[
-                    "namespaces"
-                ],
+                "namespaces": summary,
+                "tools": k8s.tables.window(summary["tools"]),
             }
         )
     except Exception:
         app.logger.exception("Error collecting namespaces")
+        k8s.pages.incomplete()
     return flask.render_template("namespaces.html", **ctx)
 
 
 @app.route("/namespaces/<namespace>/")
+@k8s.pages.batched(
+    k8s.client.get_pod_usage.key(),
+    lambda namespace: [
+        f.key(namespace) for _, f in k8s.client.NAMESPACE_COLLECTORS
+    ],
+)
 def namespace(namespace):
     """Get details for a given namespace."""
     ctx = {
@@ -167,30 +188,28 @@ def namespace(namespace):
     }
     try:
         cached = "purge" not in flask.request.args
-        ctx.update(
-            {
-                "pods": k8s.client.get_pods(namespace, cached=cached),
-                "services": k8s.client.get_services(namespace, cached=cached),
-                "ingresses": k8s.client.get_ingresses(
-                    namespace, cached=cached
-                ),
-                "daemonsets": k8s.client.get_daemonsets(
-                    namespace, cached=cached
-                ),
-                "deployments": k8s.client.get_deployments(
-                    namespace, cached=cached
-                ),
-                "replicasets": k8s.client.get_replicasets(
-                    namespace, cached=cached
-                ),
-                "statefulsets": k8s.client.get_statefulsets(
-                    namespace, cached=cached
-                ),
-                "cronjobs": k8s.client.get_cronjobs(namespace, cached=cached),
-                "jobs": k8s.client.get_jobs(namespace, cached=cached),
-                "quota": k8s.client.get_quota(namespace, cached=cached),
-            }
+        calls = {
+            name: functools.partial(f, namespace, cached=cached)
+            for name, f in k8s.client.NAMESPACE_COLLECTORS
+        }
+        calls["usage"] = functools.partial(
+            k8s.client.get_pod_usage, cached=cached
         )
+        results, errors = k8s.client.fetch_many(calls)
+        if "usage" in results:
+            results["usage"] = results["usage"]["namespaces"].get(namespace)
+        ctx.update(results)
+        if "pods" in results:
+            table = k8s.client.pod_table(results["pods"]["items"])
+            ctx["pod_page"] = k8s.tables.window(table)
+        for name, error in sorted(errors.items()):
+            app.logger.warning(
+                "Error collecting %s for namespace %s",
+                name,
+                namespace,
+                exc_info=error,
+            )
+            flask.flash("Unable to load {}.".format(name), "warning")
     except Exception:
         app.logger.exception("Error collecting namespace %s", namespace)
     return flask.render_template("namespace.html", **ctx)
@@ -207,6 +226,8 @@ def pod(namespace, pod):
         ctx.update(
             {"pod": k8s.client.get_pod(namespace, pod, cached=cached)["pod"]}
         )
+    except k8s.cache.NotFound:
+        pass
     except Exception:
         app.logger.exception("Error collecting namespace %s", namespace)
     if "pod" in ctx and ctx["pod"]:
@@ -231,6 +252,8 @@ def ingress(namespace, name):
                 )["ingress"],
             }
         )
+    except k8s.cache.NotFound:
+        pass
     except Exception:
         app.logger.exception("Error collecting namespace %s", namespace)
     if "ingress" in ctx and ctx["ingress"]:
@@ -241,18 +264,23 @@ def ingress(namespace, name):
 
 
 @app.route("/images/")
+@k8s.pages.cached_page
+@k8s.pages.batched(k8s.client.get_images.key())
 def images():
     """List all images in use on the cluster."""
     ctx = {}
     try:
         cached = "purge" not in flask.request.args
-        ctx.update({"images": k8s.client.get_images(cached=cached)})
+        table = k8s.client.get_images(cached=cached)["table"]
+        ctx.update({"images": k8s.tables.window(table)})
     except Exception:
         app.logger.exception("Error collecting images")
+        k8s.pages.incomplete()
     return flask.render_template("images.html", **ctx)
 
 
 @app.route("/images/<path:name>/")
+@k8s.pages.batched(lambda name: [k8s.client.get_image_containers.key(name)])
 def image(name):
     """List pods using an image."""
     ctx = {
@@ -260,14 +288,25 @@ def image(name):
     }
     try:
         cached = "purge" not in flask.request.args
-        ctx.update(
-            {"pods": k8s.client.get_images(cached=cached)["items"][name]}
+        table = k8s.tables.Table(
+            k8s.client.get_image_containers(name, cached=cached)["items"],
+            k8s.client.CONTAINER_COLUMNS,
+            text=" ".join,
         )
+        ctx.update({"pods": k8s.tables.window(table)})
     except Exception:
         app.logger.exception("Error collecting image '%s'", name)
     return flask.render_template("image.html", **ctx)
 
 
+@app.after_request
+def stale_warning(response):
+    """Warn clients when a response was built from stale values."""
+    if k8s.circuit.stale_since() is not None:
+        response.headers["Warning"] = '110 - "Response is Stale"'
+    return response
+
+
 @app.errorhandler(404)
 def page_not_found(e):
     """Handle 404 errors."""
@@ -281,36 +320,72 @@ def contains(haystack, needle):
     return needle in haystack
 
 
+# Suffixes and lengths in seconds of the units durations are shown in
+DURATION_UNITS = (
+    ("y", 31556952),
+    ("w", 604800),
+    ("d", 86400),
+    ("h", 3600),
+    ("m", 60),
+)
+
+
+def request_now():
+    """Get the time, in epoch seconds, that ages are computed against.
+
+    The time is taken once per request so that every age on a page is
+    relative to the same moment.
+    """
+    if flask.has_app_context():
+        return flask.g.setdefault("now", time.time())
+    return time.time()
+
+
+def format_duration(seconds, max_parts=3):
+    """Format a number of seconds like 1y2w3d."""
+    seconds = abs(seconds)
+    parts = []
+    for suffix, size in DURATION_UNITS:
+        if seconds > size:
+            parts.append("{}{}".format(int(seconds // size), suffix))
+            seconds %= size
+            if len(parts) == max_parts:
+                return "".join(parts)
+    if seconds >= 1:
+        parts.append("{}s".format(int(seconds)))
+    if not parts:
+        parts.append("{}ms".format(int(seconds * 1000)))
+    return "".join(parts[:max_parts])
+
+
 @app.template_filter("duration")
 def duration(start, end=None, max_parts=3):
-    """Compute a duration relative to the current time or a given time."""
+    """Compute a duration relative to the current request or a given time."""
     if start is None:
         return ""
-    if end is None:
-        end = datetime.datetime.now(tz=start.tzinfo)
-    diff_secs = abs((end - start).total_seconds())
-    parts = []
-    if diff_secs > 31556952:
-        parts.append("{}y".format(int(diff_secs // 31556952)))
-        diff_secs = diff_secs % 31556952
-    if diff_secs > 604800:
-        parts.append("{}w".format(int(diff_secs // 604800)))
-        diff_secs = diff_secs % 604800
-    if diff_secs > 86400:
-        parts.append("{}d".format(int(diff_secs // 86400)))
-        diff_secs = diff_secs % 86400
-    if diff_secs > 3600:
-        parts.append("{}h".format(int(diff_secs // 3600)))
-        diff_secs = diff_secs % 3600
-    if diff_secs > 60:
-        parts.append("{}m".format(int(diff_secs // 60)))
-        diff_secs = diff_secs % 60
-    if diff_secs >= 1:
-        parts.append("{}s".format(int(diff_secs)))
-    if not parts:
-        parts.append("{}ms".format(int(diff_secs * 1000)))
-    parts = parts[:max_parts]
-    return "".join(parts)
+    end = request_now() if end is None else end.timestamp()
+    return format_duration(end - start.timestamp(), max_parts)
+
+
+@app.template_filter("ages")
+def ages(rows, attribute, max_parts=3):
+    """Compute the age of a timestamp attribute of each row of a table.
+
+    ``attribute`` may be dotted, as in "metadata.creation_timestamp", and
+    a missing value gives an empty age. Returns the formatted ages in row
+    order so templates can index them with ``loop.index0``.
+    """
+    now = request_now()
+    path = attribute.split(".")
+    ages = []
+    for start in rows:
+        for name in path:
+            start = getattr(start, name, None)
+        if start is None:
+            ages.append("")
+        else:
+            ages.append(format_duration(now - start.timestamp(), max_parts))
+    return ages
 
 
 @app.template_filter("yaml")
@@ -321,8 +396,8 @@ def pprint_yaml(obj):
 
 @app.template_filter("parse_quantity")
 def parse_quantity(obj):
-    """Parse kubernetes quantity like 200Mi to a decimal number."""
-    return k8s.client.parse_quantity(obj)
+    """Parse kubernetes quantity like 200Mi to a number."""
+    return k8s.records.quantity(obj)
 
 
 @app.context_processor
@@ -332,4 +407,13 @@ def inject_base_variables():
         "project": app.config["PROJECT"],
         "toolsadmin_url": app.config["TOOLSADMIN_URL"],
         "banner": app.config.get("BANNER"),
+        "stale_age": stale_age(),
     }
+
+
+def stale_age():
+    """Get the age of the oldest stale value used by the current request."""
+    since = k8s.circuit.stale_since()
+    if since is None:
+        return None
+    return format_duration(request_now() - since, 2)
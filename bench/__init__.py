@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Benchmarks for k8s-status data paths.
+
+Run a benchmark as a module from the repository root, for example::
+
+    python -m bench.deserialize --pods 5000
+"""
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Compare cache codecs on a large synthetic pod list.
+
+Usage::
+
+    python -m bench.codec [--pods N] [--fixture pods.json]
+
+Each available serializer and compression is measured on the value cached
+for ``pods:__all__``, both as slim records and as full kubernetes.client
+models. Codecs which are not installed are skipped.
+"""
+import argparse
+import datetime
+import json
+import time
+
+from k8s import codec
+
+from . import deserialize
+from . import fixtures
+
+
+def payloads(cluster):
+    """Build the cached values to encode, by name."""
+    body = json.dumps(fixtures.object_list("Pod", cluster.pods)).encode()
+    generated = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+    models = kubernetes_models(body)
+    return {
+        "records": (
+            time.time(),
+            {"items": deserialize.raw_path(body), "generated": generated},
+        ),
+        "models": (time.time(), {"items": models, "generated": generated}),
+    }
+
+
+def kubernetes_models(body):
+    """Decode a pod list into kubernetes.client models."""
+    client = deserialize.kubernetes.client.ApiClient()
+    return client.deserialize(deserialize.Response(body), "V1PodList").items
+
+
+def codecs():
+    """List the available (serializer, compression) pairs."""
+    return [
+        (serializer, compression)
+        for serializer, entry in codec.SERIALIZERS.items()
+        if entry[3]
+        for compression, entry in codec.COMPRESSIONS.items()
+        if entry[3]
+    ]
+
+
+def best(f, arg, repeat):
+    """Get the best time in seconds of calling f(arg) and its result."""
+    seconds = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        r = f(arg)
+        seconds = min(seconds, time.perf_counter() - start)
+    return seconds, r
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pods", type=int, default=5000)
+    parser.add_argument("--fixture", help="recorded pod list JSON")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.fixture:
+        cluster = fixtures.Cluster.load(args.fixture)
+    else:
+        cluster = fixtures.Cluster(pods=args.pods)
+    print("{} pods".format(len(cluster.pods)))
+    print(
+        "{:<8} {:<8} {:<6} {:>10} {:>10} {:>10}".format(
+            "payload", "codec", "zip", "KiB", "dumps ms", "loads ms"
+        )
+    )
+    for name, value in payloads(cluster).items():
+        for serializer, compression in codecs():
+            c = codec.Codec(serializer, compression)
+            dumps, raw = best(c.dumps, value, args.repeat)
+            loads, decoded = best(c.loads, raw, args.repeat)
+            if name == "records":
+                assert decoded == value, "{} did not round trip".format(
+                    serializer
+                )
+            print(
+                "{:<8} {:<8} {:<6} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+                    name,
+                    serializer,
+                    compression,
+                    len(raw) / 1024,
+                    dumps * 1000,
+                    loads * 1000,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
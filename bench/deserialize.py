@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Compare decoding a LIST through kubernetes.client models and raw JSON.
+
+Usage::
+
+    python -m bench.deserialize [--pods N] [--fixture pods.json]
+
+``--fixture`` takes a pod list recorded with ``kubectl get pods -A -o json``;
+without it a synthetic list of ``--pods`` pods is generated.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import kubernetes
+import orjson
+
+from k8s import records
+
+from . import fixtures
+
+
+class Response:
+    """Minimal urllib3 response as seen by ApiClient.deserialize."""
+
+    def __init__(self, data):
+        """Wrap a response body."""
+        self.data = data
+
+
+def model_path(body):
+    """Decode with the kubernetes client models then project records."""
+    client = kubernetes.client.ApiClient()
+    pods = client.deserialize(Response(body), "V1PodList")
+    return [records.pod_record(pod) for pod in pods.items]
+
+
+def raw_path(body):
+    """Decode with orjson into Resource wrappers then project records."""
+    data = orjson.loads(body)
+    return [records.pod_record(records.Resource(pod)) for pod in data["items"]]
+
+
+def measure(f, body, repeat):
+    """Get (best seconds, peak bytes) of decoding a body."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f(body)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    f(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pods", type=int, default=5000)
+    parser.add_argument("--fixture", help="recorded pod list JSON")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.fixture:
+        cluster = fixtures.Cluster.load(args.fixture)
+    else:
+        cluster = fixtures.Cluster(pods=args.pods)
+    body = json.dumps(fixtures.object_list("Pod", cluster.pods)).encode()
+
+    assert model_path(body) == raw_path(body), "paths disagree"
+    print(
+        "{} pods, {:.1f} MiB of JSON".format(
+            len(cluster.pods), len(body) / 2**20
+        )
+    )
+    for name, f in (("model", model_path), ("raw", raw_path)):
+        seconds, peak = measure(f, body, args.repeat)
+        print(
+            "{:<6} {:8.3f}s {:8.1f} MiB peak".format(
+                name, seconds, peak / 2**20
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
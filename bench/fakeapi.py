@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Local HTTP server which answers Kubernetes API reads from a fixture.
+
+Serves GET and paginated LIST requests for every resource of a
+fixtures.Cluster, the metrics.k8s.io API and ``/version``. Resources the
+cluster has none of list as empty. WATCH requests
+are held open without events until their timeout.
+"""
+import collections
+import http.server
+import threading
+import time
+import urllib.parse
+
+import kubernetes
+import orjson
+
+from . import fixtures
+
+
+VERSION = {
+    "major": "1",
+    "minor": "21",
+    "gitVersion": "v1.21.8",
+    "gitCommit": "4a3b558c52eb6995b3c5c1db5e54111bd0645a64",
+    "gitTreeState": "clean",
+    "buildDate": "2021-12-15T14:45:23Z",
+    "goVersion": "go1.16.12",
+    "compiler": "gc",
+    "platform": "linux/amd64",
+}
+
+
+def parse_path(path):
+    """Split an API path into (resource, namespace, name).
+
+    ``resource`` is prefixed by the API group for non-core resources, as
+    in fixtures.Cluster.resources.
+    """
+    parts = [part for part in path.split("/") if part]
+    if parts[:1] == ["api"]:
+        group, rest = "", parts[2:]
+    elif parts[:1] == ["apis"] and len(parts) > 3:
+        group, rest = parts[1], parts[3:]
+    else:
+        return None, None, None
+    namespace = None
+    if len(rest) > 2 and rest[0] == "namespaces":
+        namespace, rest = rest[1], rest[2:]
+    resource = "{}/{}".format(group, rest[0]) if group else rest[0]
+    name = rest[1] if len(rest) > 1 else None
+    return resource, namespace, name
+
+
+class FakeAPI(http.server.ThreadingHTTPServer):
+    """Kubernetes API server for a fixtures.Cluster.
+
+    ``latency`` seconds are added to every response. ``requests`` counts
+    calls by (verb, resource).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, cluster, latency=0, port=0):
+        """Bind to a local port; call start() to begin serving."""
+        super().__init__(("127.0.0.1", port), Handler)
+        self.cluster = cluster
+        self.latency = latency
+        self.requests = collections.Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        """Get the base URL of the server."""
+        return "http://{}:{}".format(*self.server_address)
+
+    def start(self):
+        """Serve in a background thread."""
+        threading.Thread(
+            target=self.serve_forever, name="fakeapi", daemon=True
+        ).start()
+        return self
+
+    def configuration(self):
+        """Get a kubernetes client configuration pointing here.
+
+        Set as the app's ``K8S_CLIENT_CONFIG`` to use this server.
+        """
+        config = kubernetes.client.Configuration()
+        config.host = self.url
+        return config
+
+    def count(self, verb, resource):
+        """Record a request."""
+        with self._lock:
+            self.requests[(verb, resource)] += 1
+
+    def respond(self, path, query):
+        """Get the (status, body) for a GET request."""
+        if path.rstrip("/") == "/version":
+            return 200, VERSION
+        resource, namespace, name = parse_path(path)
+        if resource is None:
+            return 404, _status(404, "NotFound", path)
+        items = self.cluster.resources.get(resource, [])
+        if namespace is not None:
+            items = [
+                obj
+                for obj in items
+                if obj["metadata"].get("namespace") == namespace
+            ]
+        if name is not None:
+            self.count("get", resource)
+            for obj in items:
+                if obj["metadata"]["name"] == name:
+                    return 200, obj
+            return 404, _status(404, "NotFound", name)
+        if query.get("watch") in ("true", "1"):
+            self.count("watch", resource)
+            time.sleep(int(query.get("timeoutSeconds", 60)))
+            return 200, None
+        self.count("list", resource)
+        limit = int(query.get("limit") or 0) or len(items) or 1
+        start = int(query.get("continue") or 0)
+        end = start + limit
+        return 200, fixtures.object_list(
+            resource.split("/")[-1].capitalize(),
+            items[start:end],
+            continue_token=str(end) if end < len(items) else None,
+        )
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Request handler for FakeAPI."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):  # noqa: N802
+        """Answer a GET request."""
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        status, body = self.server.respond(url.path, query)
+        data = b"" if body is None else orjson.dumps(body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):  # noqa: A002
+        """Do not log requests."""
+
+
+def _status(code, reason, message):
+    return {
+        "kind": "Status",
+        "apiVersion": "v1",
+        "status": "Failure",
+        "message": "{} not found".format(message),
+        "reason": reason,
+        "code": code,
+    }
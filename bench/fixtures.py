@@ -0,0 +1,509 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Synthetic Kubernetes API fixtures.
+
+Pods carry the managedFields, environment, volumes, tolerations and
+conditions of real workload pods so that sizes and parse times are
+representative of a production cluster.
+"""
+import datetime
+import json
+import random
+
+
+IMAGE = "docker-registry.tools.wmflabs.org/toolforge-{}-sssd-web:latest"
+EPOCH = datetime.datetime(2021, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _timestamp(rng):
+    delta = datetime.timedelta(seconds=rng.randint(0, 90 * 86400))
+    return (EPOCH + delta).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def pod(rng, namespace, name, node):
+    """Build a JSON pod."""
+    created = _timestamp(rng)
+    phase = rng.choices(
+        ["Running", "Succeeded", "Pending", "Failed"], [90, 6, 3, 1]
+    )[0]
+    container = {
+        "name": "webservice",
+        "image": IMAGE.format(
+            rng.choice(["python39", "php74", "node16", "jdk17", "golang111"])
+        ),
+        "command": ["/usr/bin/webservice-runner", "--type", "uwsgi"],
+        "env": [
+            {"name": "ENV_{}".format(i), "value": "x" * rng.randint(8, 64)}
+            for i in range(12)
+        ],
+        "ports": [{"containerPort": 8000, "name": "http", "protocol": "TCP"}],
+        "resources": {
+            "limits": {"cpu": "500m", "memory": "512Mi"},
+            "requests": {"cpu": "250m", "memory": "256Mi"},
+        },
+        "volumeMounts": [
+            {"mountPath": path, "name": path.strip("/").replace("/", "-")}
+            for path in ("/data/project", "/etc/wmcs-project", "/home", "/tmp")
+        ],
+        "imagePullPolicy": "Always",
+        "terminationMessagePath": "/dev/termination-log",
+    }
+    return {
+        "apiVersion": "v1",
+        "kind": "Pod",
+        "metadata": {
+            "name": name,
+            "namespace": namespace,
+            "uid": "{:032x}".format(rng.getrandbits(128)),
+            "resourceVersion": str(rng.randint(1, 10**9)),
+            "creationTimestamp": created,
+            "labels": {
+                "name": name.rsplit("-", 2)[0],
+                "toolforge": "tool",
+                "app.kubernetes.io/component": "web",
+                "pod-template-hash": "{:x}".format(rng.getrandbits(40)),
+            },
+            "ownerReferences": [
+                {
+                    "apiVersion": "apps/v1",
+                    "kind": "ReplicaSet",
+                    "name": name.rsplit("-", 1)[0],
+                    "uid": "{:032x}".format(rng.getrandbits(128)),
+                    "controller": True,
+                    "blockOwnerDeletion": True,
+                }
+            ],
+            "managedFields": [
+                {
+                    "manager": manager,
+                    "operation": "Update",
+                    "apiVersion": "v1",
+                    "time": created,
+                    "fieldsType": "FieldsV1",
+                    "fieldsV1": {
+                        "f:metadata": {
+                            "f:labels": {".": {}, "f:name": {}},
+                        },
+                        "f:spec": {
+                            "f:containers": {
+                                'k:{"name":"webservice"}': {
+                                    ".": {},
+                                    "f:env": {".": {}},
+                                    "f:image": {},
+                                    "f:resources": {".": {}},
+                                }
+                            }
+                        },
+                    },
+                }
+                for manager in ("kube-controller-manager", "kubelet")
+            ],
+        },
+        "spec": {
+            "containers": [container],
+            "nodeName": node,
+            "restartPolicy": "Always",
+            "schedulerName": "default-scheduler",
+            "serviceAccountName": "default",
+            "tolerations": [
+                {
+                    "effect": "NoExecute",
+                    "key": "node.kubernetes.io/{}".format(key),
+                    "operator": "Exists",
+                    "tolerationSeconds": 300,
+                }
+                for key in ("not-ready", "unreachable")
+            ],
+            "volumes": [
+                {
+                    "name": mount["name"],
+                    "hostPath": {"path": mount["mountPath"], "type": ""},
+                }
+                for mount in container["volumeMounts"]
+            ],
+        },
+        "status": {
+            "phase": phase,
+            "hostIP": "172.16.{}.{}".format(
+                rng.randint(0, 9), rng.randint(1, 254)
+            ),
+            "podIP": "192.168.{}.{}".format(
+                rng.randint(0, 255), rng.randint(1, 254)
+            ),
+            "startTime": created,
+            "conditions": [
+                {
+                    "type": kind,
+                    "status": "True",
+                    "lastTransitionTime": created,
+                    "lastProbeTime": None,
+                }
+                for kind in (
+                    "Initialized",
+                    "Ready",
+                    "ContainersReady",
+                    "PodScheduled",
+                )
+            ],
+            "containerStatuses": [
+                {
+                    "name": "webservice",
+                    "image": container["image"],
+                    "imageID": "docker-pullable://{}@sha256:{:064x}".format(
+                        container["image"], rng.getrandbits(256)
+                    ),
+                    "containerID": "docker://{:064x}".format(
+                        rng.getrandbits(256)
+                    ),
+                    "ready": phase == "Running",
+                    "restartCount": rng.choice([0, 0, 0, 1, 2, 17]),
+                    "started": phase == "Running",
+                    "state": {"running": {"startedAt": created}},
+                    "lastState": {},
+                }
+            ],
+        },
+    }
+
+
+def node(rng, name):
+    """Build a JSON node."""
+    created = _timestamp(rng)
+    return {
+        "apiVersion": "v1",
+        "kind": "Node",
+        "metadata": {
+            "name": name,
+            "uid": "{:032x}".format(rng.getrandbits(128)),
+            "resourceVersion": str(rng.randint(1, 10**9)),
+            "creationTimestamp": created,
+            "annotations": {
+                "node.alpha.kubernetes.io/ttl": "0",
+            },
+            "labels": {
+                "kubernetes.io/hostname": name,
+                "kubernetes.io/os": "linux",
+                "toolforge.org/nfs-mounted": "true",
+            },
+        },
+        "spec": {"podCIDR": "192.168.0.0/24"},
+        "status": {
+            "addresses": [
+                {
+                    "type": "InternalIP",
+                    "address": "172.16.0.{}".format(rng.randint(1, 254)),
+                },
+                {"type": "Hostname", "address": name},
+            ],
+            "allocatable": {"cpu": "8", "memory": "32879196Ki", "pods": "110"},
+            "capacity": {"cpu": "8", "memory": "32981596Ki", "pods": "110"},
+            "conditions": [
+                {
+                    "type": kind,
+                    "status": "True" if kind == "Ready" else "False",
+                    "lastHeartbeatTime": created,
+                    "lastTransitionTime": created,
+                    "reason": "Kubelet" + kind,
+                }
+                for kind in (
+                    "MemoryPressure",
+                    "DiskPressure",
+                    "PIDPressure",
+                    "Ready",
+                )
+            ],
+        },
+    }
+
+
+def namespace(rng, name):
+    """Build a JSON namespace."""
+    return {
+        "apiVersion": "v1",
+        "kind": "Namespace",
+        "metadata": {
+            "name": name,
+            "uid": "{:032x}".format(rng.getrandbits(128)),
+            "resourceVersion": str(rng.randint(1, 10**9)),
+            "creationTimestamp": _timestamp(rng),
+            "labels": {"name": name, "tenancy": "tool"},
+        },
+        "status": {"phase": "Active"},
+    }
+
+
+def _tool(namespace):
+    return namespace.split("-", 1)[-1]
+
+
+def _metadata(rng, namespace, name, created=None):
+    return {
+        "name": name,
+        "namespace": namespace,
+        "uid": "{:032x}".format(rng.getrandbits(128)),
+        "resourceVersion": str(rng.randint(1, 10**9)),
+        "creationTimestamp": created or _timestamp(rng),
+        "labels": {"name": name},
+    }
+
+
+def service(rng, namespace, name):
+    """Build a JSON service."""
+    return {
+        "apiVersion": "v1",
+        "kind": "Service",
+        "metadata": _metadata(rng, namespace, name),
+        "spec": {
+            "type": "ClusterIP",
+            "clusterIP": "10.96.{}.{}".format(
+                rng.randint(0, 255), rng.randint(1, 254)
+            ),
+            "externalIPs": [],
+            "ports": [
+                {
+                    "name": "http",
+                    "port": 8000,
+                    "protocol": "TCP",
+                    "targetPort": 8000,
+                }
+            ],
+            "selector": {"name": name},
+        },
+    }
+
+
+def ingress(rng, namespace, name):
+    """Build a JSON ingress."""
+    return {
+        "apiVersion": "networking.k8s.io/v1",
+        "kind": "Ingress",
+        "metadata": _metadata(rng, namespace, name),
+        "spec": {
+            "rules": [
+                {
+                    "host": "{}.toolforge.org".format(_tool(namespace)),
+                    "http": {
+                        "paths": [
+                            {
+                                "path": "/",
+                                "pathType": "Prefix",
+                                "backend": {
+                                    "service": {
+                                        "name": name,
+                                        "port": {"number": 8000},
+                                    }
+                                },
+                            }
+                        ]
+                    },
+                }
+            ]
+        },
+    }
+
+
+def deployment(rng, namespace, name):
+    """Build a JSON deployment."""
+    return {
+        "apiVersion": "apps/v1",
+        "kind": "Deployment",
+        "metadata": _metadata(rng, namespace, name),
+        "spec": {
+            "replicas": 1,
+            "selector": {"matchLabels": {"name": name}},
+            "template": {
+                "metadata": {"labels": {"name": name}},
+                "spec": {
+                    "containers": [
+                        {
+                            "name": "webservice",
+                            "image": IMAGE.format("python39"),
+                        }
+                    ]
+                },
+            },
+        },
+        "status": {
+            "replicas": 1,
+            "readyReplicas": 1,
+            "updatedReplicas": 1,
+            "availableReplicas": 1,
+        },
+    }
+
+
+def cronjob(rng, namespace, name):
+    """Build a JSON cronjob."""
+    return {
+        "apiVersion": "batch/v1",
+        "kind": "CronJob",
+        "metadata": _metadata(rng, namespace, name),
+        "spec": {
+            "schedule": "{} * * * *".format(rng.randrange(60)),
+            "jobTemplate": {
+                "spec": {
+                    "template": {
+                        "spec": {
+                            "containers": [
+                                {
+                                    "name": "job",
+                                    "image": IMAGE.format("bookworm"),
+                                }
+                            ],
+                            "restartPolicy": "Never",
+                        }
+                    }
+                }
+            },
+        },
+        "status": {},
+    }
+
+
+def resource_quota(rng, namespace):
+    """Build a JSON resource quota."""
+    return {
+        "apiVersion": "v1",
+        "kind": "ResourceQuota",
+        "metadata": _metadata(rng, namespace, namespace),
+        "status": {
+            "hard": {"limits.cpu": "2", "limits.memory": "8Gi", "pods": "16"},
+            "used": {
+                "limits.cpu": "{}m".format(rng.randrange(2000)),
+                "limits.memory": "{}Mi".format(rng.randrange(8192)),
+                "pods": str(rng.randrange(16)),
+            },
+        },
+    }
+
+
+def node_metrics(rng, node):
+    """Build metrics.k8s.io usage for a node."""
+    return {
+        "metadata": {"name": node["metadata"]["name"]},
+        "usage": {
+            "cpu": "{}n".format(rng.randrange(8 * 10**9)),
+            "memory": "{}Ki".format(rng.randrange(32879196)),
+        },
+    }
+
+
+def pod_metrics(rng, pod):
+    """Build metrics.k8s.io usage for a pod."""
+    return {
+        "metadata": {
+            "name": pod["metadata"]["name"],
+            "namespace": pod["metadata"]["namespace"],
+        },
+        "containers": [
+            {
+                "name": container["name"],
+                "usage": {
+                    "cpu": "{}n".format(rng.randrange(5 * 10**8)),
+                    "memory": "{}Ki".format(rng.randrange(524288)),
+                },
+            }
+            for container in pod["spec"]["containers"]
+        ],
+    }
+
+
+class Cluster:
+    """A synthetic cluster of namespaces, nodes and workloads.
+
+    Pods are spread over the first ``active`` fraction of namespaces. Each
+    namespace with pods also gets a service, deployment and quota; some get
+    an ingress or a cronjob. Objects are kept in ``resources`` by API path
+    resource name: ``pods``, ``apps/deployments``, ``metrics.k8s.io/nodes``.
+    """
+
+    def __init__(
+        self, pods=5000, nodes=50, namespaces=2000, active=0.6, seed=0
+    ):
+        """Generate a cluster deterministically from ``seed``."""
+        rng = random.Random(seed)
+        self.nodes = [
+            node(rng, "tools-k8s-worker-{}".format(i)) for i in range(nodes)
+        ]
+        self.namespaces = [
+            namespace(rng, "tool-{}".format(i)) for i in range(namespaces)
+        ]
+        names = [ns["metadata"]["name"] for ns in self.namespaces]
+        used = names[: max(1, int(len(names) * active))] if names else []
+        self.pods = []
+        for i in range(pods):
+            ns = used[i % len(used)]
+            self.pods.append(
+                pod(
+                    rng,
+                    ns,
+                    "{}-{:x}-{:05x}".format(_tool(ns), rng.getrandbits(40), i),
+                    self.nodes[rng.randrange(nodes)]["metadata"]["name"],
+                )
+            )
+        self.resources = {
+            "namespaces": self.namespaces,
+            "nodes": self.nodes,
+            "pods": self.pods,
+            "services": [service(rng, ns, _tool(ns)) for ns in used],
+            "resourcequotas": [resource_quota(rng, ns) for ns in names],
+            "apps/deployments": [
+                deployment(rng, ns, _tool(ns)) for ns in used
+            ],
+            "networking.k8s.io/ingresses": [
+                ingress(rng, ns, _tool(ns))
+                for ns in names
+                if rng.random() < 0.3
+            ],
+            "batch/cronjobs": [
+                cronjob(rng, ns, "{}-job".format(_tool(ns)))
+                for ns in names
+                if rng.random() < 0.2
+            ],
+            "metrics.k8s.io/nodes": [
+                node_metrics(rng, obj) for obj in self.nodes
+            ],
+            "metrics.k8s.io/pods": [
+                pod_metrics(rng, obj)
+                for obj in self.pods
+                if obj["status"]["phase"] == "Running"
+            ],
+        }
+
+    @classmethod
+    def load(cls, path):
+        """Load a recorded ``kubectl get pods -A -o json`` pod list."""
+        cluster = cls(pods=0, nodes=1, namespaces=1)
+        with open(path, "rb") as f:
+            cluster.pods = json.load(f)["items"]
+        cluster.resources["pods"] = cluster.pods
+        return cluster
+
+
+def object_list(kind, items, resource_version="1", continue_token=None):
+    """Build a JSON list response body."""
+    metadata = {"resourceVersion": resource_version}
+    if continue_token:
+        metadata["continue"] = continue_token
+    return {
+        "apiVersion": "v1",
+        "kind": "{}List".format(kind),
+        "metadata": metadata,
+        "items": items,
+    }
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Compare request throughput of the ways the app can be served.
+
+Usage::
+
+    python -m bench.serve [--latency SECONDS] [--concurrency N]
+
+A FakeAPI which adds ``--latency`` seconds to every call is started in
+this process. Each mode then serves the app, with an in-memory fake Redis,
+from a child process, and ``--concurrency`` clients send ``--requests``
+requests for namespace pages. Each page is requested once, so every
+request misses the cache and waits on several Kubernetes API calls.
+
+sync
+    one request at a time, like a single uWSGI worker
+threads
+    a thread per request
+gevent
+    k8s.serve, a greenlet per request on one event loop
+"""
+import argparse
+import concurrent.futures
+import logging
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+
+MODES = ("sync", "threads", "gevent")
+
+
+def serve(mode, api_url, config):
+    """Serve the app on a free port in this process and print the port."""
+    if mode == "gevent":
+        from k8s import serve as gevent_serve
+
+        gevent_serve.patch()
+
+    import fakeredis
+    import kubernetes
+    import redis
+
+    def configuration():
+        configuration = kubernetes.client.Configuration()
+        configuration.host = api_url
+        return configuration
+
+    import app
+
+    app.app.config.update(config)
+    # Share a bounded pool between requests as k8s.cache does for Redis
+    pool = redis.BlockingConnectionPool(
+        connection_class=fakeredis.FakeConnection,
+        server=fakeredis.FakeServer(),
+        max_connections=app.app.config["REDIS_OPTIONS"]["max_connections"],
+        timeout=app.app.config["REDIS_POOL_TIMEOUT"],
+    )
+    app.app.config.update(
+        K8S_CLIENT_CONFIG=configuration,
+        REDIS_HOST=fakeredis.FakeRedis(connection_pool=pool),
+        SECRET_KEY="bench",
+        INFORMERS=[],
+    )
+    if mode == "gevent":
+        http = gevent_serve.server(app.app, "127.0.0.1", 0)
+        http.start()
+    else:
+        import werkzeug.serving
+
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        http = werkzeug.serving.make_server(
+            "127.0.0.1", 0, app.app, threaded=mode == "threads"
+        )
+    print(http.server_port, flush=True)
+    http.serve_forever()
+
+
+def fetch(url):
+    """Get a URL and return (seconds taken, HTTP status)."""
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=300) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return time.perf_counter() - start, status
+
+
+def measure(mode, api_url, paths, concurrency, settings):
+    """Serve the app in a child process and load it with requests."""
+    command = [sys.executable, "-m", "bench.serve", "--serve", mode]
+    command.extend(("--api", api_url))
+    for setting in settings:
+        command.extend(("--set", setting))
+    child = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    try:
+        base = "http://127.0.0.1:{}".format(int(child.stdout.readline()))
+        urls = [base + path for path in paths]
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(fetch, urls))
+        elapsed = time.perf_counter() - start
+    finally:
+        child.terminate()
+        child.wait()
+    latencies = sorted(seconds for seconds, _ in results)
+    return {
+        "rps": len(results) / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "errors": sum(status != 200 for _, status in results),
+    }
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=MODES, action="append")
+    parser.add_argument("--namespaces", type=int, default=200)
+    parser.add_argument("--pods", type=int, default=1000)
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="API latency in seconds"
+    )
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="override an app config setting (value is YAML)",
+    )
+    parser.add_argument("--serve", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--api", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        import yaml
+
+        serve(
+            args.serve,
+            args.api,
+            {
+                key: yaml.safe_load(value)
+                for key, value in (item.split("=", 1) for item in args.set)
+            },
+        )
+        return
+
+    from . import fakeapi
+    from . import fixtures
+
+    cluster = fixtures.Cluster(namespaces=args.namespaces, pods=args.pods)
+    api = fakeapi.FakeAPI(cluster, latency=args.latency).start()
+    namespaces = [ns["metadata"]["name"] for ns in cluster.namespaces]
+    paths = [
+        "/namespaces/{}/".format(namespaces[i % len(namespaces)])
+        for i in range(args.requests)
+    ]
+    print(
+        "{} requests from {} clients, {:.0f}ms API latency".format(
+            len(paths), args.concurrency, args.latency * 1000
+        )
+    )
+    print(
+        "{:<8} {:>8} {:>8} {:>8} {:>7}".format(
+            "mode", "req/s", "p50 ms", "p95 ms", "errors"
+        )
+    )
+    for mode in args.mode or MODES:
+        r = measure(mode, api.url, paths, args.concurrency, args.set)
+        print(
+            "{:<8} {:>8.1f} {:>8.0f} {:>8.0f} {:>7}".format(
+                mode, r["rps"], r["p50"] * 1000, r["p95"] * 1000, r["errors"]
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
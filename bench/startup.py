@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Measure how long the app takes to import and answer its first request.
+
+Usage::
+
+    python -m bench.startup [--repeat N]
+
+Each run starts a fresh interpreter which imports ``app`` and requests
+``/healthz``, the liveness probe, as a new pod does. Reports the median
+times, whether the kubernetes package was imported, and the top-level
+packages which took longest to import according to ``-X importtime``.
+"""
+import argparse
+import collections
+import json
+import statistics
+import subprocess
+import sys
+
+
+# Run in each fresh interpreter; prints its results as JSON
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.app.test_client().get("/healthz")
+done = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "first_request": done - imported,
+    "modules": len(sys.modules),
+    "kubernetes": "kubernetes" in sys.modules,
+}))
+"""
+
+
+def run():
+    """Start the app once and return (results, cumulative import times)."""
+    child = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    imports = {}
+    for line in child.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if name == "site":
+            # Everything so far was imported by interpreter startup
+            imports.clear()
+        elif "." not in name and name != "app":
+            imports[name] = int(cumulative) / 1e6
+    return json.loads(child.stdout.splitlines()[-1]), imports
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--top", type=int, default=10, help="slowest packages to list"
+    )
+    args = parser.parse_args()
+    top = args.top
+
+    results = []
+    imports = collections.defaultdict(list)
+    for _ in range(args.repeat):
+        result, times = run()
+        results.append(result)
+        for name, seconds in times.items():
+            imports[name].append(seconds)
+    for key, label in (
+        ("import", "import app"),
+        ("first_request", "/healthz"),
+    ):
+        print(
+            "{:<24} {:8.1f} ms".format(
+                label, statistics.median(r[key] for r in results) * 1000
+            )
+        )
+    print("{:<24} {:8d}".format("modules", results[-1]["modules"]))
+    print(
+        "{:<24} {:>8}".format(
+            "kubernetes imported", "yes" if results[-1]["kubernetes"] else "no"
+        )
+    )
+    print()
+    slowest = sorted(
+        imports,
+        key=lambda name: statistics.median(imports[name]),
+        reverse=True,
+    )
+    for name in slowest[:top]:
+        print(
+            "{:<24} {:8.1f} ms".format(
+                name, statistics.median(imports[name]) * 1000
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
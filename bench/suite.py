@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Measure every route and collector against a synthetic cluster.
+
+Usage::
+
+    python -m bench.suite [--size small|medium|large] [--latency SECONDS]
+
+The app is served from a FakeAPI and an in-memory fake Redis. For each
+``k8s.client`` collector and each route the suite reports:
+
+cold
+    latency when purged, recomputing the value and everything it reads
+warm
+    latency when read from Redis with an empty per-process cache
+hot
+    latency when read from the per-process cache
+peak
+    peak Python memory allocated by a cold call
+cache
+    bytes stored in Redis by a cold call, including dependencies
+
+Use ``--set K8S_RAW_JSON=true`` to try configuration changes and ``--json``
+to save results for comparison between revisions.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+import fakeredis
+import yaml
+
+from . import fakeapi
+from . import fixtures
+
+
+SIZES = {
+    "small": {"namespaces": 100, "pods": 1000, "nodes": 20},
+    "medium": {"namespaces": 1000, "pods": 10000, "nodes": 100},
+    "large": {"namespaces": 10000, "pods": 50000, "nodes": 200},
+}
+
+
+def collectors(cluster):
+    """List (name, function name, args) of collectors to measure."""
+    pod = cluster.pods[0]
+    namespace = pod["metadata"]["namespace"]
+    node = cluster.nodes[0]["metadata"]["name"]
+    image = pod["spec"]["containers"][0]["image"]
+    return [
+        ("get_namespaces", "get_namespaces", ()),
+        ("get_nodes", "get_nodes", ()),
+        ("get_node", "get_node", (node,)),
+        ("get_pods", "get_pods", (namespace,)),
+        ("get_pod", "get_pod", (namespace, pod["metadata"]["name"])),
+        ("get_all_pods", "get_all_pods", ()),
+        ("get_pod_totals", "get_pod_totals", ()),
+        ("get_pods_by_namespace", "get_pods_by_namespace", ()),
+        ("get_images", "get_images", ()),
+        ("get_image_containers", "get_image_containers", (image,)),
+        ("get_node_pods", "get_node_pods", (node,)),
+        ("get_ingresses_by_namespace", "get_ingresses_by_namespace", ()),
+        ("get_cronjobs_by_namespace", "get_cronjobs_by_namespace", ()),
+        ("get_active_namespaces", "get_active_namespaces", ()),
+        ("get_namespace_summary", "get_namespace_summary", ()),
+        ("get_nodes_metrics", "get_nodes_metrics", ()),
+        ("get_node_metrics", "get_node_metrics", (node,)),
+        ("get_pods_metrics", "get_pods_metrics", ()),
+        ("get_pod_usage", "get_pod_usage", ()),
+        ("get_summary_metrics", "get_summary_metrics", ()),
+        ("get_node_table", "get_node_table", ()),
+        ("get_quota", "get_quota", (namespace,)),
+    ]
+
+
+def routes(cluster):
+    """List the paths of the routes to measure."""
+    pod = cluster.pods[0]
+    namespace = pod["metadata"]["namespace"]
+    return [
+        "/",
+        "/nodes/",
+        "/nodes/{}/".format(cluster.nodes[0]["metadata"]["name"]),
+        "/namespaces/",
+        "/namespaces/{}/".format(namespace),
+        "/namespaces/{}/pods/{}/".format(namespace, pod["metadata"]["name"]),
+        "/images/",
+        "/images/{}/".format(pod["spec"]["containers"][0]["image"]),
+        "/api/v1/summary",
+        "/api/v1/namespaces",
+        "/api/v1/images",
+    ]
+
+
+class Suite:
+    """The app wired to a FakeAPI and fake Redis."""
+
+    def __init__(self, cluster, latency=0, memory=True, repeat=3, config=None):
+        """Start the fake API and import the app against it."""
+        self.api = fakeapi.FakeAPI(cluster, latency=latency).start()
+
+        import app
+        import k8s.cache
+        import k8s.client
+
+        self.redis = fakeredis.FakeRedis()
+        app.app.config.update(
+            K8S_CLIENT_CONFIG=self.api.configuration,
+            REDIS_HOST=self.redis,
+            SECRET_KEY="bench",
+            INFORMERS=[],
+        )
+        app.app.config.update(config or {})
+        self.app = app.app
+        self.cache = k8s.cache
+        self.client = k8s.client
+        self.memory = memory
+        self.repeat = repeat
+
+    def cache_bytes(self):
+        """Count the bytes of all values in Redis."""
+        return sum(self.redis.strlen(key) for key in self.redis.keys())
+
+    def clear_local(self):
+        """Empty the per-process cache."""
+        with self.app.app_context():
+            self.cache.local_cache().clear()
+
+    def reset(self):
+        """Empty Redis and the per-process cache."""
+        self.redis.flushall()
+        self.clear_local()
+
+    def measure(self, call):
+        """Measure ``call(cached)`` cold, warm and hot."""
+        cold, warm, hot = [], [], []
+        for _ in range(self.repeat):
+            self.reset()
+            cold.append(_timed(call, False))
+            stored = self.cache_bytes()
+            self.clear_local()
+            warm.append(_timed(call, True))
+            hot.append(_timed(call, True))
+        result = {
+            "cold": statistics.median(cold),
+            "warm": statistics.median(warm),
+            "hot": statistics.median(hot),
+            "cache": stored,
+            "peak": None,
+        }
+        if self.memory:
+            self.reset()
+            tracemalloc.start()
+            call(False)
+            result["peak"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return result
+
+    def collector(self, function, args):
+        """Measure a ``k8s.client`` collector."""
+        f = getattr(self.client, function)
+
+        def call(cached):
+            with self.app.app_context():
+                return f(*args, cached=cached)
+
+        return self.measure(call)
+
+    def route(self, path):
+        """Measure a route."""
+        client = self.app.test_client()
+
+        def call(cached):
+            resp = client.get(path if cached else path + "?purge")
+            if resp.status_code != 200:
+                raise RuntimeError("{} returned {}".format(path, resp.status))
+            return resp
+
+        return self.measure(call)
+
+
+def _timed(call, cached):
+    start = time.perf_counter()
+    call(cached)
+    return time.perf_counter() - start
+
+
+def report(title, results):
+    """Print a table of results."""
+    print(
+        "{:<44} {:>9} {:>9} {:>9} {:>9} {:>10}".format(
+            title, "cold ms", "warm ms", "hot ms", "peak MiB", "cache KiB"
+        )
+    )
+    for name, r in results.items():
+        print(
+            "{:<44} {:9.1f} {:9.1f} {:9.2f} {:>9} {:10.1f}".format(
+                name[:44],
+                r["cold"] * 1000,
+                r["warm"] * 1000,
+                r["hot"] * 1000,
+                "-"
+                if r["peak"] is None
+                else "{:.1f}".format(r["peak"] / 2**20),
+                r["cache"] / 1024,
+            )
+        )
+    print()
+
+
+def main():
+    """Run the suite."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=sorted(SIZES), default="small")
+    parser.add_argument("--namespaces", type=int, help="override --size")
+    parser.add_argument("--pods", type=int, help="override --size")
+    parser.add_argument("--nodes", type=int, help="override --size")
+    parser.add_argument(
+        "--latency", type=float, default=0, help="API latency in seconds"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--only", choices=["collectors", "routes"], help="run one group"
+    )
+    parser.add_argument(
+        "--no-memory", action="store_true", help="skip peak memory runs"
+    )
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="override an app config setting (value is YAML)",
+    )
+    parser.add_argument("--json", help="write results to a file")
+    args = parser.parse_args()
+
+    size = dict(SIZES[args.size])
+    for key in size:
+        if getattr(args, key) is not None:
+            size[key] = getattr(args, key)
+    print("Generating cluster: {}".format(size), file=sys.stderr)
+    cluster = fixtures.Cluster(**size)
+    suite = Suite(
+        cluster,
+        latency=args.latency,
+        memory=not args.no_memory,
+        repeat=args.repeat,
+        config={
+            key: yaml.safe_load(value)
+            for key, value in (item.split("=", 1) for item in args.set)
+        },
+    )
+
+    results = {
+        "size": size,
+        "config": args.set,
+        "collectors": {},
+        "routes": {},
+    }
+    if args.only in (None, "collectors"):
+        for name, function, f_args in collectors(cluster):
+            results["collectors"][name] = suite.collector(function, f_args)
+        report("collector", results["collectors"])
+    if args.only in (None, "routes"):
+        for path in routes(cluster):
+            results["routes"][path] = suite.route(path)
+        report("route", results["routes"])
+    results["api_requests"] = {
+        "{} {}".format(*key): count
+        for key, count in sorted(suite.api.requests.items())
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
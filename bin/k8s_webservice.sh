@@ -5,6 +5,10 @@
 #/
 #/ positional arguments:
 #/   {start,stop,status,restart,shell,debug,tail} Action to perform
+#/
+#/ environment:
+#/   SERVER=gevent  with start, serve with python -m k8s.serve instead of
+#/                  the default uWSGI webservice-runner
 #
 set -Eeuo pipefail
 
@@ -19,6 +23,12 @@ function usage {
 function startsvc {
     local tool=${1:?startsvc expects a tool name}
     local domain="$(python3 -c 'from toolsws.config import load_config; print(load_config()["public_domain"])')"
+    local command="[/usr/bin/webservice-runner]"
+    local workdir="/data/project/${tool}/"
+    if [[ ${SERVER:-} == gevent ]]; then
+        command="[/data/project/${tool}/www/python/venv/bin/python, -m, k8s.serve]"
+        workdir="/data/project/${tool}/www/python/src"
+    fi
     echo "Starting webservice..."
     cat <<EOF | /usr/bin/kubectl apply -f -
 ---
@@ -50,19 +60,23 @@ spec:
         #
         - name: webservice
           image: docker-registry.tools.wmflabs.org/toolforge-python311-sssd-web:latest
-          command:
-            - /usr/bin/webservice-runner
+          command: ${command}
           imagePullPolicy: Always
           ports:
           - containerPort: 8000
             name: http
             protocol: TCP
-          workingDir: /data/project/${tool}/
+          workingDir: ${workdir}
+          startupProbe:
+            httpGet:
+              path: /healthz
+              port: 8000
+            periodSeconds: 2
+            failureThreshold: 30
           livenessProbe:
             httpGet:
               path: /healthz
               port: 8000
-            initialDelaySeconds: 30
             periodSeconds: 15
           resources:
             limits:
@@ -72,6 +86,43 @@ spec:
               cpu: 500m
               memory: 512Mi
 ---
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  labels:
+    name: ${tool}-refresh
+    toolforge: tool
+  name: ${tool}-refresh
+spec:
+  replicas: 1
+  selector:
+    matchLabels:
+      name: ${tool}-refresh
+      toolforge: tool
+  template:
+    metadata:
+      labels:
+        name: ${tool}-refresh
+        toolforge: tool
+    spec:
+      serviceAccountName: ${tool}-obs
+      containers:
+        - name: refresh
+          image: docker-registry.tools.wmflabs.org/toolforge-python311-sssd-base:latest
+          command:
+            - /data/project/${tool}/www/python/venv/bin/python
+            - -m
+            - k8s.refresh
+          imagePullPolicy: Always
+          workingDir: /data/project/${tool}/www/python/src
+          resources:
+            limits:
+              cpu: 1
+              memory: 2Gi
+            requests:
+              cpu: 250m
+              memory: 512Mi
+---
 apiVersion: v1
 kind: Service
 metadata:
@@ -119,6 +170,7 @@ function stopsvc {
     /usr/bin/kubectl delete ingress $tool
     /usr/bin/kubectl delete svc $tool
     /usr/bin/kubectl delete deployment $tool
+    /usr/bin/kubectl delete deployment ${tool}-refresh
 }
 
 function shell {
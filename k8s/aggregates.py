@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Cluster-wide totals maintained as objects are added and removed.
+
+Aggregates are attached to a snapshot.Snapshot, which calls ``add`` and
+``remove`` as its contents change, so keeping them current costs O(churn)
+rather than a pass over the whole cluster.
+
+Pod resource usage comes from metrics.k8s.io, which has no WATCH, so it is
+summarized in one pass per refresh by usage_summaries() instead.
+"""
+import collections
+import heapq
+import operator
+
+from . import records
+
+
+# Pod phases which count as active
+ACTIVE_PHASES = ("Pending", "Running")
+
+
+def _decrement(counter, key, amount=1):
+    """Decrement a Counter, dropping keys which reach zero."""
+    counter[key] -= amount
+    if counter[key] <= 0:
+        del counter[key]
+
+
+def node_role(name):
+    """Classify a node as control, worker or special by its name."""
+    if "-control-" in name:
+        return "control"
+    if "-worker-" in name:
+        return "worker"
+    return "special"
+
+
+class PodTotals:
+    """Pod counts in total, by namespace and by container image.
+
+    ``starts`` counts the start times of the pods of each namespace, so
+    that latest_start() is still right once the latest pod is removed.
+    """
+
+    def __init__(self):
+        """Create empty totals."""
+        self.total = 0
+        self.active = 0
+        self.namespaces = collections.Counter()
+        self.active_namespaces = collections.Counter()
+        self.images = collections.Counter()
+        self.starts = collections.defaultdict(collections.Counter)
+
+    def add(self, pod):
+        """Count a PodRecord."""
+        self.total += 1
+        if pod.phase in ACTIVE_PHASES:
+            self.active += 1
+            self.active_namespaces[pod.namespace] += 1
+        self.namespaces[pod.namespace] += 1
+        if pod.start_time is not None:
+            self.starts[pod.namespace][pod.start_time] += 1
+        for container in pod.containers:
+            self.images[container.image] += 1
+
+    def remove(self, pod):
+        """Stop counting a PodRecord."""
+        self.total -= 1
+        if pod.phase in ACTIVE_PHASES:
+            self.active -= 1
+            _decrement(self.active_namespaces, pod.namespace)
+        _decrement(self.namespaces, pod.namespace)
+        if pod.start_time is not None:
+            _decrement(self.starts[pod.namespace], pod.start_time)
+            if not self.starts[pod.namespace]:
+                del self.starts[pod.namespace]
+        for container in pod.containers:
+            _decrement(self.images, container.image)
+
+    def latest_start(self, namespace):
+        """Get when the last pod of a namespace started, or None."""
+        return max(self.starts.get(namespace, ()), default=None)
+
+
+class NodeTotals:
+    """Node counts by role and allocatable capacity of worker nodes."""
+
+    def __init__(self):
+        """Create empty totals."""
+        self.roles = collections.Counter()
+        self.cpu = 0.0
+        self.memory = 0.0
+
+    def _capacity(self, node):
+        if node_role(node.name) != "worker":
+            return 0, 0
+        return node.cpu, node.memory
+
+    def add(self, node):
+        """Count a NodeRecord."""
+        self.roles[node_role(node.name)] += 1
+        cpu, memory = self._capacity(node)
+        self.cpu += cpu
+        self.memory += memory
+
+    def remove(self, node):
+        """Stop counting a NodeRecord."""
+        self.roles[node_role(node.name)] -= 1
+        cpu, memory = self._capacity(node)
+        self.cpu -= cpu
+        self.memory -= memory
+
+
+class UsageTotals:
+    """CPU and memory in use on worker nodes from metrics.k8s.io."""
+
+    def __init__(self):
+        """Create empty totals."""
+        self.cpu = 0.0
+        self.memory = 0.0
+
+    def _usage(self, metrics):
+        if node_role(metrics["metadata"]["name"]) != "worker":
+            return 0, 0
+        return (
+            records.quantity(metrics["usage"]["cpu"]),
+            records.quantity(metrics["usage"]["memory"]),
+        )
+
+    def add(self, metrics):
+        """Count the usage of a node."""
+        cpu, memory = self._usage(metrics)
+        self.cpu += cpu
+        self.memory += memory
+
+    def remove(self, metrics):
+        """Stop counting the usage of a node."""
+        cpu, memory = self._usage(metrics)
+        self.cpu -= cpu
+        self.memory -= memory
+
+
+def _ratio(used, requested):
+    """Get usage as a fraction of the amount requested, if any was."""
+    return used / requested if requested else None
+
+
+def usage_summary(rows, top):
+    """Total a list of PodUsage and pick the ``top`` heaviest CPU users."""
+    cpu = memory = cpu_requested = memory_requested = 0.0
+    for row in rows:
+        cpu += row.cpu
+        memory += row.memory
+        cpu_requested += row.cpu_requested
+        memory_requested += row.memory_requested
+    return records.UsageSummary(
+        len(rows),
+        cpu,
+        memory,
+        cpu_requested,
+        memory_requested,
+        _ratio(cpu, cpu_requested),
+        _ratio(memory, memory_requested),
+        tuple(heapq.nlargest(top, rows, key=operator.attrgetter("cpu"))),
+    )
+
+
+def usage_summaries(rows, field, top):
+    """Summarize a list of PodUsage grouped by one of its fields."""
+    groups = collections.defaultdict(list)
+    key = operator.attrgetter(field)
+    for row in rows:
+        groups[key(row)].append(row)
+    return {
+        value: usage_summary(group, top) for value, group in groups.items()
+    }
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Versioned JSON API over the cached collectors.
+
+Single objects are served as JSON. Collections are streamed as
+newline-delimited JSON, one object per line, so large collections are
+never built into one big string. Collections backed by a tables.Table
+accept the same ``?sort=`` and ``?q=`` parameters as the HTML pages.
+
+``?purge`` works as it does for the HTML pages, recomputing each cached
+value a response depends on at most once.
+"""
+import decimal
+import functools
+import logging
+
+import flask
+import orjson
+import werkzeug.exceptions
+
+from . import cache
+from . import circuit
+from . import client
+from . import lazy
+from . import pages
+from . import tables
+
+
+logger = logging.getLogger(__name__)
+kubernetes = lazy.Module("kubernetes")
+
+blueprint = flask.Blueprint("api", __name__, url_prefix="/api/v1")
+
+NDJSON = "application/x-ndjson"
+
+
+def _default(obj):
+    """Encode the types orjson does not know about."""
+    if hasattr(obj, "_asdict"):
+        return obj._asdict()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    if hasattr(obj, "openapi_types"):
+        return _serializer().sanitize_for_serialization(obj)
+    raise TypeError
+
+
+@functools.lru_cache()
+def _serializer():
+    """Get an ApiClient to turn Kubernetes models into plain data.
+
+    Serializing needs no connection to the cluster, so this is not
+    client.api_client(), which loads the client configuration.
+    """
+    return kubernetes.client.ApiClient()
+
+
+def dumps(obj):
+    """Encode a value as JSON."""
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _json(obj):
+    """Respond with a JSON document."""
+    return flask.Response(dumps(obj), mimetype="application/json")
+
+
+def _stream(rows):
+    """Respond with one JSON document per line."""
+
+    def generate():
+        for row in rows:
+            yield dumps(row) + b"\n"
+
+    return flask.Response(
+        flask.stream_with_context(generate()), mimetype=NDJSON
+    )
+
+
+def _select(table):
+    """Iterate over the rows of a table sorted and filtered per request."""
+    args = flask.request.args
+    return table.select(sort=args.get("sort"), query=args.get("q"))
+
+
+def _cached():
+    return "purge" not in flask.request.args
+
+
+def api_exception(e):
+    """Report errors from the Kubernetes API."""
+    if e.status == 404:
+        return _json({"error": "Not found"}), 404
+    logger.error("Kubernetes API error: %s", e)
+    return _json({"error": "Kubernetes API error"}), 502
+
+
+@blueprint.errorhandler(Exception)
+def unexpected_exception(e):
+    """Report errors as JSON."""
+    if isinstance(e, werkzeug.exceptions.HTTPException):
+        return _json({"error": e.description}), e.code
+    if isinstance(e, cache.NotFound):
+        return _json({"error": "Not found"}), 404
+    if isinstance(e, circuit.CircuitOpen):
+        return _json({"error": "Kubernetes API unavailable"}), 503
+    # Not registered as a handler of its own, which would import the
+    # kubernetes package when the app is imported
+    if isinstance(e, kubernetes.client.ApiException):
+        return api_exception(e)
+    logger.exception("Error serving %s", flask.request.path)
+    return _json({"error": "Internal error"}), 500
+
+
+@blueprint.route("/summary")
+@pages.batched()
+def summary():
+    """Get cluster-wide counts and usage."""
+    cached = _cached()
+    namespaces = client.get_namespace_summary(cached=cached)
+    pods = client.get_pods_by_namespace(cached=cached)
+    metrics = client.get_summary_metrics(cached=cached)
+    return _json(
+        dict(
+            metrics,
+            active_namespaces=len(namespaces["active"]),
+            active_pods=namespaces["active_pods"],
+            total_pods=pods["total_pods"],
+        )
+    )
+
+
+@blueprint.route("/nodes")
+@pages.batched()
+def nodes():
+    """Stream a row for each node."""
+    table = client.get_node_table(cached=_cached())["table"]
+    return _stream(_select(table))
+
+
+@blueprint.route("/nodes/<name>")
+@pages.batched()
+def node(name):
+    """Get a node, its usage and its pods."""
+    cached = _cached()
+    pods = client.get_node_pods(name, cached=cached)["items"]
+    return _json(
+        {
+            "node": client.get_node(name, cached=cached)["node"],
+            "metrics": client.node_metrics(name, cached=cached),
+            "pods": list(client.pod_table(pods).select()),
+            "usage": client.get_pod_usage(cached=cached)["nodes"].get(name),
+        }
+    )
+
+
+@blueprint.route("/namespaces")
+@pages.batched()
+def namespaces():
+    """Stream a summary row for each namespace."""
+    summary = client.get_namespace_summary(cached=_cached())
+    rows = summary["items"].values()
+    if "active" in flask.request.args:
+        rows = (row for row in rows if row.name in summary["active"])
+    return _stream(rows)
+
+
+@blueprint.route("/namespaces/<namespace>")
+@pages.batched()
+def namespace(namespace):
+    """Get the workloads of a namespace.
+
+    Collections which could not be loaded are left out and named in
+    ``errors``.
+    """
+    cached = _cached()
+    calls = {
+        name: functools.partial(f, namespace, cached=cached)
+        for name, f in client.NAMESPACE_COLLECTORS
+    }
+    calls["usage"] = functools.partial(client.get_pod_usage, cached=cached)
+    results, errors = client.fetch_many(calls)
+    if "usage" in results:
+        results["usage"] = results["usage"]["namespaces"].get(namespace)
+    for name, error in errors.items():
+        logger.warning(
+            "Error collecting %s for namespace %s",
+            name,
+            namespace,
+            exc_info=error,
+        )
+    return _json(dict(results, errors=sorted(errors)))
+
+
+@blueprint.route("/images")
+@pages.batched()
+def images():
+    """Stream a row for each image in use."""
+    table = client.get_images(cached=_cached())["table"]
+    return _stream(_select(table))
+
+
+@blueprint.route("/images/<path:name>")
+@pages.batched()
+def image(name):
+    """Stream the containers using an image."""
+    table = tables.Table(
+        client.get_image_containers(name, cached=_cached())["items"],
+        client.CONTAINER_COLUMNS,
+        text=" ".join,
+    )
+    return _stream(
+        {"namespace": ns, "pod": pod, "container": container}
+        for ns, pod, container in _select(table)
+    )
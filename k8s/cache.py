@@ -17,57 +17,767 @@
 # You should have received a copy of the GNU General Public License along
 # with this program.  If not, see <http://www.gnu.org/licenses/>.
 """Caching object."""
+import collections
+import concurrent.futures
+import contextlib
 import functools
 import hashlib
 import logging
 import os
 import pwd
+import threading
+import time
 
 import cachelib
 import flask
 
+from . import circuit
+from . import codec
+from . import instrumentation
+from . import lazy
+
 
 logger = logging.getLogger(__name__)
+redis = lazy.Module("redis")
+
+# Redis key incremented whenever a purge writes fresh data
+GENERATION_KEY = "__generation__"
+
+# Keys passed to cached(), used to label metrics by key prefix
+_prefixes = {GENERATION_KEY}
+
+
+class NotFound(Exception):
+    """A cached function found nothing for its arguments."""
 
 
 @functools.lru_cache()
 def cache():
-    """Get cachelib cache."""
-    return cachelib.RedisCache(
-        host=flask.current_app.config["REDIS_HOST"],
+    """Get cachelib cache.
+
+    Connections come from a pool of at most ``max_connections`` in
+    ``REDIS_OPTIONS``. When all are in use callers wait up to
+    ``REDIS_POOL_TIMEOUT`` seconds for one to be returned rather than
+    failing, which matters when many requests share a process.
+    """
+    config = flask.current_app.config
+    host = config["REDIS_HOST"]
+    options = {}
+    if isinstance(host, str):
+        options["connection_pool"] = redis.BlockingConnectionPool(
+            host=host,
+            timeout=config.get("REDIS_POOL_TIMEOUT", 5),
+            **config.get("REDIS_OPTIONS", {}),
+        )
+    client = cachelib.RedisCache(
+        host=host,
         key_prefix=hashlib.sha256(
             "{0.pw_name}/{0.pw_dir}".format(pwd.getpwuid(os.getuid())).encode(
                 "utf-8"
             )
         ).hexdigest(),
+        **options,
+    )
+    client.serializer = codec.from_config(config)
+    return client
+
+
+class LocalCache:
+    """In-process LRU cache bounded by entry count and serialized size.
+
+    Entries are stamped with the cache generation current when they were
+    stored and are ignored once the generation moves on.
+    """
+
+    def __init__(self, max_entries, max_bytes, ttl):
+        """Create an empty cache."""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+
+    def get(self, key, generation):
+        """Get a value or None if missing, expired or stale."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, stamp, size, value = entry
+            if stamp != generation or expires < time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, size, generation, ttl=None):
+        """Store a value which is ``size`` bytes when serialized."""
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (
+                time.monotonic() + ttl,
+                generation,
+                size,
+                value,
+            )
+            self._bytes += size
+            while self._over_limit():
+                _, (_, _, evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _over_limit(self):
+        if len(self._entries) > self.max_entries:
+            return True
+        return self._bytes > self.max_bytes
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+
+@functools.lru_cache()
+def local_cache():
+    """Get the per-process cache that sits in front of Redis."""
+    config = flask.current_app.config
+    return LocalCache(
+        max_entries=config.get("CACHE_L1_MAX_ENTRIES", 128),
+        max_bytes=config.get("CACHE_L1_MAX_BYTES", 64 * 1024 * 1024),
+        ttl=config.get("CACHE_L1_TTL", 60),
+    )
+
+
+_generation = {"value": None, "checked": float("-inf")}
+
+
+def generation():
+    """Get the current cache generation.
+
+    The value is read from Redis at most once per
+    ``CACHE_L1_GENERATION_INTERVAL`` seconds. It is always an int, as
+    returned by INCR, so that values polled and values bumped compare
+    equal and make the same page cache keys.
+    """
+    interval = flask.current_app.config.get("CACHE_L1_GENERATION_INTERVAL", 1)
+    now = time.monotonic()
+    if now - _generation["checked"] >= interval:
+        raw = _redis_get(GENERATION_KEY)
+        _generation["value"] = int(raw) if raw is not None else 0
+        _generation["checked"] = now
+    return _generation["value"]
+
+
+def bump_generation():
+    """Invalidate every process's local cache entries."""
+    client = cache()._write_client
+    _generation["value"] = client.incr(cache()._get_prefix() + GENERATION_KEY)
+    _generation["checked"] = time.monotonic()
+    return _generation["value"]
+
+
+def register(key):
+    """Label metrics for cache keys made from ``key`` with ``key``."""
+    _prefixes.add(key)
+
+
+def key_prefix(key):
+    """Get the ``cached`` key a cache key was made from."""
+    return max(
+        (p for p in _prefixes if key == p or key.startswith(p + ":")),
+        key=len,
+        default="other",
+    )
+
+
+def _redis_get(key):
+    """Get the raw bytes stored in Redis for a key."""
+    prefix = key_prefix(key)
+    raw = instrumentation.redis_call(
+        "get",
+        prefix,
+        cache()._read_client.get,
+        cache()._get_prefix() + key,
+    )
+    if raw is not None:
+        instrumentation.REDIS_BYTES.labels("get", prefix).observe(len(raw))
+    return raw
+
+
+def load(key):
+    """Get a cached value from the local cache or Redis."""
+    stamp = generation()
+    r = local_cache().get(key, stamp)
+    if r is not None:
+        return r
+    raw = _redis_get(key)
+    if raw is None:
+        return None
+    r = cache().serializer.loads(raw)
+    if r is not None:
+        local_cache().put(key, r, len(raw), stamp)
+    return r
+
+
+def store(key, value, timeout, invalidate=False):
+    """Store a value in Redis and the local cache.
+
+    Refreshes and purges should ``invalidate`` so that the cache generation
+    advances and other processes drop their local copies. Inside a batch()
+    such values are queued and written together.
+    """
+    raw = cache().serializer.dumps(value)
+    pending = current_batch()
+    if invalidate and pending is not None:
+        pending.add(key, value, raw, timeout)
+        local_cache().put(key, value, len(raw), generation(), timeout)
+        return
+    prefix = key_prefix(key)
+    instrumentation.redis_call(
+        "set",
+        prefix,
+        cache()._write_client.setex,
+        cache()._get_prefix() + key,
+        timeout,
+        raw,
+    )
+    instrumentation.REDIS_BYTES.labels("set", prefix).observe(len(raw))
+    stamp = bump_generation() if invalidate else generation()
+    local_cache().put(key, value, len(raw), stamp, timeout)
+
+
+def prefetch(keys):
+    """Load several keys into the local cache in one Redis round trip.
+
+    Keys already held in the local cache are not fetched again.
+    """
+    stamp = generation()
+    missing = [key for key in keys if local_cache().get(key, stamp) is None]
+    if not missing:
+        return
+    prefix = cache()._get_prefix()
+    raws = instrumentation.redis_call(
+        "mget",
+        "batch",
+        cache()._read_client.mget,
+        [prefix + key for key in missing],
+    )
+    for i, key in enumerate(missing):
+        raw = raws[i]
+        if raw is None:
+            continue
+        instrumentation.REDIS_BYTES.labels("get", key_prefix(key)).observe(
+            len(raw)
+        )
+        value = cache().serializer.loads(raw)
+        if value is not None:
+            local_cache().put(key, value, len(raw), stamp)
+
+
+class Batch:
+    """Values stored with ``invalidate`` waiting to be written to Redis.
+
+    Purges of the cache keys in ``kept`` read the stored value instead, if
+    there is one.
+    """
+
+    def __init__(self, kept=()):
+        """Create an empty batch."""
+        self.kept = frozenset(kept)
+        self._lock = threading.Lock()
+        self._writes = {}
+
+    def add(self, key, value, raw, timeout):
+        """Queue a value to be written."""
+        with self._lock:
+            self._writes[key] = (value, raw, timeout)
+
+    def get(self, key):
+        """Get the value queued for a key, or None."""
+        with self._lock:
+            write = self._writes.get(key)
+        return None if write is None else write[0]
+
+    def flush(self):
+        """Write all queued values and bump the cache generation."""
+        with self._lock:
+            writes, self._writes = self._writes, {}
+        if not writes:
+            return
+        prefix = cache()._get_prefix()
+        pipe = cache()._write_client.pipeline(transaction=False)
+        for key, (_, raw, timeout) in writes.items():
+            pipe.setex(prefix + key, timeout, raw)
+            instrumentation.REDIS_BYTES.labels("set", key_prefix(key)).observe(
+                len(raw)
+            )
+        pipe.incr(prefix + GENERATION_KEY)
+        results = instrumentation.redis_call("pipeline", "batch", pipe.execute)
+        _generation["value"] = results[-1]
+        _generation["checked"] = time.monotonic()
+        for key, (value, raw, timeout) in writes.items():
+            local_cache().put(key, value, len(raw), results[-1], timeout)
+
+
+_batches = threading.local()
+
+
+def current_batch():
+    """Get the batch the current thread is storing into, if any."""
+    return getattr(_batches, "batch", None)
+
+
+@contextlib.contextmanager
+def batch(shared=None, kept=()):
+    """Write values stored with ``invalidate`` in one Redis round trip.
+
+    Values are written, and the cache generation bumped once, when the
+    outermost block exits. They are available from the local cache in the
+    meantime. Worker threads join a batch by passing it as ``shared``; only
+    the block that created a batch flushes it.
+
+    A batch also scopes purges: a key purged once in a batch is not
+    recomputed when it is purged again, so collectors which share a parent
+    all derive from the same fresh copy. Keys in ``kept`` are not purged at
+    all while a value is stored for them, for inputs which are refreshed on
+    a schedule of their own.
+    """
+    previous = current_batch()
+    owner = shared is None and previous is None
+    _batches.batch = shared or previous or Batch(kept)
+    try:
+        yield _batches.batch
+        if owner:
+            _batches.batch.flush()
+    finally:
+        _batches.batch = previous
+
+
+def lock(key):
+    """Get the Redis lock used to refresh a key from a single process."""
+    timeout = flask.current_app.config.get("CACHE_LOCK_TIMEOUT", 120)
+    return cache()._write_client.lock(
+        cache()._get_prefix() + "lock:" + key,
+        timeout=timeout,
+        thread_local=False,
+    )
+
+
+def _release(lock):
+    try:
+        lock.release()
+    except redis.exceptions.LockError:
+        # The lock expired while we were working
+        pass
+
+
+def _ttls(key, expiry, stale):
+    """Get the (soft, hard) expiry of a cache key in seconds."""
+    override = flask.current_app.config.get("CACHE_TTLS", {}).get(key)
+    if override:
+        return tuple(override)
+    return expiry, expiry + (expiry if stale is None else stale)
+
+
+def _value(cache_key, entry):
+    """Get the value of a cache entry, raising NotFound for a missing one."""
+    if entry[1] is None:
+        raise NotFound(cache_key)
+    return entry[1]
+
+
+# Breaker window each cache key was last pinned for, by cache key
+_pinned = {}
+_pinned_lock = threading.Lock()
+
+
+def _pin(breaker, cache_key, seconds):
+    """Keep the value stored for a key for at least ``seconds`` more.
+
+    Used while a value cannot be refreshed, so that the last good value
+    outlives an outage of the API it is collected from. Values are stored
+    for ``hard`` seconds, so this never shortens their life. While the
+    breaker is open a value is only pinned once per backoff window, rather
+    than by every request served it.
+    """
+    until = breaker.until
+    with _pinned_lock:
+        now = time.monotonic()
+        if until > now and _pinned.get(cache_key) == until:
+            return
+        for pinned in [k for k, v in _pinned.items() if v <= now]:
+            del _pinned[pinned]
+        if until > now:
+            _pinned[cache_key] = until
+    instrumentation.redis_call(
+        "expire",
+        key_prefix(cache_key),
+        cache()._write_client.expire,
+        cache()._get_prefix() + cache_key,
+        seconds,
     )
 
 
-def cached(key, expiry=3600):
-    """Cache decorated function return value."""
+# Number of cached functions being computed by each thread, and whether the
+# thread is refreshing a stale value in the background
+_computing = threading.local()
+
+
+def _served_stale(key, breaker, cache_key, entry, soft):
+    """Serve a value because its collector's breaker is open.
+
+    A value being computed from this one is refused instead, so that it is
+    not stored as fresh.
+    """
+    if getattr(_computing, "depth", 0):
+        raise circuit.CircuitOpen(breaker.name, breaker.until)
+    instrumentation.CACHE_REQUESTS.labels(key, "circuit_open").inc()
+    circuit.mark_stale(entry[0] - soft)
+    return _value(cache_key, entry)
+
+
+def _compute(
+    key, cache_key, f, args, kwargs, soft, hard, invalidate=False, missing=None
+):
+    """Call a cached function through its breaker and store its result.
+
+    Exceptions for which ``missing`` is true are remembered for
+    ``CACHE_MISSING_TTL`` seconds and raised as NotFound. When the breaker
+    refuses the call or the call fails, the value already stored is kept
+    for another ``hard`` seconds.
+    """
+    breaker = circuit.breaker(f.__name__)
+    _computing.depth = getattr(_computing, "depth", 0) + 1
+    try:
+        breaker.check()
+        r = f(*args, **kwargs)
+    except circuit.CircuitOpen as e:
+        # Refused here, or by the breaker of a value this one depends on
+        breaker.hold(e.until)
+        _pin(breaker, cache_key, hard)
+        raise
+    except NotFound:
+        # From a value this one depends on, which did not fail either
+        raise
+    except Exception as e:
+        if missing is None or not missing(e):
+            breaker.failure()
+            _pin(breaker, cache_key, hard)
+            raise
+        # The API answered, just not with anything
+        breaker.success()
+        ttl = flask.current_app.config.get("CACHE_MISSING_TTL", 60)
+        if ttl:
+            store(cache_key, (time.time() + ttl, None), ttl, invalidate)
+            logger.debug("Cached missing value for %s for %s", cache_key, ttl)
+        raise NotFound(cache_key) from e
+    finally:
+        _computing.depth -= 1
+    breaker.success()
+    store(cache_key, (time.time() + soft, r), hard, invalidate=invalidate)
+    logger.debug("Cached value for %s for %s/%s", cache_key, soft, hard)
+    return r
+
+
+def _compute_in_background(
+    key, cache_key, f, args, kwargs, soft, hard, missing=None
+):
+    """Refresh a stale value in a thread unless another process is already.
+
+    Stale values it is computed from are refreshed first, rather than
+    storing a value derived from them as fresh.
+    """
+    refresh_lock = lock(cache_key)
+    if not refresh_lock.acquire(blocking=False):
+        return
+    app = flask.current_app._get_current_object()
+
+    def run():
+        _computing.revalidating = True
+        with app.app_context():
+            try:
+                _compute(
+                    key, cache_key, f, args, kwargs, soft, hard, True, missing
+                )
+            except (circuit.CircuitOpen, NotFound):
+                pass
+            except Exception:
+                logger.exception("Error refreshing %s", cache_key)
+            finally:
+                _release(refresh_lock)
+
+    threading.Thread(
+        target=run, name="refresh-{}".format(cache_key), daemon=True
+    ).start()
+
+
+def _revalidate(key, cache_key, f, args, kwargs, soft, hard, missing=None):
+    """Refresh a stale input of a value being refreshed in the background.
+
+    If another process is already refreshing the input, its result is used.
+    """
+    instrumentation.CACHE_REQUESTS.labels(key, "revalidate").inc()
+    refresh_lock = lock(cache_key)
+    if not refresh_lock.acquire(blocking=False):
+        entry = _settle(cache_key)
+        if entry is not None:
+            return _value(cache_key, entry)
+        refresh_lock = None
+    try:
+        return _compute(
+            key, cache_key, f, args, kwargs, soft, hard, True, missing
+        )
+    finally:
+        if refresh_lock is not None:
+            _release(refresh_lock)
+
+
+def _wait(cache_key, refresh_lock):
+    """Wait for another process to store a value for a key."""
+    while refresh_lock.locked():
+        time.sleep(0.1)
+        entry = load(cache_key)
+        if entry is not None:
+            return entry
+    return load(cache_key)
+
+
+def _settle(cache_key):
+    """Get a value once any process refreshing it has finished."""
+    refresh_lock = lock(cache_key)
+    while refresh_lock.locked():
+        time.sleep(0.1)
+    return load(cache_key)
+
+
+def _claim_purge(cache_key):
+    """Check that a key has not been purged in the last few seconds.
+
+    Only the first purge of a key in ``CACHE_PURGE_INTERVAL`` seconds, by
+    any process, recomputes it.
+    """
+    interval = flask.current_app.config.get("CACHE_PURGE_INTERVAL", 10)
+    if not interval:
+        return True
+    return bool(
+        cache()._write_client.set(
+            cache()._get_prefix() + "purged:" + cache_key,
+            1,
+            nx=True,
+            ex=interval,
+        )
+    )
+
+
+def _purge_once(key, cache_key, f, args, kwargs, soft, hard, missing=None):
+    """Recompute a value unless another purge already has.
+
+    While the breaker of the value is open the stored value is used.
+    """
+    requests = instrumentation.CACHE_REQUESTS
+    if not _claim_purge(cache_key):
+        entry = _settle(cache_key)
+        if entry is not None:
+            requests.labels(key, "purge_limited").inc()
+            return _value(cache_key, entry)
+    refresh_lock = lock(cache_key)
+    if not refresh_lock.acquire(blocking=False):
+        # A scheduled refresh is running; use its result
+        entry = _settle(cache_key)
+        if entry is not None:
+            requests.labels(key, "purge_coalesced").inc()
+            return _value(cache_key, entry)
+        refresh_lock = None
+    try:
+        requests.labels(key, "purge").inc()
+        return _compute(
+            key, cache_key, f, args, kwargs, soft, hard, True, missing
+        )
+    except circuit.CircuitOpen:
+        entry = load(cache_key)
+        if entry is None or getattr(_computing, "depth", 0):
+            raise
+        breaker = circuit.breaker(f.__name__)
+        return _served_stale(key, breaker, cache_key, entry, soft)
+    finally:
+        if refresh_lock is not None:
+            _release(refresh_lock)
+
+
+# Futures of the purges running in this process, by cache key
+_purges = {}
+_purges_lock = threading.Lock()
+
+
+def _purge(key, cache_key, f, args, kwargs, soft, hard, missing=None):
+    """Recompute a value at most once per batch and once at a time."""
+    pending = current_batch()
+    if pending is not None:
+        entry = pending.get(cache_key)
+        if entry is not None:
+            instrumentation.CACHE_REQUESTS.labels(key, "purge_memo").inc()
+            return _value(cache_key, entry)
+        if cache_key in pending.kept:
+            entry = load(cache_key)
+            if entry is not None:
+                instrumentation.CACHE_REQUESTS.labels(key, "purge_kept").inc()
+                return _value(cache_key, entry)
+    with _purges_lock:
+        running = _purges.get(cache_key)
+        if running is None:
+            _purges[cache_key] = concurrent.futures.Future()
+    if running is not None:
+        instrumentation.CACHE_REQUESTS.labels(key, "purge_coalesced").inc()
+        return running.result()
+    future = _purges[cache_key]
+    try:
+        r = _purge_once(key, cache_key, f, args, kwargs, soft, hard, missing)
+        future.set_result(r)
+        return r
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _purges_lock:
+            del _purges[cache_key]
+
+
+def _cache_key(key, args, kwargs):
+    """Get the cache key for a call of a cached function."""
+    return "{}:{}{}".format(
+        key,
+        ";".join(str(arg) for arg in args),
+        ";".join(
+            "{}={}".format(k, v)
+            for k, v in sorted(kwargs.items())
+            if k != "cached"
+        ),
+    )
+
+
+def cached(key, expiry=3600, stale=None, missing=None):
+    """Cache decorated function return value.
+
+    Values are fresh for ``expiry`` seconds. After that they are served
+    stale for up to ``stale`` more seconds (default: ``expiry``) while one
+    process refreshes them in the background, first refreshing any stale
+    values they are computed from. ``CACHE_TTLS`` in the app
+    config can override the (soft, hard) expiry of a key.
+
+    Calling with ``cached=False`` purges the value. Collectors pass
+    ``cached`` on to the collectors they are derived from, so a purge
+    recomputes the whole chain. Within a batch() each key is recomputed at
+    most once, concurrent purges of a key share one computation, and a key
+    purged in the last ``CACHE_PURGE_INTERVAL`` seconds is served from the
+    cache.
+
+    ``missing`` tells the exceptions meaning that nothing exists for the
+    arguments, such as a 404 from the API. They are remembered for
+    ``CACHE_MISSING_TTL`` seconds and raised as NotFound. The function is
+    called through the circuit.Breaker named after it; while it is open,
+    stored values are served past their expiry and the request is marked
+    stale, and values which are not stored raise circuit.CircuitOpen.
+
+    The decorated function gets a ``refresh`` attribute which recomputes
+    and stores a value while reading anything it depends on from the cache.
+    It returns None without doing anything if another process is already
+    refreshing the value. The ``key`` attribute gets the cache key used for
+    a call.
+    """
+    register(key)
 
     def real_cached(f):
+        def refresh(*args, invalidate=True, **kwargs):
+            cache_key = _cache_key(key, args, kwargs)
+            soft, hard = _ttls(key, expiry, stale)
+            refresh_lock = lock(cache_key)
+            if not refresh_lock.acquire(blocking=False):
+                return None
+            try:
+                instrumentation.CACHE_REQUESTS.labels(key, "refresh").inc()
+                return _compute(
+                    key,
+                    cache_key,
+                    f,
+                    args,
+                    kwargs,
+                    soft,
+                    hard,
+                    invalidate,
+                    missing,
+                )
+            finally:
+                _release(refresh_lock)
+
         @functools.wraps(f)
         def wrapper(*args, **kwargs):
-            cache_key = "{}:{}{}".format(
-                key,
-                ";".join(str(arg) for arg in args),
-                ";".join(
-                    "{}={}".format(k, v)
-                    for k, v in sorted(kwargs.items())
-                    if k != "cached"
-                ),
-            )
-            cached = kwargs.get("cached", True)
-            r = cache().get(cache_key) if cached else None
-            if r is None:
-                if cached:
-                    logger.debug("Cache miss for %s", cache_key)
-                r = f(*args, **kwargs)
-                cache().set(cache_key, r, timeout=expiry)
-                logger.debug("Cached value for %s for %s", cache_key, expiry)
-            return r
+            cache_key = _cache_key(key, args, kwargs)
+            soft, hard = _ttls(key, expiry, stale)
+            requests = instrumentation.CACHE_REQUESTS
+            if not kwargs.get("cached", True):
+                return _purge(
+                    key, cache_key, f, args, kwargs, soft, hard, missing
+                )
+
+            breaker = circuit.breaker(f.__name__)
+            entry = load(cache_key)
+            if entry is not None:
+                fresh_until, r = entry
+                if r is None:
+                    requests.labels(key, "missing").inc()
+                    raise NotFound(cache_key)
+                if fresh_until >= time.time():
+                    requests.labels(key, "hit").inc()
+                elif breaker.refusing():
+                    _pin(breaker, cache_key, hard)
+                    return _served_stale(key, breaker, cache_key, entry, soft)
+                elif getattr(_computing, "revalidating", False):
+                    return _revalidate(
+                        key, cache_key, f, args, kwargs, soft, hard, missing
+                    )
+                else:
+                    logger.debug("Serving stale value for %s", cache_key)
+                    requests.labels(key, "stale").inc()
+                    _compute_in_background(
+                        key, cache_key, f, args, kwargs, soft, hard, missing
+                    )
+                return r
+
+            logger.debug("Cache miss for %s", cache_key)
+            requests.labels(key, "miss").inc()
+            refresh_lock = lock(cache_key)
+            if not refresh_lock.acquire(blocking=False):
+                # Someone else is already computing this value
+                entry = _wait(cache_key, refresh_lock)
+                if entry is not None:
+                    return _value(cache_key, entry)
+                refresh_lock = None
+            try:
+                return _compute(
+                    key,
+                    cache_key,
+                    f,
+                    args,
+                    kwargs,
+                    soft,
+                    hard,
+                    missing=missing,
+                )
+            finally:
+                if refresh_lock is not None:
+                    _release(refresh_lock)
 
+        wrapper.refresh = refresh
+        wrapper.key = lambda *args, **kwargs: _cache_key(key, args, kwargs)
         return wrapper
 
     return real_cached
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Circuit breakers around the collectors of cached values.
+
+After ``CIRCUIT_FAILURES`` consecutive failures of a collector, calls to
+it are refused for ``CIRCUIT_BACKOFF`` seconds. Each failure of the single
+call let through after that doubles the wait, up to ``CIRCUIT_MAX_BACKOFF``
+seconds, and a success closes the breaker again.
+While a breaker is open the cache serves the last value it stored, and
+requests served such a value are marked as stale. Values computed from
+others hold their breaker open for as long as those of their inputs are,
+rather than being stored as fresh.
+
+Breakers are kept per process, like the local cache, and named after the
+collectors they guard: get_pod() and get_pods() are cached under the same
+key prefix, but the API failing for one does not refuse calls to the other.
+"""
+import logging
+import threading
+import time
+
+import flask
+
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpen(Exception):
+    """A call was refused because its breaker is open.
+
+    ``until`` is the time.monotonic() value at which calls may be tried
+    again.
+    """
+
+    def __init__(self, name, until):
+        """Create an exception for the breaker called ``name``."""
+        super().__init__(name, until)
+        self.name = name
+        self.until = until
+
+
+class Breaker:
+    """Count consecutive failures of calls and refuse them after too many."""
+
+    def __init__(self, name, failures=3, backoff=5, max_backoff=300):
+        """Create a closed breaker."""
+        self.name = name
+        self.failures = failures
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._failed = 0
+        self.until = 0.0
+
+    def refusing(self):
+        """Check if calls are currently being refused."""
+        return self.until > time.monotonic()
+
+    def check(self):
+        """Raise CircuitOpen if a call should not be made now.
+
+        Once the wait is over a single call is let through to try again;
+        others are refused until it reports its failure or success.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.until > now:
+                raise CircuitOpen(self.name, self.until)
+            if self._failed >= self.failures:
+                self.until = now + self._wait()
+
+    def hold(self, until):
+        """Refuse calls until a breaker this one depends on may be retried."""
+        with self._lock:
+            self.until = max(self.until, until)
+
+    def failure(self):
+        """Record a failed call, opening the breaker after too many."""
+        with self._lock:
+            self._failed += 1
+            if self._failed < self.failures:
+                return
+            wait = self._wait()
+            self.until = time.monotonic() + wait
+        logger.warning("Circuit for %s open for %ss", self.name, wait)
+
+    def success(self):
+        """Record a successful call, closing the breaker."""
+        with self._lock:
+            if self._failed >= self.failures:
+                logger.info("Circuit for %s closed", self.name)
+            self._failed = 0
+            self.until = 0.0
+
+    def _wait(self):
+        """Get the seconds to refuse calls for after the latest failure."""
+        doublings = max(self._failed - self.failures, 0)
+        return min(self.backoff * 2 ** min(doublings, 32), self.max_backoff)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(name):
+    """Get the breaker for a collector."""
+    with _breakers_lock:
+        if name not in _breakers:
+            config = flask.current_app.config
+            _breakers[name] = Breaker(
+                name,
+                failures=config.get("CIRCUIT_FAILURES", 3),
+                backoff=config.get("CIRCUIT_BACKOFF", 5),
+                max_backoff=config.get("CIRCUIT_MAX_BACKOFF", 300),
+            )
+        return _breakers[name]
+
+
+def mark_stale(since):
+    """Note that the current request was served a value computed at since.
+
+    ``since`` is in epoch seconds. The oldest time is kept.
+    """
+    if not flask.has_app_context():
+        return
+    current = flask.g.get("stale_since")
+    if current is None or since < current:
+        flask.g.stale_since = since
+
+
+def stale_since():
+    """Get when the oldest stale value served to this request was computed."""
+    if not flask.has_app_context():
+        return None
+    return flask.g.get("stale_since")
@@ -18,108 +18,454 @@
 # with this program.  If not, see <http://www.gnu.org/licenses/>.
 """Kubernetes client and data collection."""
 import collections
+import concurrent.futures
+import contextlib
 import datetime
 import functools
+import threading
+import time
+
+import flask
+import natsort
+import orjson
+
+from . import aggregates
+from . import cache
+from . import circuit
+from . import informer
+from . import instrumentation
+from . import lazy
+from . import records
+from . import snapshot
+from . import tables
+from .cache import cached
 
-import kubernetes
-import kubernetes.utils.quantity
 
-from .cache import cached
+kubernetes = lazy.Module("kubernetes")
 
 
-kubernetes.config.load_incluster_config()
+def configuration():
+    """Load the settings used to connect to the Kubernetes API.
+
+    ``K8S_CLIENT_CONFIG`` chooses how: ``incluster`` uses the service
+    account of the pod we run in and ``kubeconfig`` loads the
+    ``K8S_CONTEXT`` context of the ``K8S_KUBECONFIG`` file, or the current
+    context of the default kubeconfig. It can also be set from code to a
+    callable which returns a kubernetes.client.Configuration, for example
+    one pointing at a fake API server.
+    """
+    config = flask.current_app.config
+    source = config.get("K8S_CLIENT_CONFIG", "incluster")
+    if callable(source):
+        return source()
+    configuration = kubernetes.client.Configuration()
+    if source == "incluster":
+        kubernetes.config.load_incluster_config(
+            client_configuration=configuration
+        )
+    elif source == "kubeconfig":
+        kubernetes.config.load_kube_config(
+            config_file=config.get("K8S_KUBECONFIG"),
+            context=config.get("K8S_CONTEXT"),
+            client_configuration=configuration,
+        )
+    else:
+        raise ValueError("Unknown K8S_CLIENT_CONFIG: {}".format(source))
+    return configuration
 
 
-def parse_quantity(val):
-    """Parse kubernetes quantity like 200Mi to a decimal number."""
-    return kubernetes.utils.quantity.parse_quantity(val)
+def not_found(e):
+    """Check if an exception is a 404 from the Kubernetes API."""
+    return isinstance(e, kubernetes.client.ApiException) and e.status == 404
+
+
+@functools.lru_cache()
+def api_client():
+    """Get the API client shared by the typed API clients.
+
+    The configuration is loaded on first use rather than at import so the
+    app starts without reaching the cluster. ``K8S_CONNECTION_POOL_SIZE``
+    sets how many connections to the API server are kept open for reuse.
+    """
+    settings = configuration()
+    size = flask.current_app.config.get("K8S_CONNECTION_POOL_SIZE")
+    if size:
+        settings.connection_pool_maxsize = size
+    return _bounded(
+        instrumentation.instrument(kubernetes.client.ApiClient(settings))
+    )
+
+
+# time.monotonic() by which API calls made by each thread must be done
+_deadlines = threading.local()
+
+
+@contextlib.contextmanager
+def deadline(until):
+    """Bound the API calls made in this block to end by ``until``.
+
+    ``until`` is a time.monotonic() value. Calls are sent with the time
+    left as their ``_request_timeout``, and calls made after it raise
+    TimeoutError, so that calls whose result nobody waits for any more do
+    not hold on to threads and connections.
+    """
+    previous = getattr(_deadlines, "until", None)
+    _deadlines.until = until if previous is None else min(until, previous)
+    try:
+        yield
+    finally:
+        _deadlines.until = previous
+
+
+def _bounded(api_client):
+    """Send the calls of an ApiClient with the time left before deadline()."""
+    call_api = api_client.call_api
+
+    def bounded_call_api(*args, **kwargs):
+        until = getattr(_deadlines, "until", None)
+        if until is not None:
+            left = until - time.monotonic()
+            if left <= 0:
+                raise TimeoutError("API call deadline passed")
+            timeout = kwargs.get("_request_timeout")
+            if timeout is None or isinstance(timeout, (int, float)):
+                kwargs["_request_timeout"] = min(timeout or left, left)
+        return call_api(*args, **kwargs)
+
+    api_client.call_api = bounded_call_api
+    return api_client
 
 
 @functools.lru_cache()
 def corev1_client():
     """Get CoreV1 API client."""
-    return kubernetes.client.CoreV1Api()
+    return kubernetes.client.CoreV1Api(api_client())
 
 
 @functools.lru_cache()
 def appsv1_client():
     """Get CoreV1 API client."""
-    return kubernetes.client.AppsV1Api()
+    return kubernetes.client.AppsV1Api(api_client())
 
 
 @functools.lru_cache()
 def networkingv1_client():
     """Get ExtensionsV1beta1 API client."""
-    return kubernetes.client.NetworkingV1Api()
+    return kubernetes.client.NetworkingV1Api(api_client())
 
 
 @functools.lru_cache()
 def batchv1_client():
     """Get BatchV1 API client."""
-    return kubernetes.client.BatchV1Api()
+    return kubernetes.client.BatchV1Api(api_client())
 
 
 @functools.lru_cache()
 def custom_client():
     """Get CustomObjects API client."""
-    return kubernetes.client.CustomObjectsApi()
+    return kubernetes.client.CustomObjectsApi(api_client())
+
+
+# Cluster-wide list methods used to feed informers, by resource kind
+INFORMER_SOURCES = {
+    "pods": (corev1_client, "list_pod_for_all_namespaces"),
+    "nodes": (corev1_client, "list_node"),
+    "namespaces": (corev1_client, "list_namespace"),
+    "services": (corev1_client, "list_service_for_all_namespaces"),
+    "ingresses": (networkingv1_client, "list_ingress_for_all_namespaces"),
+    "daemonsets": (appsv1_client, "list_daemon_set_for_all_namespaces"),
+    "deployments": (appsv1_client, "list_deployment_for_all_namespaces"),
+    "replicasets": (appsv1_client, "list_replica_set_for_all_namespaces"),
+    "statefulsets": (appsv1_client, "list_stateful_set_for_all_namespaces"),
+    "cronjobs": (batchv1_client, "list_cron_job_for_all_namespaces"),
+    "jobs": (batchv1_client, "list_job_for_all_namespaces"),
+    "resourcequotas": (
+        corev1_client,
+        "list_resource_quota_for_all_namespaces",
+    ),
+}
+
+# Projections applied to listed objects, by resource kind
+RECORDS = {
+    "pods": records.pod_record,
+    "nodes": records.node_record,
+    "namespaces": records.namespace_record,
+}
+
+# Secondary indexes to maintain for informer stores, by resource kind
+INFORMER_INDEXERS = {
+    "pods": snapshot.POD_INDEXERS,
+    "nodes": {},
+    "namespaces": {},
+}
+
+# Totals maintained alongside the contents of stores, by resource kind
+AGGREGATES = {
+    "pods": {"totals": aggregates.PodTotals},
+    "nodes": {"totals": aggregates.NodeTotals},
+    "metrics:nodes": {"totals": aggregates.UsageTotals},
+}
+
+# Stores updated from each fresh LIST, by resource kind, in processes which
+# track_deltas()
+_deltas = None
+_deltas_lock = threading.Lock()
+
+
+def start_informers(kinds):
+    """Start LIST+WATCH informers for the given resource kinds."""
+    for kind in kinds:
+        client, method = INFORMER_SOURCES[kind]
+        informer.start(
+            kind,
+            getattr(client(), method),
+            transform=RECORDS.get(kind),
+            indexers=INFORMER_INDEXERS.get(kind),
+            aggregates=AGGREGATES.get(kind),
+            page_size=_page_size(),
+        )
+
+
+def track_deltas():
+    """Keep stores of cluster-wide lists to update with each fresh LIST.
+
+    Only the refresh daemon does, as it lists everything every round. Other
+    processes rarely compute totals, so they build them from scratch rather
+    than each keeping a copy of every pod.
+    """
+    global _deltas
+    with _deltas_lock:
+        if _deltas is None:
+            _deltas = {}
+
+
+def _delta(kind, items, key=snapshot.record_key, version=None):
+    """Get a snapshot of a fresh list of objects of a kind.
+
+    Where track_deltas() was called the list is applied to the store for the
+    kind, and only objects which changed since the previous list are
+    re-indexed and re-aggregated. ``key`` and ``version`` are as for
+    Snapshot.update.
+    """
+    if _deltas is None:
+        return snapshot.Snapshot(
+            ((key(obj), obj) for obj in items),
+            INFORMER_INDEXERS.get(kind, {}),
+            AGGREGATES.get(kind),
+        )
+    with _deltas_lock:
+        if kind not in _deltas:
+            _deltas[kind] = informer.Store(
+                INFORMER_INDEXERS.get(kind, {}), AGGREGATES.get(kind)
+            )
+        store = _deltas[kind]
+    store.update(((key(obj), obj) for obj in items), version)
+    return store
+
+
+def _page_size():
+    """Get the number of objects to request per LIST page."""
+    return flask.current_app.config.get("K8S_LIST_PAGE_SIZE", 500)
+
+
+def paginate(list_func, page_size=None, **kwargs):
+    """Yield the items of each page of a LIST using continue tokens.
+
+    With ``K8S_RAW_JSON`` enabled the response body is parsed with orjson
+    and items are returned as records.Resource wrappers instead of going
+    through the much slower ``kubernetes.client`` model deserialization.
+    """
+    raw = flask.current_app.config.get("K8S_RAW_JSON", False)
+    token = None
+    while True:
+        kwargs.update(limit=page_size or _page_size(), _continue=token)
+        if raw:
+            data = orjson.loads(
+                list_func(_preload_content=False, **kwargs).data
+            )
+            items = [records.Resource(obj) for obj in data["items"]]
+            token = data["metadata"].get("continue")
+        else:
+            resp = list_func(**kwargs)
+            items = resp.items
+            token = resp.metadata._continue
+        yield items
+        if not token:
+            return
+
+
+def _iter(kind, list_func, **kwargs):
+    """Yield objects from an informer store or a paginated LIST.
+
+    Kinds with an entry in RECORDS are projected to compact records one
+    page at a time, so only a single page of full objects is ever held in
+    memory.
+    """
+    store = informer.store(kind)
+    if store is not None:
+        yield from store.values(kwargs.get("namespace"))
+        return
+    project = RECORDS.get(kind)
+    for items in paginate(list_func, **kwargs):
+        if project is None:
+            yield from items
+        else:
+            yield from (project(obj) for obj in items)
+
+
+def _list(kind, list_func, **kwargs):
+    """List objects from an informer store or the API server."""
+    return list(_iter(kind, list_func, **kwargs))
+
+
+def _read(kind, read_func, name, namespace=None):
+    """Read an object from an informer store or the API server."""
+    store = informer.store(kind)
+    if store is not None:
+        key = (name,) if namespace is None else (namespace, name)
+        obj = store.get(*key)
+        if obj is not None:
+            return obj
+    if namespace is None:
+        return read_func(name)
+    return read_func(name, namespace)
+
+
+def _executor(calls):
+    """Get a thread pool to run ``calls`` collectors concurrently.
+
+    Every fetch_many() gets a pool of its own of at most
+    ``K8S_FETCH_WORKERS`` threads, so that calls still running after a
+    timeout only hold up the request which made them.
+    """
+    workers = flask.current_app.config.get("K8S_FETCH_WORKERS", 10)
+    return concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(min(calls, workers), 1),
+        thread_name_prefix="fetch",
+    )
+
+
+def fetch_many(calls, timeout=None):
+    """Run several collectors concurrently.
+
+    ``calls`` maps result names to zero argument callables, typically
+    ``functools.partial`` wrappers of ``get_*`` functions. Returns a tuple of
+    (results, errors) dicts keyed by the same names. Calls which raise or
+    which do not finish within ``timeout`` seconds are reported in errors
+    and missing from results. The API calls they make are bound by the same
+    deadline(). Stale values served to the calls mark the current request
+    as stale.
+    """
+    app = flask.current_app._get_current_object()
+    if timeout is None:
+        timeout = app.config.get("K8S_FETCH_TIMEOUT", 30)
+    until = time.monotonic() + timeout
+    batch = cache.current_batch()
+    stale = []
+
+    def run(call):
+        with app.app_context(), deadline(until):
+            try:
+                if batch is None:
+                    return call()
+                with cache.batch(batch):
+                    return call()
+            finally:
+                since = circuit.stale_since()
+                if since is not None:
+                    stale.append(since)
+
+    executor = _executor(len(calls))
+    futures = {
+        executor.submit(run, call): name for name, call in calls.items()
+    }
+    done, not_done = concurrent.futures.wait(futures, timeout=timeout)
+    executor.shutdown(wait=False, cancel_futures=True)
+    results, errors = {}, {}
+    for future in done:
+        name = futures[future]
+        error = future.exception()
+        if error is None:
+            results[name] = future.result()
+        else:
+            errors[name] = error
+    for future in not_done:
+        future.cancel()
+        errors[futures[future]] = TimeoutError(
+            "Timed out after {}s".format(timeout)
+        )
+    for since in stale:
+        circuit.mark_stale(since)
+    return results, errors
 
 
 def get_version():
     """Get version information about the Kubernetes cluster."""
-    return kubernetes.client.VersionApi().get_code()
+    return kubernetes.client.VersionApi(api_client()).get_code()
 
 
+@informer.informed("namespaces")
 @cached("namespaces", 600)
 def get_namespaces(cached=True):
     """Get a list of all namespaces in the cluster."""
     v1 = corev1_client()
     return {
-        "items": v1.list_namespace().items,
+        "items": _list("namespaces", v1.list_namespace),
         "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
     }
 
 
+@informer.informed("pods")
 @cached("pods", 300)
 def get_pods(namespace, cached=True):
     """Get a list of all pods in a namespace."""
     v1 = corev1_client()
     return {
-        "items": v1.list_namespaced_pod(namespace=namespace).items,
+        "items": _list("pods", v1.list_namespaced_pod, namespace=namespace),
         "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
     }
 
 
+@informer.informed("services")
 @cached("services", 300)
 def get_services(namespace, cached=True):
     """Get a list of all services in a namespace."""
     v1 = corev1_client()
     return {
-        "items": v1.list_namespaced_service(namespace=namespace).items,
+        "items": _list(
+            "services", v1.list_namespaced_service, namespace=namespace
+        ),
         "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
     }
 
 
+@informer.informed("ingresses")
 @cached("ingresses", 300)
 def get_ingresses(namespace, cached=True):
     """Get a list of all ingresses in a namespace."""
     v1 = networkingv1_client()
     return {
-        "items": v1.list_namespaced_ingress(namespace=namespace).items,
+        "items": _list(
+            "ingresses", v1.list_namespaced_ingress, namespace=namespace
+        ),
         "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
     }
 
 
-@cached("ingresses", 300)
+@informer.informed("ingresses")
+@cached("ingresses", 300, missing=not_found)
 def get_ingress(namespace, name, cached=True):
     """Get a list of all ingresses in a namespace."""
     v1 = networkingv1_client()
     return {
-        "ingress": v1.read_namespaced_ingress(name, namespace),
+        "ingress": _read(
+            "ingresses", v1.read_namespaced_ingress, name, namespace
+        ),
         "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
     }
 
 
+@informer.informed("ingresses")
 @cached("ingresses:__by_ns__", 300)
 def get_ingresses_by_namespace(cached=True):
     """Get a list of all ingress objects grouped by namespace."""
@@ -130,104 +476,158 @@ def get_ingresses_by_namespace(cached=True):
         "total_ingresses": 0,
     }
     v1 = networkingv1_client()
-    for ingress in v1.list_ingress_for_all_namespaces().items:
+    for ingress in _iter("ingresses", v1.list_ingress_for_all_namespaces):
         ns = ingress.metadata.namespace
-        data["namespaces"][ns].append(ingress)
+        data["namespaces"][ns].append(records.object_record(ingress))
         data["total_ingresses"] += 1
     data["active_namespaces"] = len(data["namespaces"].keys())
     return data
 
 
+@informer.informed("daemonsets")
 @cached("daemonsets", 300)
 def get_daemonsets(namespace, cached=True):
     """Get a list of all daemonsets in a namespace."""
     v1 = appsv1_client()
     return {
-        "items": v1.list_namespaced_daemon_set(namespace=namespace).items,
+        "items": _list(
+            "daemonsets", v1.list_namespaced_daemon_set, namespace=namespace
+        ),
         "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
     }
 
 
+@informer.informed("deployments")
 @cached("deployments", 300)
 def get_deployments(namespace, cached=True):
     """Get a list of all deployments in a namespace."""
     v1 = appsv1_client()
     return {
-        "items": v1.list_namespaced_deployment(namespace=namespace).items,
+        "items": _list(
+            "deployments", v1.list_namespaced_deployment, namespace=namespace
+        ),
         "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
     }
 
 
+@informer.informed("replicasets")
 @cached("replicasets", 300)
 def get_replicasets(namespace, cached=True):
     """Get a list of all replicasets in a namespace."""
     v1 = appsv1_client()
     return {
-        "items": v1.list_namespaced_replica_set(namespace=namespace).items,
+        "items": _list(
+            "replicasets", v1.list_namespaced_replica_set, namespace=namespace
+        ),
         "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
     }
 
 
+@informer.informed("statefulsets")
 @cached("statefulsets", 300)
 def get_statefulsets(namespace, cached=True):
     """Get a list of all statefulsets in a namespace."""
     v1 = appsv1_client()
     return {
-        "items": v1.list_namespaced_stateful_set(namespace=namespace).items,
+        "items": _list(
+            "statefulsets",
+            v1.list_namespaced_stateful_set,
+            namespace=namespace,
+        ),
         "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
     }
 
 
+@informer.informed("cronjobs")
 @cached("cronjobs", 300)
 def get_cronjobs(namespace, cached=True):
     """Get a list of all cronjobs in a namespace."""
     v1 = batchv1_client()
     return {
-        "items": v1.list_namespaced_cron_job(namespace=namespace).items,
+        "items": _list(
+            "cronjobs", v1.list_namespaced_cron_job, namespace=namespace
+        ),
         "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
     }
 
 
+@informer.informed("jobs")
 @cached("jobs", 300)
 def get_jobs(namespace, cached=True):
     """Get a list of all jobs in a namespace."""
     v1 = batchv1_client()
     return {
-        "items": v1.list_namespaced_job(namespace=namespace).items,
+        "items": _list("jobs", v1.list_namespaced_job, namespace=namespace),
         "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
     }
 
 
+@informer.informed("pods")
 @cached("pods:__all__", 300)
 def get_all_pods(cached=True):
     """Get a list of all pods."""
     v1 = corev1_client()
     return {
-        "items": v1.list_pod_for_all_namespaces().items,
+        "items": _list("pods", v1.list_pod_for_all_namespaces),
+        "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
+    }
+
+
+@informer.informed("pods")
+@cached("pods:__totals__", 300)
+def get_pod_totals(cached=True):
+    """Get aggregates.PodTotals and counts of pods scheduled on each node."""
+    pods = informer.store("pods")
+    if pods is None:
+        pods = _delta(
+            "pods",
+            get_all_pods(cached=cached)["items"],
+            version=snapshot.pod_version,
+        )
+    return {
+        # Copies, as stores keep changing while cached values must not
+        "totals": pods.aggregate("totals"),
+        "scheduled": pods.counts("scheduled"),
         "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
     }
 
 
+def pods_by(index, value, cached=True):
+    """List the pods having a value in one of snapshot.POD_INDEXERS.
+
+    Processes with a pod informer, or which track_deltas(), look the value
+    up in the index of their store. Others scan the cached list of all
+    pods, so views read the per-node and per-image values cached by
+    get_node_pods() and get_image_containers() instead.
+    """
+    pods = informer.store("pods")
+    if pods is None and _deltas is not None:
+        pods = _deltas.get("pods")
+    if pods is not None:
+        return pods.by(index, value)
+    indexer = snapshot.POD_INDEXERS[index]
+    return [
+        pod
+        for pod in get_all_pods(cached=cached)["items"]
+        if value in indexer(pod)
+    ]
+
+
+@informer.informed("pods")
 @cached("toolpods", 5400)
 def get_pods_by_namespace(cached=True):
-    """Get a collection of all Pods grouped by namespace."""
-    data = {
-        "namespaces": collections.defaultdict(list),
+    """Get counts of all Pods and of Pods by namespace."""
+    totals = get_pod_totals(cached=cached)["totals"]
+    return {
+        "namespaces": dict(totals.namespaces),
         "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
-        "active_namespaces": 0,
-        "total_pods": 0,
-        "active_pods": 0,
+        "active_namespaces": len(totals.namespaces),
+        "total_pods": totals.total,
+        "active_pods": totals.active,
     }
-    for pod in get_all_pods(cached=cached)["items"]:
-        ns = pod.metadata.namespace
-        data["namespaces"][ns].append(pod)
-        data["total_pods"] += 1
-        if pod.status.phase in ["Pending", "Running"]:
-            data["active_pods"] += 1
-    data["active_namespaces"] = len(data["namespaces"].keys())
-    return data
 
 
+@informer.informed("cronjobs")
 @cached("cronjobs:__by_ns__", 5400)
 def get_cronjobs_by_namespace(cached=True):
     """Get a collection of all CronJobs grouped by namespace."""
@@ -238,15 +638,15 @@ def get_cronjobs_by_namespace(cached=True):
         "total_cronjobs": 0,
     }
     v1 = batchv1_client()
-    for cronjob in v1.list_cron_job_for_all_namespaces().items:
+    for cronjob in _iter("cronjobs", v1.list_cron_job_for_all_namespaces):
         ns = cronjob.metadata.namespace
-        data["namespaces"][ns].append(cronjob)
+        data["namespaces"][ns].append(records.object_record(cronjob))
         data["total_cronjobs"] += 1
     data["active_namespaces"] = len(data["namespaces"].keys())
     return data
 
 
-@cached("pods", 300)
+@cached("pods", 300, missing=not_found)
 def get_pod(namespace, pod, cached=True):
     """Get details for a pod."""
     v1 = corev1_client()
@@ -256,19 +656,113 @@ def get_pod(namespace, pod, cached=True):
     }
 
 
+@informer.informed("pods")
 @cached("images", 300)
 def get_images(cached=True):
-    """Get information about Docker images in use in the cluster."""
-    data = {
-        "items": collections.defaultdict(list),
+    """Get the number of containers using each image in the cluster."""
+    totals = get_pod_totals(cached=cached)["totals"]
+    return {
+        "items": dict(totals.images),
+        "table": tables.Table(
+            (
+                records.image_row(image, count)
+                for image, count in totals.images.items()
+            ),
+            IMAGE_COLUMNS,
+            text=lambda row: row.image,
+        ),
+        "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
+    }
+
+
+def _timestamp(value):
+    """Sort key for optional datetimes, earliest first and None last."""
+    return value.timestamp() if value is not None else float("inf")
+
+
+def _optional(value):
+    """Sort key for optional numbers, None first."""
+    return (value is not None, value or 0)
+
+
+# Sortable columns of tables, first being the default sort
+IMAGE_COLUMNS = {
+    "image": lambda row: row.image.lower(),
+    "repository": lambda row: row.repository.lower(),
+    "name": lambda row: row.name.lower(),
+    "tag": lambda row: row.tag.lower(),
+    "containers": lambda row: row.containers,
+}
+NODE_COLUMNS = {
+    "name": natsort.natsort_keygen(key=lambda row: row.name),
+    "ready": lambda row: str(row.ready),
+    "role": lambda row: row.role,
+    "pods": lambda row: row.pods,
+    "load": lambda row: _optional(row.load),
+    "memory": lambda row: _optional(row.memory),
+    # Youngest first
+    "age": lambda row: -_timestamp(row.created),
+}
+POD_COLUMNS = {
+    "name": lambda pod: pod.name,
+    "ready": lambda pod: pod.ready,
+    "phase": lambda pod: pod.phase or "",
+    "restarts": lambda pod: pod.restarts,
+    "node": natsort.natsort_keygen(key=lambda pod: pod.node or ""),
+    # Youngest first
+    "age": lambda pod: -_timestamp(pod.start_time),
+}
+NAMESPACE_COLUMNS = {
+    "name": natsort.natsort_keygen(key=lambda row: row.name),
+    "pods": lambda row: row.pods,
+    "active_pods": lambda row: row.active_pods,
+    "cronjobs": lambda row: row.cronjobs,
+    "ingresses": lambda row: row.ingresses,
+    "quota": lambda row: _optional(row.quota),
+    # Most recent first
+    "last_activity": lambda row: -_timestamp(row.last_activity),
+}
+CONTAINER_COLUMNS = {
+    "namespace": lambda row: row[0],
+    "pod": lambda row: row[1],
+    "container": lambda row: row[2],
+}
+
+
+def _pod_text(pod):
+    """Get the text of a PodRecord that table filters match."""
+    labels = ["{}={}".format(k, v) for k, v in pod.labels.items()]
+    return " ".join([pod.name, pod.phase or ""] + labels)
+
+
+def pod_table(pods):
+    """Build a table of PodRecords."""
+    return tables.Table(pods, POD_COLUMNS, text=_pod_text)
+
+
+@informer.informed("pods")
+@cached("images:containers", 300)
+def get_image_containers(image, cached=True):
+    """Get (namespace, pod, container) tuples for containers using an image."""
+    return {
+        "items": [
+            (pod.namespace, pod.name, container.name)
+            for pod in pods_by("image", image, cached=cached)
+            for container in pod.containers
+            if container.image == image
+        ],
+        "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
+    }
+
+
+@informer.informed("pods")
+@cached("pods:node", 300)
+def get_node_pods(name, cached=True):
+    """Get the PodRecords of the pods assigned to a node."""
+    return {
+        "items": pods_by("node", name, cached=cached),
         "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
     }
-    for pod in get_all_pods(cached=cached)["items"]:
-        for container in pod.spec.containers:
-            data["items"][container.image].append(
-                (pod.metadata.namespace, pod.metadata.name, container.name)
-            )
-    return data
 
 
 @cached("metrics:nodes", 300)
@@ -283,7 +777,7 @@ def get_nodes_metrics(cached=True):
     }
 
 
-@cached("metrics:node", 300)
+@cached("metrics:node", 300, missing=not_found)
 def get_node_metrics(name, cached=True):
     """Get information about active CPU and memory usage for a node."""
     custom = custom_client()
@@ -295,6 +789,18 @@ def get_node_metrics(name, cached=True):
     }
 
 
+def node_metrics(name, cached=True):
+    """Get the metrics of a node, or None if it has none yet.
+
+    metrics-server only reports a node some time after it joins the
+    cluster, so missing metrics do not mean that the node is missing.
+    """
+    try:
+        return get_node_metrics(name, cached=cached)["metrics"]
+    except cache.NotFound:
+        return None
+
+
 @cached("metrics:pods", 300)
 def get_pods_metrics(cached=True):
     """Get information about active CPU and memory usage per pod."""
@@ -307,17 +813,88 @@ def get_pods_metrics(cached=True):
     }
 
 
+@cached("metrics:pods:__usage__", 300)
+def get_pod_usage(cached=True):
+    """Get pod usage and requests totalled by namespace and by node.
+
+    Pod metrics are joined to the list of all pods on (namespace, name).
+    Pods without metrics, such as those not yet scheduled, are left out.
+    Each total lists its ``USAGE_TOP_PODS`` pods using the most CPU.
+    """
+    used = {
+        (m["metadata"]["namespace"], m["metadata"]["name"]): m
+        for m in get_pods_metrics(cached=cached)["items"]
+    }
+    rows = []
+    for pod in get_all_pods(cached=cached)["items"]:
+        metrics = used.get((pod.namespace, pod.name))
+        if metrics is None:
+            continue
+        cpu, memory = records.container_usage(metrics)
+        rows.append(
+            records.PodUsage(
+                pod.namespace,
+                pod.name,
+                pod.node,
+                cpu,
+                memory,
+                pod.cpu,
+                pod.memory,
+            )
+        )
+    top = flask.current_app.config.get("USAGE_TOP_PODS", 10)
+    return {
+        "namespaces": aggregates.usage_summaries(rows, "namespace", top),
+        "nodes": aggregates.usage_summaries(rows, "node", top),
+        "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
+    }
+
+
+@informer.informed("nodes")
 @cached("nodes", 300)
 def get_nodes(cached=True):
     """Get a list of all nodes in the cluster."""
     v1 = corev1_client()
     return {
-        "items": v1.list_node().items,
+        "items": _list("nodes", v1.list_node),
+        "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
+    }
+
+
+@cached("nodes:__table__", 300)
+def get_node_table(cached=True):
+    """Get a table of nodes with their pod counts and resource usage."""
+    usage = {
+        m["metadata"]["name"]: m["usage"]
+        for m in get_nodes_metrics(cached=cached)["items"]
+    }
+    pods = get_pod_totals(cached=cached)["scheduled"]
+    rows = []
+    for node in get_nodes(cached=cached)["items"]:
+        used = usage.get(node.name)
+        load = memory = None
+        if used and node.cpu and node.memory:
+            load = records.quantity(used["cpu"]) / node.cpu
+            memory = records.quantity(used["memory"]) / node.memory
+        control = "node-role.kubernetes.io/control-plane" in node.labels
+        rows.append(
+            records.NodeRow(
+                node.name,
+                node.ready,
+                "control" if control else "worker",
+                pods.get(node.name, 0),
+                load,
+                memory,
+                node.created,
+            )
+        )
+    return {
+        "table": tables.Table(rows, NODE_COLUMNS, text=lambda row: row.name),
         "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
     }
 
 
-@cached("node", 300)
+@cached("node", 300, missing=not_found)
 def get_node(name, cached=True):
     """Get a list of all nodes in the cluster."""
     v1 = corev1_client()
@@ -327,6 +904,7 @@ def get_node(name, cached=True):
     }
 
 
+@informer.informed("pods", "cronjobs", "ingresses")
 @cached("metrics:namespaces", 5400)
 def get_active_namespaces(cached=True):
     """Get a list of all namespaces which should be considered 'active'."""
@@ -345,38 +923,99 @@ def get_active_namespaces(cached=True):
     }
 
 
+def _quota_usage(quota):
+    """Get the largest fraction of any hard limit of a quota in use."""
+    hard = quota.status.hard or {}
+    used = quota.status.used or {}
+    fractions = [
+        records.quantity(used.get(key, 0)) / records.quantity(limit)
+        for key, limit in hard.items()
+        if records.quantity(limit)
+    ]
+    return max(fractions, default=0.0)
+
+
+@cached("namespaces:__summary__", 300)
+def get_namespace_summary(cached=True):
+    """Get a row of counts and usage for every namespace.
+
+    ``items`` maps namespace names to records.NamespaceSummary in listing
+    order. ``active`` is the set of names having pods, cronjobs or
+    ingresses, and ``tools`` a table of the active tool namespaces.
+    """
+    totals = get_pod_totals(cached=cached)["totals"]
+    cronjobs = get_cronjobs_by_namespace(cached=cached)["namespaces"]
+    ingresses = get_ingresses_by_namespace(cached=cached)["namespaces"]
+    quotas = {}
+    for quota in _iter(
+        "resourcequotas",
+        corev1_client().list_resource_quota_for_all_namespaces,
+    ):
+        ns = quota.metadata.namespace
+        quotas[ns] = max(quotas.get(ns, 0), _quota_usage(quota))
+
+    items = {}
+    for ns in get_namespaces(cached=cached)["items"]:
+        items[ns.name] = records.NamespaceSummary(
+            ns.name,
+            ns.created,
+            totals.namespaces.get(ns.name, 0),
+            totals.active_namespaces.get(ns.name, 0),
+            len(cronjobs.get(ns.name, ())),
+            len(ingresses.get(ns.name, ())),
+            quotas.get(ns.name),
+            totals.latest_start(ns.name),
+        )
+    active = {
+        name
+        for name, row in items.items()
+        if row.pods or row.cronjobs or row.ingresses
+    }
+    return {
+        "items": items,
+        "active": active,
+        "tools": tables.Table(
+            (
+                row
+                for name, row in items.items()
+                if name in active and name.startswith("tool-")
+            ),
+            NAMESPACE_COLUMNS,
+            text=lambda row: row.name,
+        ),
+        "active_pods": totals.active,
+        "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
+    }
+
+
 @cached("metrics:summary", 300)
 def get_summary_metrics(cached=True):
     """Get a set of summary metrics about the cluster."""
-    data = {
-        "control_nodes": 0,
-        "worker_nodes": 0,
-        "special_nodes": 0,
-        "cpu_total": 0,
-        "cpu_used": 0,
-        "mem_total_bytes": 0,
-        "mem_used_bytes": 0,
+    nodes = informer.store("nodes")
+    if nodes is None:
+        nodes = _delta(
+            "nodes",
+            get_nodes(cached=cached)["items"],
+            key=snapshot.cluster_record_key,
+        )
+    usage = _delta(
+        "metrics:nodes",
+        get_nodes_metrics(cached=cached)["items"],
+        key=lambda metrics: ("", metrics["metadata"]["name"]),
+    )
+    capacity = nodes.aggregate("totals")
+    used = usage.aggregate("totals")
+    return {
+        "control_nodes": capacity.roles["control"],
+        "worker_nodes": capacity.roles["worker"],
+        "special_nodes": capacity.roles["special"],
+        # Only workers count in system capacity numbers
+        "cpu_total": capacity.cpu,
+        "cpu_used": used.cpu,
+        "mem_total_bytes": capacity.memory,
+        "mem_used_bytes": used.memory,
         "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
     }
-    for node in get_nodes(cached=cached)["items"]:
-        if "-control-" in node.metadata.name:
-            data["control_nodes"] += 1
-        elif "-worker-" in node.metadata.name:
-            data["worker_nodes"] += 1
-            # Only count workers in system capacity numbers
-            data["mem_total_bytes"] += parse_quantity(
-                node.status.allocatable["memory"]
-            )
-            data["cpu_total"] += parse_quantity(node.status.allocatable["cpu"])
-        else:
-            data["special_nodes"] += 1
-
-    for node in get_nodes_metrics(cached=cached)["items"]:
-        if "-worker-" in node["metadata"]["name"]:
-            data["mem_used_bytes"] += parse_quantity(node["usage"]["memory"])
-            data["cpu_used"] += parse_quantity(node["usage"]["cpu"])
-
-    return data
 
 
 @cached("quota", 300)
@@ -407,3 +1046,18 @@ def get_quota(namespace, cached=True):
         "quotas": data,
         "generated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
     }
+
+
+# Collectors for the workloads of a namespace
+NAMESPACE_COLLECTORS = (
+    ("pods", get_pods),
+    ("services", get_services),
+    ("ingresses", get_ingresses),
+    ("daemonsets", get_daemonsets),
+    ("deployments", get_deployments),
+    ("replicasets", get_replicasets),
+    ("statefulsets", get_statefulsets),
+    ("cronjobs", get_cronjobs),
+    ("jobs", get_jobs),
+    ("quota", get_quota),
+)
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Serialization and compression of cached values.
+
+Values are written with a short header naming the format version, the
+serializer and the compression used, so a value can always be read back
+whatever the current configuration is. Values written by other versions of
+the format, including plain cachelib pickles, are treated as missing.
+
+``msgpack``, ``zstandard`` and ``lz4`` are optional and only needed when
+configured.
+"""
+import datetime
+import decimal
+import logging
+import pickle
+import zlib
+
+from . import records
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"K8S"
+
+# Magic, format version, serializer id and compression id
+HEADER_SIZE = len(MAGIC) + 3
+
+# Bump to make every cached value written before a deploy unreadable
+FORMAT_VERSION = 2
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# Record types which the msgpack serializer stores by name
+RECORD_TYPES = {
+    cls.__name__: cls
+    for cls in (
+        records.PodRecord,
+        records.ContainerRecord,
+        records.NodeRecord,
+        records.NamespaceRecord,
+        records.ObjectRecord,
+        records.ImageRow,
+        records.NodeRow,
+        records.NamespaceSummary,
+        records.PodUsage,
+        records.UsageSummary,
+    )
+}
+
+# msgpack extension type codes
+EXT_RECORD = 1
+EXT_DATETIME = 2
+EXT_DECIMAL = 3
+EXT_RESOURCE = 4
+EXT_TUPLE = 5
+
+
+def _pack(value):
+    return msgpack.packb(value, default=_default, strict_types=True)
+
+
+def _default(value):
+    """Encode the types msgpack does not know about as extensions."""
+    if type(value).__name__ in RECORD_TYPES:
+        return msgpack.ExtType(
+            EXT_RECORD, _pack((type(value).__name__,) + tuple(value))
+        )
+    if isinstance(value, datetime.datetime):
+        return msgpack.ExtType(EXT_DATETIME, value.isoformat().encode())
+    if isinstance(value, decimal.Decimal):
+        return msgpack.ExtType(EXT_DECIMAL, str(value).encode())
+    if type(value) is records.Resource:
+        return msgpack.ExtType(EXT_RESOURCE, _pack(dict(value)))
+    if type(value) is tuple:
+        return msgpack.ExtType(EXT_TUPLE, _pack(list(value)))
+    raise TypeError("Cannot encode {}".format(type(value).__name__))
+
+
+def _unpack(data):
+    return msgpack.unpackb(
+        data, ext_hook=_ext_hook, raw=False, strict_map_key=False
+    )
+
+
+def _ext_hook(code, data):
+    """Decode an extension written by _default."""
+    if code == EXT_RECORD:
+        name, *fields = _unpack(data)
+        return RECORD_TYPES[name](*fields)
+    if code == EXT_DATETIME:
+        return datetime.datetime.fromisoformat(data.decode())
+    if code == EXT_DECIMAL:
+        return decimal.Decimal(data.decode())
+    if code == EXT_RESOURCE:
+        return records.Resource(_unpack(data))
+    if code == EXT_TUPLE:
+        return tuple(_unpack(data))
+    return msgpack.ExtType(code, data)
+
+
+def _msgpack_dumps(value):
+    try:
+        return _pack(value)
+    except TypeError:
+        return None
+
+
+def _pickle_dumps(value):
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+# name: (id, dumps, loads, available). dumps may return None for values it
+# cannot encode, which are then pickled.
+SERIALIZERS = {
+    "pickle": (1, _pickle_dumps, pickle.loads, True),
+    "msgpack": (2, _msgpack_dumps, _unpack, msgpack is not None),
+}
+
+# name: (id, compress(data, level), decompress, available)
+COMPRESSIONS = {
+    "none": (0, None, None, True),
+    "zlib": (
+        1,
+        lambda data, level: zlib.compress(data, 6 if level is None else level),
+        zlib.decompress,
+        True,
+    ),
+    "zstd": (
+        2,
+        lambda data, level: zstandard.ZstdCompressor(
+            level=3 if level is None else level
+        ).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+        zstandard is not None,
+    ),
+    "lz4": (
+        3,
+        lambda data, level: lz4.frame.compress(
+            data, compression_level=0 if level is None else level
+        ),
+        lambda data: lz4.frame.decompress(data),
+        lz4 is not None,
+    ),
+}
+
+
+def _by_id(table):
+    return {entry[0]: entry for entry in table.values()}
+
+
+_serializers = _by_id(SERIALIZERS)
+_compressions = _by_id(COMPRESSIONS)
+
+
+class Codec:
+    """Encode values using a serializer and, above a size, compression.
+
+    Used in place of the cachelib serializer, so provides ``dumps`` and
+    ``loads``.
+    """
+
+    def __init__(
+        self, serializer="pickle", compression="none", threshold=0, level=None
+    ):
+        """Create a codec, checking that its libraries are installed."""
+        for name, table in (
+            (serializer, SERIALIZERS),
+            (compression, COMPRESSIONS),
+        ):
+            if name not in table:
+                raise ValueError("Unknown cache codec {}".format(name))
+            if not table[name][3]:
+                raise ValueError(
+                    "Cache codec {} is not installed".format(name)
+                )
+        self.serializer = serializer
+        self.compression = compression
+        self.threshold = threshold
+        self.level = level
+
+    def dumps(self, value):
+        """Encode a value."""
+        serializer_id, dumps, _, _ = SERIALIZERS[self.serializer]
+        data = dumps(value)
+        if data is None:
+            serializer_id, dumps, _, _ = SERIALIZERS["pickle"]
+            data = dumps(value)
+        compression_id = 0
+        if self.compression != "none" and len(data) >= self.threshold:
+            compression_id, compress, _, _ = COMPRESSIONS[self.compression]
+            data = compress(data, self.level)
+        header = bytes((FORMAT_VERSION, serializer_id, compression_id))
+        return b"".join((MAGIC, header, data))
+
+    def loads(self, raw):
+        """Decode a value, or return None if it was written differently."""
+        header, data = raw[:HEADER_SIZE], raw[HEADER_SIZE:]
+        if len(header) < HEADER_SIZE or not header.startswith(MAGIC):
+            logger.debug("Ignoring cached value without a codec header")
+            return None
+        version, serializer_id, compression_id = header[-3:]
+        serializer = _serializers.get(serializer_id)
+        compression = _compressions.get(compression_id)
+        readable = [
+            entry is not None and entry[3]
+            for entry in (serializer, compression)
+        ]
+        if version != FORMAT_VERSION or not all(readable):
+            logger.debug("Ignoring cached value in an unreadable format")
+            return None
+        if compression_id:
+            data = compression[2](data)
+        return serializer[2](data)
+
+
+def from_config(config):
+    """Build the codec described by an app config."""
+    return Codec(
+        serializer=config.get("CACHE_SERIALIZER", "pickle"),
+        compression=config.get("CACHE_COMPRESSION", "none"),
+        threshold=config.get("CACHE_COMPRESS_MIN_BYTES", 0),
+        level=config.get("CACHE_COMPRESS_LEVEL"),
+    )
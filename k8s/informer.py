@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Watch based in-memory stores of cluster resources."""
+import copy
+import functools
+import logging
+import threading
+
+from . import cache
+from . import lazy
+from . import snapshot
+
+
+logger = logging.getLogger(__name__)
+kubernetes = lazy.Module("kubernetes")
+
+_informers = {}
+
+
+class Store(snapshot.Snapshot):
+    """Thread-safe Snapshot kept up to date by an Informer."""
+
+    def __init__(self, indexers=None, aggregates=None):
+        """Create an empty store."""
+        super().__init__(indexers=indexers, aggregates=aggregates)
+        self._lock = threading.RLock()
+
+    def replace(self, items):
+        """Replace the contents of the store."""
+        fresh = snapshot.Snapshot(items, self.indexers, self.aggregates)
+        with self._lock:
+            self._items = fresh._items
+            self._indexes = fresh._indexes
+            self._aggregates = fresh._aggregates
+
+    def add(self, key, obj):
+        """Add or update an object."""
+        with self._lock:
+            super().add(key, obj)
+
+    def update(self, items, version=None):
+        """Make the store hold exactly the given (key, object) pairs."""
+        items = list(items)
+        with self._lock:
+            return super().update(items, version)
+
+    def remove(self, key):
+        """Remove an object."""
+        with self._lock:
+            super().remove(key)
+
+    def values(self, namespace=None):
+        """List all objects, optionally limited to a single namespace."""
+        if namespace is None:
+            with self._lock:
+                return super().values()
+        return self.by("namespace", namespace)
+
+    def get(self, *key):
+        """Get an object by (namespace, name) or (name,) if cluster scoped."""
+        if len(key) == 1:
+            key = ("",) + key
+        with self._lock:
+            return super().get(key)
+
+    def by(self, index, value):
+        """List objects having a value in an index."""
+        with self._lock:
+            return super().by(index, value)
+
+    def count(self, index, value):
+        """Count objects having a value in an index."""
+        with self._lock:
+            return super().count(index, value)
+
+    def keys(self, index):
+        """List the values present in an index."""
+        with self._lock:
+            return super().keys(index)
+
+    def counts(self, index):
+        """Count objects for every value in an index."""
+        with self._lock:
+            return super().counts(index)
+
+    def aggregate(self, name):
+        """Get a copy of an aggregate."""
+        with self._lock:
+            return copy.deepcopy(super().aggregate(name))
+
+    def __len__(self):
+        """Count objects in the store."""
+        with self._lock:
+            return super().__len__()
+
+    def __getstate__(self):
+        """Get a consistent copy of the state to pickle."""
+        with self._lock:
+            state = dict(self.__dict__)
+            del state["_lock"]
+            state["_items"] = dict(self._items)
+            state["_indexes"] = {
+                name: {value: dict(b) for value, b in index.items()}
+                for name, index in self._indexes.items()
+            }
+            state["_aggregates"] = copy.deepcopy(self._aggregates)
+            return state
+
+    def __setstate__(self, state):
+        """Restore a pickled store."""
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def copy(self):
+        """Get a copy which later changes to this store leave alone."""
+        clone = type(self).__new__(type(self))
+        clone.__setstate__(self.__getstate__())
+        return clone
+
+
+class Informer:
+    """Keep a Store in sync with the cluster using LIST and WATCH.
+
+    ``list_func`` is a cluster-wide list method of a Kubernetes API client
+    such as ``CoreV1Api.list_pod_for_all_namespaces``. ``watch`` is a factory
+    for objects implementing the ``kubernetes.watch.Watch`` interface and can
+    be replaced to feed the informer from a fake event stream. Objects are
+    passed through ``transform`` before being stored. ``indexers`` and
+    ``aggregates`` are passed on to the Store.
+    """
+
+    def __init__(
+        self,
+        kind,
+        list_func,
+        transform=None,
+        indexers=None,
+        aggregates=None,
+        watch=None,
+        timeout=300,
+        backoff=5,
+        page_size=500,
+    ):
+        """Create an informer that has not yet been started."""
+        self.kind = kind
+        self.list_func = list_func
+        self.transform = transform or (lambda obj: obj)
+        self.watch = watch or kubernetes.watch.Watch
+        self.timeout = timeout
+        self.backoff = backoff
+        self.page_size = page_size
+        self.store = Store(indexers, aggregates)
+        self.synced = threading.Event()
+        self.resource_version = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self._watcher = None
+
+    def start(self):
+        """Start following the cluster in a background thread."""
+        self._thread = threading.Thread(
+            target=self.run, name="informer-{}".format(self.kind), daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop following the cluster."""
+        self._stopped.set()
+        if self._watcher is not None:
+            self._watcher.stop()
+
+    def run(self):
+        """LIST and then WATCH until stopped."""
+        while not self._stopped.is_set():
+            try:
+                if self.resource_version is None:
+                    self.relist()
+                self.follow()
+            except kubernetes.client.ApiException as e:
+                if e.status == 410:
+                    # Our resourceVersion is too old to resume from
+                    logger.info("Watch for %s expired; relisting", self.kind)
+                    self.resource_version = None
+                    continue
+                logger.exception("Error watching %s", self.kind)
+                self._stopped.wait(self.backoff)
+            except Exception:
+                logger.exception("Error watching %s", self.kind)
+                self._stopped.wait(self.backoff)
+
+    def relist(self):
+        """Replace the store contents with a fresh paginated LIST."""
+        fresh = []
+        token = None
+        while True:
+            resp = self.list_func(limit=self.page_size, _continue=token)
+            fresh.extend(
+                (snapshot.object_key(obj), self.transform(obj))
+                for obj in resp.items
+            )
+            token = resp.metadata._continue
+            if not token:
+                break
+        self.store.replace(fresh)
+        self.resource_version = resp.metadata.resource_version
+        self.synced.set()
+        logger.debug(
+            "Listed %d %s at %s",
+            len(fresh),
+            self.kind,
+            self.resource_version,
+        )
+
+    def follow(self):
+        """Apply WATCH events until the server closes the stream."""
+        self._watcher = self.watch()
+        for event in self._watcher.stream(
+            self.list_func,
+            resource_version=self.resource_version,
+            allow_watch_bookmarks=True,
+            timeout_seconds=self.timeout,
+        ):
+            self.handle(event)
+            if self._stopped.is_set():
+                self._watcher.stop()
+                break
+
+    def handle(self, event):
+        """Apply a single WATCH event to the store."""
+        if event["type"] == "BOOKMARK":
+            # Bookmarks are not deserialized by kubernetes.watch.Watch
+            metadata = event["raw_object"]["metadata"]
+            self.resource_version = metadata["resourceVersion"]
+            return
+        obj = event["object"]
+        if event["type"] in ("ADDED", "MODIFIED"):
+            self.store.add(snapshot.object_key(obj), self.transform(obj))
+        elif event["type"] == "DELETED":
+            self.store.remove(snapshot.object_key(obj))
+        self.resource_version = obj.metadata.resource_version
+
+
+def start(kind, list_func, **kwargs):
+    """Start an informer for a kind of resource."""
+    if kind in _informers:
+        return _informers[kind]
+    informer = Informer(kind, list_func, **kwargs)
+    _informers[kind] = informer
+    informer.start()
+    return informer
+
+
+def stop_all():
+    """Stop all running informers."""
+    for informer in _informers.values():
+        informer.stop()
+    _informers.clear()
+
+
+def store(kind):
+    """Get the store for a kind if it has a synced informer."""
+    informer = _informers.get(kind)
+    if informer is not None and informer.synced.is_set():
+        return informer.store
+    return None
+
+
+def informed(*kinds):
+    """Bypass the cache for a collector when all kinds are being watched.
+
+    Apply above ``cached``. Outside a cache.batch() the uncached function
+    is called directly. Inside one, as in refresh rounds, every call is a
+    purge, so each value is computed from the stores at most once per batch
+    and stored in the shared cache for processes without informers.
+    """
+
+    def real_informed(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if not all(store(kind) is not None for kind in kinds):
+                return f(*args, **kwargs)
+            cached = kwargs.pop("cached", True)
+            if cached and cache.current_batch() is None:
+                return f.__wrapped__(*args, **kwargs)
+            return f(*args, cached=False, **kwargs)
+
+        return wrapper
+
+    return real_informed
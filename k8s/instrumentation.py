@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Prometheus instrumentation."""
+import os
+import time
+
+import flask
+import prometheus_client
+import prometheus_client.multiprocess
+
+
+BYTE_BUCKETS = tuple(4**n for n in range(4, 14))
+
+REQUEST_DURATION = prometheus_client.Histogram(
+    "k8s_status_request_duration_seconds",
+    "Time spent handling HTTP requests",
+    ["route", "method", "status"],
+)
+API_DURATION = prometheus_client.Histogram(
+    "k8s_status_api_request_duration_seconds",
+    "Time spent in Kubernetes API calls",
+    ["verb", "resource"],
+)
+API_ERRORS = prometheus_client.Counter(
+    "k8s_status_api_errors_total",
+    "Failed Kubernetes API calls by HTTP status, or error without one",
+    ["verb", "resource", "status"],
+)
+CACHE_REQUESTS = prometheus_client.Counter(
+    "k8s_status_cache_requests_total",
+    "Cached function calls by key prefix and result",
+    ["prefix", "result"],
+)
+REDIS_DURATION = prometheus_client.Histogram(
+    "k8s_status_redis_duration_seconds",
+    "Time spent in Redis commands",
+    ["command", "prefix"],
+)
+REDIS_BYTES = prometheus_client.Histogram(
+    "k8s_status_redis_payload_bytes",
+    "Size of values read from and written to Redis",
+    ["command", "prefix"],
+    buckets=BYTE_BUCKETS,
+)
+
+
+def api_call(method, resource_path, path_params, query_params):
+    """Get the (verb, resource) of a Kubernetes API call.
+
+    ``resource_path`` is the path template of the call, for example
+    ``/api/v1/namespaces/{namespace}/pods/{name}/log`` for which the
+    resource is ``pods/log``.
+    """
+    parts = [part for part in resource_path.split("/") if part]
+    if parts[:1] == ["api"]:
+        parts = parts[2:]
+    elif parts[:1] == ["apis"]:
+        parts = parts[3:]
+    if parts[:2] == ["namespaces", "{namespace}"]:
+        parts = parts[2:]
+    if not parts:
+        return method.lower(), "other"
+    resource = parts[0]
+    if resource == "{plural}":
+        # CustomObjectsApi
+        resource = "{group}/{plural}".format(**path_params)
+    if len(parts) > 2:
+        resource = "{}/{}".format(resource, parts[2])
+    if method != "GET":
+        verb = method.lower()
+    elif len(parts) > 1 or resource == "version":
+        verb = "get"
+    elif dict(query_params or ()).get("watch"):
+        verb = "watch"
+    else:
+        verb = "list"
+    return verb, resource
+
+
+def instrument(api_client):
+    """Record the duration and failures of calls made by an ApiClient.
+
+    ``api_client`` is a kubernetes.client.ApiClient. Calls answered with an
+    error are counted by the HTTP status of the answer; calls which got no
+    answer, such as those which timed out, have the status ``error``.
+    """
+    call_api = api_client.call_api
+
+    def timed_call_api(
+        resource_path,
+        method,
+        path_params=None,
+        query_params=None,
+        *args,
+        **kwargs,
+    ):
+        verb, resource = api_call(
+            method, resource_path, path_params, query_params
+        )
+        try:
+            with API_DURATION.labels(verb, resource).time():
+                return call_api(
+                    resource_path,
+                    method,
+                    path_params,
+                    query_params,
+                    *args,
+                    **kwargs,
+                )
+        except Exception as e:
+            status = getattr(e, "status", None) or "error"
+            API_ERRORS.labels(verb, resource, status).inc()
+            raise
+
+    api_client.call_api = timed_call_api
+    return api_client
+
+
+def redis_call(command, prefix, f, *args):
+    """Call a Redis client method recording its duration."""
+    with REDIS_DURATION.labels(command, prefix).time():
+        return f(*args)
+
+
+def init_app(app):
+    """Record the duration of every request handled by an app."""
+
+    @app.before_request
+    def start_timer():
+        flask.g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_duration(response):
+        start = flask.g.pop("request_start", None)
+        if start is not None:
+            rule = flask.request.url_rule
+            REQUEST_DURATION.labels(
+                rule.rule if rule else "<unmatched>",
+                flask.request.method,
+                response.status_code,
+            ).observe(time.perf_counter() - start)
+        return response
+
+
+def exposition():
+    """Get the current metrics as a (body, content type) tuple.
+
+    Metrics from all worker processes are combined when the
+    ``PROMETHEUS_MULTIPROC_DIR`` environment variable is set.
+    """
+    registry = prometheus_client.REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = prometheus_client.CollectorRegistry()
+        prometheus_client.multiprocess.MultiProcessCollector(registry)
+    return (
+        prometheus_client.generate_latest(registry),
+        prometheus_client.CONTENT_TYPE_LATEST,
+    )
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Modules imported when first used.
+
+Importing ``kubernetes`` loads the whole generated API client and is the
+largest part of the time it takes to import the app. Modules which only
+need it once they serve requests bind a stand-in instead::
+
+    kubernetes = lazy.Module("kubernetes")
+
+The real module is imported the first time an attribute is read.
+"""
+import importlib
+
+
+class Module:
+    """Stand-in for a module which imports it on first attribute access."""
+
+    def __init__(self, name):
+        """Create a stand-in for the module called ``name``."""
+        self._name = name
+
+    def __getattr__(self, attr):
+        """Read an attribute of the real module."""
+        # import_module holds the import lock, so threads racing to the
+        # first use all get the fully initialized module
+        return getattr(importlib.import_module(self._name), attr)
+
+    def __repr__(self):
+        """Describe the stand-in."""
+        return "<lazy module {!r}>".format(self._name)
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Cache of rendered pages.
+
+Pages are stored per cache generation, so any refresh of the data they are
+rendered from makes the next request render them again. Bodies are stored
+pre-compressed and served with strong ETags and Last-Modified headers so
+conditional requests can be answered with ``304 Not Modified``.
+"""
+import datetime
+import functools
+import gzip
+import hashlib
+import urllib.parse
+
+import brotli
+import flask
+
+from . import cache
+from . import circuit
+
+
+PREFIX = "page"
+
+# Content codings we store, in order of preference
+ENCODINGS = ("br", "gzip")
+
+# Query parameters pages may be cached for. Others, such as free text
+# ?q= filters, would let anyone fill the cache with copies of a page.
+ARGS = ("sort", "page", "limit")
+
+cache.register(PREFIX)
+
+
+def incomplete():
+    """Do not cache the page being rendered.
+
+    Call when some of the data for the page could not be loaded.
+    """
+    flask.g.page_incomplete = True
+
+
+def _key(generation):
+    """Get the cache key of the current page."""
+    args = sorted(
+        (k, v) for k, v in flask.request.args.items(multi=True) if k != "purge"
+    )
+    return "{}:{}?{}:{}".format(
+        PREFIX, flask.request.path, urllib.parse.urlencode(args), generation
+    )
+
+
+def _cacheable_request():
+    """Check if the current request only has parameters pages cache for."""
+    args = flask.request.args
+    return all(
+        name in ARGS + ("purge",) and len(args.getlist(name)) == 1
+        for name in args
+    )
+
+
+def _canonical():
+    """Check that the request spells its table parameters as tables do.
+
+    Values which a table ignores or corrects, such as unknown sort columns
+    or pages past the end, would otherwise each get a copy of the page.
+    """
+    chosen = flask.g.get("table_args", {})
+    return all(
+        flask.request.args[name] == chosen.get(name)
+        for name in ARGS
+        if name in flask.request.args
+    )
+
+
+def _cacheable(response):
+    """Check if a freshly rendered response can be cached."""
+    if response.status_code != 200 or flask.g.get("page_incomplete"):
+        return False
+    if not _canonical():
+        return False
+    if circuit.stale_since() is not None:
+        # Render again once the API is back
+        return False
+    # Flashed messages were rendered into the page
+    return not flask.session.modified
+
+
+def _entry(body, mimetype):
+    """Build the cache entry for a rendered body."""
+    return {
+        "mimetype": mimetype,
+        "etag": hashlib.sha256(body).hexdigest()[:32],
+        "modified": datetime.datetime.now(datetime.timezone.utc),
+        "bodies": {
+            "identity": body,
+            "gzip": gzip.compress(body, 6),
+            "br": brotli.compress(body, quality=5),
+        },
+    }
+
+
+def _respond(entry):
+    """Serve a cache entry in the best encoding the client accepts."""
+    encoding = flask.request.accept_encodings.best_match(
+        ENCODINGS, default="identity"
+    )
+    response = flask.Response(
+        entry["bodies"][encoding], mimetype=entry["mimetype"]
+    )
+    if encoding == "identity":
+        response.set_etag(entry["etag"])
+    else:
+        response.headers["Content-Encoding"] = encoding
+        response.set_etag("{}-{}".format(entry["etag"], encoding))
+    response.last_modified = entry["modified"]
+    response.vary.add("Accept-Encoding")
+    return response.make_conditional(flask.request)
+
+
+def batched(*keys):
+    """Read or write the cache keys a view uses in one Redis round trip.
+
+    ``keys`` are cache keys, or callables which are given the view's keyword
+    arguments and return a list of cache keys. Ordinary requests load the
+    keys into the local cache before the view runs. ``?purge`` requests
+    queue everything they store and write it when the view returns. Apply
+    below ``cached_page``.
+    """
+
+    def real_batched(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if "purge" in flask.request.args:
+                with cache.batch():
+                    return f(*args, **kwargs)
+            wanted = []
+            for key in keys:
+                if callable(key):
+                    wanted.extend(key(**kwargs))
+                else:
+                    wanted.append(key)
+            cache.prefetch(wanted)
+            return f(*args, **kwargs)
+
+        return wrapper
+
+    return real_batched
+
+
+def cached_page(f):
+    """Cache the response of a view for ``PAGE_CACHE_TTL`` seconds.
+
+    Only requests with no parameters other than ``sort``, ``page`` and
+    ``limit``, spelled as the page's table would, use the cache.
+    ``?purge`` requests render the page again. Pages are not cached when
+    they are not 200 responses, flash messages, call incomplete() or were
+    rendered from values served while a circuit breaker was open.
+    """
+
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        ttl = flask.current_app.config.get("PAGE_CACHE_TTL", 300)
+        if not ttl or "_flashes" in flask.session:
+            return f(*args, **kwargs)
+        if not _cacheable_request():
+            return f(*args, **kwargs)
+
+        if "purge" not in flask.request.args:
+            entry = cache.load(_key(cache.generation()))
+            if entry is not None:
+                return _respond(entry)
+
+        response = flask.make_response(f(*args, **kwargs))
+        if not _cacheable(response):
+            return response
+        entry = _entry(response.get_data(), response.mimetype)
+        cache.store(_key(cache.generation()), entry, ttl)
+        return _respond(entry)
+
+    return wrapper
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Compact records of the fields rendered by list views.
+
+Full Kubernetes model objects carry managedFields, volumes, environment and
+many other fields which are never shown in tables but which make cached
+lists large and slow to unpickle. Collectors project objects into these
+records; detail pages fetch the full object on demand.
+
+The projections work on both ``kubernetes.client`` models and on parsed
+JSON wrapped in a Resource.
+"""
+import collections
+import datetime
+import functools
+
+from . import lazy
+
+
+kubernetes = lazy.Module("kubernetes")
+
+
+class Resource(dict):
+    """Parsed JSON Kubernetes object with model style attribute access.
+
+    ``pod.spec.node_name`` reads ``pod["spec"]["nodeName"]`` and missing
+    fields read as None, as they do on ``kubernetes.client`` models. Values
+    of ``*Time`` and ``*Timestamp`` fields are returned as datetimes. Nested
+    objects are wrapped as they are accessed.
+    """
+
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        """Look up a field by its snake_case name."""
+        wanted = name.replace("_", "").lower()
+        for key, value in self.items():
+            if key.lower() == wanted:
+                return _wrap(key, value)
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return None
+
+
+def _wrap(key, value):
+    """Wrap a JSON value for attribute access."""
+    if isinstance(value, dict):
+        return Resource(value)
+    if isinstance(value, list):
+        return [_wrap(key, item) for item in value]
+    if isinstance(value, str) and key.endswith(("Time", "Timestamp")):
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return value
+
+
+PodRecord = collections.namedtuple(
+    "PodRecord",
+    [
+        "namespace",
+        "name",
+        "uid",
+        "resource_version",
+        "phase",
+        "node",
+        "start_time",
+        "labels",
+        "owners",
+        "containers",
+        "ready",
+        "restarts",
+        "cpu",
+        "memory",
+    ],
+)
+
+ContainerRecord = collections.namedtuple(
+    "ContainerRecord", ["name", "image", "ready", "restarts"]
+)
+
+NodeRecord = collections.namedtuple(
+    "NodeRecord",
+    ["name", "labels", "ready", "allocatable", "created", "cpu", "memory"],
+)
+
+NamespaceRecord = collections.namedtuple(
+    "NamespaceRecord", ["name", "created"]
+)
+
+ObjectRecord = collections.namedtuple(
+    "ObjectRecord", ["namespace", "name", "created"]
+)
+
+ImageRow = collections.namedtuple(
+    "ImageRow", ["image", "repository", "name", "tag", "containers"]
+)
+
+NodeRow = collections.namedtuple(
+    "NodeRow", ["name", "ready", "role", "pods", "load", "memory", "created"]
+)
+
+NamespaceSummary = collections.namedtuple(
+    "NamespaceSummary",
+    [
+        "name",
+        "created",
+        "pods",
+        "active_pods",
+        "cronjobs",
+        "ingresses",
+        "quota",
+        "last_activity",
+    ],
+)
+
+PodUsage = collections.namedtuple(
+    "PodUsage",
+    [
+        "namespace",
+        "name",
+        "node",
+        "cpu",
+        "memory",
+        "cpu_requested",
+        "memory_requested",
+    ],
+)
+
+UsageSummary = collections.namedtuple(
+    "UsageSummary",
+    [
+        "pods",
+        "cpu",
+        "memory",
+        "cpu_requested",
+        "memory_requested",
+        "cpu_ratio",
+        "memory_ratio",
+        "top",
+    ],
+)
+
+
+@functools.lru_cache(maxsize=4096)
+def quantity(value):
+    """Parse a Kubernetes quantity such as 200Mi to a float.
+
+    Clusters repeat a small set of quantity strings, so results are
+    memoized.
+    """
+    return float(kubernetes.utils.quantity.parse_quantity(value))
+
+
+def _requests(container):
+    """Get the (cpu, memory) requested by a container."""
+    resources = container.resources
+    requests = (resources.requests if resources else None) or {}
+    return (
+        quantity(requests.get("cpu", 0)),
+        quantity(requests.get("memory", 0)),
+    )
+
+
+def container_usage(metrics):
+    """Get the (cpu, memory) used by the containers of a PodMetrics."""
+    cpu = memory = 0.0
+    for container in metrics["containers"]:
+        cpu += quantity(container["usage"]["cpu"])
+        memory += quantity(container["usage"]["memory"])
+    return cpu, memory
+
+
+def image_row(image, containers):
+    """Split an image reference into the columns of the images table."""
+    repository, name_tag = "", image
+    if "/" in image:
+        repository, name_tag = image.split("/", 1)
+    name, _, tag = name_tag.partition(":")
+    return ImageRow(image, repository, name, tag, containers)
+
+
+def pod_record(pod):
+    """Project a V1Pod."""
+    statuses = {
+        status.name: status for status in pod.status.container_statuses or []
+    }
+    containers = []
+    cpu = memory = 0.0
+    for container in pod.spec.containers:
+        status = statuses.get(container.name)
+        requested = _requests(container)
+        cpu += requested[0]
+        memory += requested[1]
+        containers.append(
+            ContainerRecord(
+                container.name,
+                container.image,
+                bool(status and status.ready),
+                status.restart_count if status else 0,
+            )
+        )
+    return PodRecord(
+        pod.metadata.namespace,
+        pod.metadata.name,
+        pod.metadata.uid,
+        pod.metadata.resource_version,
+        pod.status.phase,
+        pod.spec.node_name,
+        pod.status.start_time,
+        pod.metadata.labels or {},
+        tuple(
+            (ref.kind, ref.name) for ref in pod.metadata.owner_references or []
+        ),
+        tuple(containers),
+        sum(c.ready for c in containers),
+        sum(c.restarts for c in containers),
+        cpu,
+        memory,
+    )
+
+
+def node_record(node):
+    """Project a V1Node."""
+    ready = None
+    for condition in node.status.conditions or []:
+        if condition.type == "Ready":
+            ready = condition.status
+            break
+    allocatable = node.status.allocatable or {}
+    return NodeRecord(
+        node.metadata.name,
+        node.metadata.labels or {},
+        ready,
+        allocatable,
+        node.metadata.creation_timestamp,
+        quantity(allocatable.get("cpu", 0)),
+        quantity(allocatable.get("memory", 0)),
+    )
+
+
+def namespace_record(ns):
+    """Project a V1Namespace."""
+    return NamespaceRecord(ns.metadata.name, ns.metadata.creation_timestamp)
+
+
+def object_record(obj):
+    """Project any namespaced object down to its identity."""
+    return ObjectRecord(
+        obj.metadata.namespace,
+        obj.metadata.name,
+        obj.metadata.creation_timestamp,
+    )
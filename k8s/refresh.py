@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Keep cached data warm on a schedule.
+
+Run from the application directory::
+
+    python -m k8s.refresh [--once]
+
+``REFRESH_SCHEDULE`` in the app config lists the ``k8s.client`` collectors
+to refresh. Each entry has a ``collector`` name and an ``interval`` in
+seconds. Entries with ``each: active_namespace``, ``each: node`` or
+``each: image`` are refreshed once per active namespace, node or image in
+use.
+
+Entries with the same interval are refreshed together as a round. Like
+``?purge``, a round purges its entries within a single cache.batch(), so
+collectors derived from others first purge those, each value is recomputed
+at most once per round however many entries depend on it, and derived
+values always reflect the inputs refreshed in the same round. Inputs which
+are entries with another interval are read from the cache instead, so that
+they are only recomputed as often as scheduled. The values are written, and
+the cache generation bumped, once when the round finishes, so local caches
+and cached pages are flushed once per round rather than once per entry.
+
+Entries with ``invalidate: false`` are instead recomputed from cached
+inputs and written without bumping the generation, so other processes may
+keep serving their local copy for up to ``CACHE_L1_TTL`` seconds; use this
+for per-item entries so refreshing them does not constantly flush local
+caches.
+
+The ``INFORMERS`` run here rather than in the web app: this one process
+follows the cluster with LIST+WATCH, and the entries it refreshes store
+values computed from the informer stores in the shared cache, which the
+web workers read. Likewise, totals over cluster-wide lists of kinds which
+are not watched are updated incrementally in stores kept only here.
+"""
+import argparse
+import collections
+import concurrent.futures
+import logging
+import random
+import signal
+import threading
+import time
+
+from . import cache
+from . import circuit
+from . import client
+from . import informer
+
+
+logger = logging.getLogger(__name__)
+
+Job = collections.namedtuple(
+    "Job", ["collector", "args", "interval", "invalidate"]
+)
+
+# Arguments to call per-item collectors with
+EACH = {
+    "active_namespace": lambda: client.get_active_namespaces()["namespaces"],
+    "node": lambda: [node.name for node in client.get_nodes()["items"]],
+    "image": lambda: list(client.get_images()["items"]),
+}
+
+
+def validate(schedule):
+    """Check that every entry of a schedule can be refreshed."""
+    for entry in schedule:
+        f = getattr(client, entry["collector"], None)
+        if not hasattr(f, "refresh"):
+            raise ValueError(
+                "{} is not a cached collector".format(entry["collector"])
+            )
+        if entry.get("each") not in (None, *EACH):
+            raise ValueError("Unknown each: {}".format(entry["each"]))
+
+
+def expand(schedule):
+    """List the jobs of a schedule."""
+    jobs = []
+    for entry in schedule:
+        if "each" in entry:
+            calls = [(item,) for item in sorted(EACH[entry["each"]]())]
+        else:
+            calls = [()]
+        jobs.extend(
+            Job(
+                entry["collector"],
+                args,
+                entry["interval"],
+                entry.get("invalidate", True),
+            )
+            for args in calls
+        )
+    return jobs
+
+
+def rounds(jobs):
+    """Group jobs into rounds by interval, keeping schedule order."""
+    grouped = collections.defaultdict(list)
+    for job in jobs:
+        grouped[job.interval].append(job)
+    return grouped
+
+
+class Refresher:
+    """Refresh the jobs of a schedule with bounded concurrency.
+
+    Each round runs again ``interval`` seconds after it was last started,
+    give or take ``jitter`` times the interval so that rounds spread out.
+    """
+
+    def __init__(self, app, schedule=None, workers=None, jitter=None):
+        """Create a refresher for a Flask app."""
+        config = app.config
+        self.app = app
+        self.schedule = (
+            config.get("REFRESH_SCHEDULE", [])
+            if schedule is None
+            else schedule
+        )
+        self.workers = workers or config.get("REFRESH_WORKERS", 4)
+        self.jitter = (
+            config.get("REFRESH_JITTER", 0.1) if jitter is None else jitter
+        )
+        validate(self.schedule)
+        self._stopped = threading.Event()
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def stop(self):
+        """Stop after the jobs that are running finish."""
+        self._stopped.set()
+
+    def run(self, once=False):
+        """Refresh jobs as they fall due until stopped.
+
+        With ``once`` every job is refreshed a single time.
+        """
+        due = {}
+        jobs = {}
+        intervals = sorted({entry["interval"] for entry in self.schedule})
+        executor = concurrent.futures.ThreadPoolExecutor(self.workers)
+        # Rounds only wait for their jobs, so need a thread each
+        runners = concurrent.futures.ThreadPoolExecutor(len(intervals) or 1)
+        try:
+            while not self._stopped.is_set():
+                now = time.monotonic()
+                ready = [
+                    interval
+                    for interval in intervals
+                    if due.get(interval, now) <= now and self._claim(interval)
+                ]
+                if ready:
+                    jobs.update(self._expand(ready, jobs))
+                for interval in ready:
+                    runners.submit(
+                        self._round, executor, interval, jobs[interval]
+                    )
+                    spread = random.uniform(-self.jitter, self.jitter)
+                    due[interval] = now + interval * (1 + spread)
+                if once:
+                    break
+                self._stopped.wait(1)
+        finally:
+            # Queued jobs are skipped when stopped and run when run once
+            runners.shutdown()
+            executor.shutdown()
+
+    def _expand(self, intervals, previous):
+        """List the current jobs of rounds, by interval.
+
+        Only the rounds which are due are listed, as per-item entries read
+        the items to refresh from the cache. Rounds keep their previous
+        jobs if listing fails.
+        """
+        schedule = [e for e in self.schedule if e["interval"] in intervals]
+        try:
+            with self.app.app_context():
+                current = rounds(expand(schedule))
+        except Exception:
+            logger.exception("Error listing refresh jobs")
+            current = previous
+        return {interval: current.get(interval, []) for interval in intervals}
+
+    def _claim(self, interval):
+        """Mark a round as running unless it already is."""
+        with self._lock:
+            if interval in self._running:
+                return False
+            self._running.add(interval)
+            return True
+
+    def _kept(self, interval):
+        """Get the cache keys which other rounds than ``interval`` refresh.
+
+        Only entries without ``each`` are included, as per-item entries are
+        not purged.
+        """
+        keys = {}
+        for entry in self.schedule:
+            if "each" not in entry:
+                key = getattr(client, entry["collector"]).key()
+                keys.setdefault(key, set()).add(entry["interval"])
+        return {key for key, owners in keys.items() if interval not in owners}
+
+    def _round(self, executor, interval, jobs):
+        """Refresh the jobs of a round, then write their values at once."""
+        kept = self._kept(interval)
+        try:
+            with self.app.app_context(), cache.batch(kept=kept) as pending:
+                concurrent.futures.wait(
+                    [
+                        executor.submit(self._refresh, job, pending)
+                        for job in jobs
+                    ]
+                )
+        except Exception:
+            logger.exception("Error refreshing every %ss", interval)
+        finally:
+            with self._lock:
+                self._running.discard(interval)
+
+    def _refresh(self, job, pending):
+        """Refresh a single job of the round storing into ``pending``."""
+        if self._stopped.is_set():
+            return
+        start = time.monotonic()
+        try:
+            with self.app.app_context():
+                f = getattr(client, job.collector)
+                if job.invalidate:
+                    with cache.batch(pending):
+                        f(*job.args, cached=False)
+                elif f.refresh(*job.args, invalidate=False) is None:
+                    logger.debug("%s%s is already refreshing", *job[:2])
+                    return
+            logger.debug(
+                "Refreshed %s%s in %.1fs",
+                job.collector,
+                job.args,
+                time.monotonic() - start,
+            )
+        except circuit.CircuitOpen:
+            logger.debug("%s%s is waiting for its API", *job[:2])
+        except cache.NotFound:
+            logger.debug("%s%s no longer exists", *job[:2])
+        except Exception:
+            logger.exception("Error refreshing %s%s", *job[:2])
+
+
+def main():
+    """Run the refresher."""
+    parser = argparse.ArgumentParser(description="Keep cached data warm.")
+    parser.add_argument(
+        "--once", action="store_true", help="refresh every job once and exit"
+    )
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+
+    # The web app module loads the configuration
+    from app import app
+
+    refresher = Refresher(app)
+    signal.signal(signal.SIGTERM, lambda signum, frame: refresher.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: refresher.stop())
+    client.track_deltas()
+    with app.app_context():
+        client.start_informers(app.config.get("INFORMERS") or [])
+    try:
+        refresher.run(once=args.once)
+    finally:
+        informer.stop_all()
+
+
+if __name__ == "__main__":
+    main()
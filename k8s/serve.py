@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Serve the app from one process on a gevent event loop.
+
+Run from the application directory::
+
+    python -m k8s.serve [--port 8000]
+
+Blocking socket calls made by the Kubernetes and Redis clients are patched
+to yield to the event loop, so while one request waits on the cluster the
+process serves others. Up to ``SERVE_CONCURRENCY`` requests are handled at
+once, each in a greenlet rather than a thread. Background refresh
+threads and fetch_many() workers become greenlets too.
+
+CPU bound work such as rendering still runs one request at a time; this
+mode helps when requests mostly wait on cold collectors. See bench.serve
+for measurements.
+"""
+import argparse
+import logging
+import signal
+
+import gevent
+import gevent.monkey
+
+
+logger = logging.getLogger(__name__)
+
+
+def patch():
+    """Make blocking I/O cooperative.
+
+    Must be called before the app or any client library is imported.
+    """
+    gevent.monkey.patch_all()
+
+
+def server(app, host="0.0.0.0", port=8000, concurrency=None):
+    """Build a WSGI server for a Flask app."""
+    import gevent.pool
+    import gevent.pywsgi
+
+    if concurrency is None:
+        concurrency = app.config.get("SERVE_CONCURRENCY", 100)
+    return gevent.pywsgi.WSGIServer(
+        (host, port),
+        app,
+        spawn=gevent.pool.Pool(concurrency),
+        log=None,
+    )
+
+
+def main():
+    """Run the server."""
+    parser = argparse.ArgumentParser(description="Serve the app with gevent.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="requests to handle at once (default: SERVE_CONCURRENCY)",
+    )
+    args = parser.parse_args()
+    patch()
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+
+    # The web app module loads the configuration
+    from app import app
+
+    http = server(app, args.host, args.port, args.concurrency)
+    # Stop from the event loop rather than from inside a signal handler
+    gevent.signal_handler(signal.SIGTERM, http.stop, 5)
+    logger.info("Serving on %s:%d", args.host, args.port)
+    http.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Indexed collections of cluster objects."""
+
+
+def object_key(obj):
+    """Get the (namespace, name) key for a Kubernetes object."""
+    return (obj.metadata.namespace or "", obj.metadata.name)
+
+
+def by_namespace(obj):
+    """Index objects by namespace."""
+    return [obj.metadata.namespace or ""]
+
+
+def record_key(record):
+    """Get the (namespace, name) key for a PodRecord."""
+    return (record.namespace, record.name)
+
+
+def cluster_record_key(record):
+    """Get the ("", name) key for a record of a cluster scoped object."""
+    return ("", record.name)
+
+
+def by_record_namespace(record):
+    """Index records by namespace."""
+    return [record.namespace]
+
+
+def by_node(pod):
+    """Index PodRecords by the node they are assigned to."""
+    return [pod.node] if pod.node else []
+
+
+def by_scheduled_node(pod):
+    """Index PodRecords which occupy a slot on their node."""
+    if pod.phase == "Succeeded":
+        return []
+    return by_node(pod)
+
+
+def by_phase(pod):
+    """Index PodRecords by phase."""
+    return [pod.phase]
+
+
+def by_image(pod):
+    """Index PodRecords by the images of their containers."""
+    return {container.image for container in pod.containers}
+
+
+def by_owner(pod):
+    """Index PodRecords by (namespace, kind, name) of their owners."""
+    return [(pod.namespace, kind, name) for kind, name in pod.owners]
+
+
+DEFAULT_INDEXERS = {
+    "namespace": by_namespace,
+}
+
+POD_INDEXERS = {
+    "namespace": by_record_namespace,
+    "node": by_node,
+    "scheduled": by_scheduled_node,
+    "phase": by_phase,
+    "image": by_image,
+    "owner": by_owner,
+}
+
+
+def pod_version(pod):
+    """Get the identity of a revision of a PodRecord."""
+    return (pod.uid, pod.resource_version)
+
+
+class Snapshot:
+    """Collection of objects with secondary hash indexes and aggregates.
+
+    ``indexers`` maps index names to functions returning the index values
+    for an object. Lookups by index value cost O(result) rather than a scan
+    of the whole collection.
+
+    ``aggregates`` maps names to factories of objects with ``add(obj)`` and
+    ``remove(obj)`` methods, such as those in k8s.aggregates, which are
+    kept up to date as objects are added and removed.
+    """
+
+    def __init__(self, items=(), indexers=None, aggregates=None):
+        """Create a snapshot from (key, object) pairs."""
+        self.indexers = DEFAULT_INDEXERS if indexers is None else indexers
+        self.aggregates = aggregates or {}
+        self._items = {}
+        self._indexes = {name: {} for name in self.indexers}
+        self._aggregates = {
+            name: factory() for name, factory in self.aggregates.items()
+        }
+        for key, obj in items:
+            self.add(key, obj)
+
+    def add(self, key, obj):
+        """Add or replace an object."""
+        if key in self._items:
+            self.remove(key)
+        self._items[key] = obj
+        for name, indexer in self.indexers.items():
+            index = self._indexes[name]
+            for value in indexer(obj):
+                index.setdefault(value, {})[key] = obj
+        for aggregate in self._aggregates.values():
+            aggregate.add(obj)
+
+    def update(self, items, version=None):
+        """Make the snapshot hold exactly the given (key, object) pairs.
+
+        Only objects which are new, changed or gone are re-indexed and
+        re-aggregated, so the cost beyond a pass over ``items`` is
+        proportional to the churn. Objects are compared by ``version(obj)``,
+        or by equality by default. Returns (added, changed, removed) counts.
+        """
+        version = version or (lambda obj: obj)
+        seen = set()
+        added = changed = 0
+        for key, obj in items:
+            seen.add(key)
+            old = self._items.get(key)
+            if old is None:
+                added += 1
+            elif version(old) != version(obj):
+                changed += 1
+            else:
+                continue
+            self.add(key, obj)
+        gone = [key for key in self._items if key not in seen]
+        for key in gone:
+            self.remove(key)
+        return added, changed, len(gone)
+
+    def remove(self, key):
+        """Remove an object."""
+        obj = self._items.pop(key, None)
+        if obj is None:
+            return
+        for aggregate in self._aggregates.values():
+            aggregate.remove(obj)
+        for name, indexer in self.indexers.items():
+            index = self._indexes[name]
+            for value in indexer(obj):
+                bucket = index.get(value)
+                if bucket is None:
+                    continue
+                bucket.pop(key, None)
+                if not bucket:
+                    del index[value]
+
+    def get(self, key):
+        """Get an object by key."""
+        return self._items.get(key)
+
+    def values(self):
+        """List all objects."""
+        return list(self._items.values())
+
+    def by(self, index, value):
+        """List objects having a value in an index."""
+        return list(self._indexes[index].get(value, {}).values())
+
+    def count(self, index, value):
+        """Count objects having a value in an index."""
+        return len(self._indexes[index].get(value, ()))
+
+    def keys(self, index):
+        """List the values present in an index."""
+        return list(self._indexes[index].keys())
+
+    def counts(self, index):
+        """Count objects for every value in an index."""
+        return {
+            value: len(bucket)
+            for value, bucket in self._indexes[index].items()
+        }
+
+    def aggregate(self, name):
+        """Get an aggregate."""
+        return self._aggregates[name]
+
+    def __len__(self):
+        """Count objects."""
+        return len(self._items)
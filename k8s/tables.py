@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Server-side paging, filtering and sorting of table rows.
+
+A Table sorts its rows by every sortable column once, when it is built,
+so serving a request only walks the requested order and slices out one
+page. Tables built by collectors are cached with the rest of their data.
+
+Requests select a window with ``?sort=column`` (``-column`` for
+descending), ``?q=text`` to keep rows containing some text, and ``?page=``
+and ``?limit=``.
+"""
+import collections
+import math
+
+import flask
+
+
+Page = collections.namedtuple(
+    "Page", ["rows", "total", "page", "pages", "limit", "sort", "query"]
+)
+
+
+class Table:
+    """Rows with precomputed sort orders and filter text.
+
+    ``columns`` maps sortable column names to functions giving the sort key
+    of a row; the first column is the default sort. ``text`` gives the text
+    of a row which ``q`` filters match, case-insensitively.
+    """
+
+    def __init__(self, rows, columns, text=str):
+        """Sort rows by each column."""
+        self.rows = list(rows)
+        self.default = next(iter(columns))
+        self.orders = {
+            name: sorted(range(len(self.rows)), key=_row_key(self.rows, key))
+            for name, key in columns.items()
+        }
+        self.text = [text(row).lower() for row in self.rows]
+
+    def __len__(self):
+        """Count rows."""
+        return len(self.rows)
+
+    def _order(self, sort, query):
+        """Get (sort, indexes, descending) for a sort and filter.
+
+        Unfiltered orders are the precomputed lists themselves, so they
+        must not be modified and are walked backwards when descending.
+        """
+        column = (sort or "").lstrip("-")
+        if column not in self.orders:
+            sort = column = self.default
+        elif sort.startswith("-"):
+            sort = "-" + column
+        order = self.orders[column]
+        descending = sort.startswith("-")
+        if query:
+            needle = query.lower()
+            order = [
+                i
+                for i in (reversed(order) if descending else order)
+                if needle in self.text[i]
+            ]
+            descending = False
+        return sort, order, descending
+
+    def select(self, sort=None, query=None):
+        """Iterate over every row in a sort order, optionally filtered."""
+        _, order, descending = self._order(sort, query)
+        for i in reversed(order) if descending else order:
+            yield self.rows[i]
+
+    def window(self, sort=None, query=None, page=1, limit=100):
+        """Get one page of rows in a sort order, optionally filtered."""
+        sort, order, descending = self._order(sort, query)
+        total = len(order)
+        pages = max(1, math.ceil(total / limit))
+        page = min(max(1, page), pages)
+        start = (page - 1) * limit
+        end = min(start + limit, total)
+        if descending:
+            first, last = total - end, total - start
+            indexes = reversed(order[first:last])
+        else:
+            indexes = order[start:end]
+        return Page(
+            [self.rows[i] for i in indexes],
+            total,
+            page,
+            pages,
+            limit,
+            sort,
+            query or "",
+        )
+
+
+def _row_key(rows, key):
+    """Get a sort key function for row indexes."""
+    return lambda i: key(rows[i])
+
+
+def _int_arg(name, default):
+    """Read a positive integer query parameter."""
+    try:
+        value = int(flask.request.args.get(name, default))
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def window(table):
+    """Get the page of a table selected by the current request.
+
+    The sort, page and limit actually used are kept as ``table_args`` in
+    ``flask.g``, as the query parameters which would select them.
+    """
+    config = flask.current_app.config
+    limit = min(
+        _int_arg("limit", config.get("TABLE_PAGE_SIZE", 100)),
+        config.get("TABLE_MAX_PAGE_SIZE", 1000),
+    )
+    page = table.window(
+        sort=flask.request.args.get("sort"),
+        query=flask.request.args.get("q"),
+        page=_int_arg("page", 1),
+        limit=limit,
+    )
+    flask.g.table_args = {
+        "sort": page.sort,
+        "page": str(page.page),
+        "limit": str(page.limit),
+    }
+    return page
+
+
+def url(**changes):
+    """Get the URL of the current page with some query parameters changed.
+
+    Parameters set to None are removed. ``purge`` is never carried over,
+    nor are parameters named like the view's arguments or like the
+    ``_external`` style options of url_for.
+    """
+    view_args = flask.request.view_args or {}
+    args = {
+        k: v
+        for k, v in flask.request.args.items()
+        if k != "purge" and k not in view_args and not k.startswith("_")
+    }
+    args.update(changes)
+    args = {k: v for k, v in args.items() if v is not None}
+    return flask.url_for(flask.request.endpoint, **view_args, **args)
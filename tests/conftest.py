@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Shared fixtures."""
+import fakeredis
+import flask
+import pytest
+
+from k8s import cache
+from k8s import circuit
+
+
+@pytest.fixture
+def app():
+    """Get a bare app with an active app context."""
+    app = flask.Flask(__name__)
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def redis_app(app):
+    """Get a bare app caching into an empty in-memory Redis."""
+    app.config.update(REDIS_HOST=fakeredis.FakeRedis(), CACHE_L1_TTL=60)
+    yield app
+    cache.cache.cache_clear()
+    cache.local_cache.cache_clear()
+    cache._generation.update(value=None, checked=float("-inf"))
+    cache._pinned.clear()
+    circuit._breakers.clear()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests for k8s.api."""
+import datetime
+
+import kubernetes
+
+from k8s import api
+from k8s import records
+
+
+def test_dumps_models():
+    """Kubernetes models are encoded as the API would send them."""
+    meta = kubernetes.client.V1ObjectMeta(
+        name="pod-1",
+        creation_timestamp=datetime.datetime(
+            2021, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc
+        ),
+    )
+
+    assert api.dumps([meta, meta]) == (
+        b'[{"creationTimestamp":"2021-01-02T03:04:05+00:00","name":"pod-1"},'
+        b'{"creationTimestamp":"2021-01-02T03:04:05+00:00","name":"pod-1"}]'
+    )
+    assert api._serializer() is api._serializer()
+
+
+def test_dumps_records():
+    """Records are encoded as objects and sets as sorted lists."""
+    row = records.ImageRow("img:1", "", "img", "1", 2)
+
+    assert api.dumps({"row": row, "tags": {"b", "a"}}) == (
+        b'{"row":{"image":"img:1","repository":"","name":"img","tag":"1",'
+        b'"containers":2},"tags":["a","b"]}'
+    )
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests for the views and template filters of app."""
+import datetime
+import time
+import types
+
+import app
+import pytest
+
+import k8s.cache
+import k8s.client
+
+
+@pytest.mark.parametrize(
+    "seconds, expected",
+    [
+        (0, "0ms"),
+        (0.25, "250ms"),
+        (1, "1s"),
+        (59.9, "59s"),
+        # Units are used once a duration is longer than them
+        (60, "60s"),
+        (61, "1m1s"),
+        (3600, "60m"),
+        (3661, "1h1m1s"),
+        (86400 + 3600 + 60 + 1, "1d1h1m"),
+        (-61, "1m1s"),
+    ],
+)
+def test_format_duration(seconds, expected):
+    """Durations are shown in up to three units, largest first."""
+    assert app.format_duration(seconds) == expected
+
+
+def test_format_duration_parts():
+    """Fewer parts can be asked for."""
+    assert app.format_duration(3661, max_parts=2) == "1h1m"
+    assert app.format_duration(3601, max_parts=1) == "1h"
+
+
+def _at(epoch):
+    return datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc)
+
+
+def test_ages_share_the_request_time(monkeypatch):
+    """Every age on a page is relative to the same moment."""
+    clock = iter(range(1000, 2000, 100))
+    monkeypatch.setattr(time, "time", lambda: next(clock))
+    rows = [
+        types.SimpleNamespace(meta=types.SimpleNamespace(created=_at(990))),
+        types.SimpleNamespace(meta=types.SimpleNamespace(created=None)),
+        types.SimpleNamespace(meta=types.SimpleNamespace(created=_at(880))),
+    ]
+
+    with app.app.test_request_context("/"):
+        ages = app.ages(rows, "meta.created")
+        single = app.duration(_at(990))
+        now = app.request_now()
+
+    assert ages == ["10s", "", "2m"]
+    assert single == "10s"
+    assert now == 1000
+
+
+class Prefetched(Exception):
+    """Stops a view once it has prefetched its keys."""
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/",
+        "/nodes/",
+        "/nodes/node-1/",
+        "/namespaces/",
+        "/namespaces/tool-a/",
+        "/images/",
+        "/images/docker-registry.tools.wmflabs.org/web:latest/",
+    ],
+)
+def test_views_prefetch_only_what_they_read(monkeypatch, path):
+    """No view loads the lists of all pods or of their metrics."""
+    keys = []
+
+    def prefetch(wanted):
+        keys.extend(wanted)
+        raise Prefetched
+
+    monkeypatch.setattr(k8s.cache, "prefetch", prefetch)
+    monkeypatch.setitem(app.app.config, "PAGE_CACHE_TTL", 0)
+    monkeypatch.setitem(app.app.config, "PROPAGATE_EXCEPTIONS", True)
+
+    with pytest.raises(Prefetched):
+        app.app.test_client().get(path)
+
+    assert keys
+    assert k8s.client.get_all_pods.key() not in keys
+    assert k8s.client.get_pods_metrics.key() not in keys
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests for k8s.cache."""
+import threading
+import time
+
+import flask
+import prometheus_client
+import pytest
+
+from k8s import cache
+from k8s import circuit
+
+
+def _join_refreshes():
+    """Wait for the background refreshes of this process to finish."""
+    for thread in threading.enumerate():
+        if thread.name.startswith("refresh-"):
+            thread.join()
+
+
+def test_background_refresh_refreshes_stale_inputs_first(redis_app):
+    """A value refreshed from a stale input is not stored from it."""
+    # Values go stale as soon as they are stored
+    redis_app.config["CACHE_TTLS"] = {
+        "test:parent": (0, 60),
+        "test:child": (0, 60),
+    }
+    items = ["a"]
+
+    @cache.cached("test:parent")
+    def get_parent(cached=True):
+        return list(items)
+
+    @cache.cached("test:child")
+    def get_child(cached=True):
+        return len(get_parent(cached=cached))
+
+    assert get_child() == 1
+    items.append("b")
+
+    assert get_child() == 1
+    _join_refreshes()
+
+    assert cache.load(get_child.key())[1] == 2
+    assert cache.load(get_parent.key())[1] == ["a", "b"]
+
+
+def _counted(key):
+    """Get a cached function counting its calls, and the counts."""
+    calls = []
+
+    @cache.cached(key)
+    def get(cached=True):
+        calls.append(key)
+        return len(calls)
+
+    return get, calls
+
+
+def test_purge_memo_within_a_batch(redis_app):
+    """A key purged once in a batch is not recomputed when purged again."""
+    redis_app.config["CACHE_PURGE_INTERVAL"] = 0
+    get_parent, calls = _counted("test:parent")
+
+    @cache.cached("test:child:a")
+    def get_a(cached=True):
+        return ("a", get_parent(cached=cached))
+
+    @cache.cached("test:child:b")
+    def get_b(cached=True):
+        return ("b", get_parent(cached=cached))
+
+    with cache.batch():
+        assert get_a(cached=False) == ("a", 1)
+        assert get_b(cached=False) == ("b", 1)
+        assert get_parent(cached=False) == 1
+    assert calls == ["test:parent"]
+
+    with cache.batch():
+        assert get_b(cached=False) == ("b", 2)
+    assert get_parent() == 2
+
+
+def test_purges_outside_batches_recompute(redis_app):
+    """Without a batch or purge interval every purge recomputes."""
+    redis_app.config["CACHE_PURGE_INTERVAL"] = 0
+    get, calls = _counted("test:value")
+
+    assert [get(cached=False) for _ in range(3)] == [1, 2, 3]
+
+
+def test_purge_interval(redis_app):
+    """Purges within CACHE_PURGE_INTERVAL of another use its value."""
+    redis_app.config["CACHE_PURGE_INTERVAL"] = 60
+    get, calls = _counted("test:value")
+
+    assert [get(cached=False) for _ in range(3)] == [1, 1, 1]
+    assert len(calls) == 1
+
+
+def test_concurrent_purges_share_a_computation(redis_app):
+    """A purge of a key being purged waits for that purge's value."""
+    redis_app.config["CACHE_PURGE_INTERVAL"] = 0
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    @cache.cached("test:slow")
+    def get_slow(cached=True):
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return len(calls)
+
+    results = []
+
+    def coalesced():
+        return prometheus_client.REGISTRY.get_sample_value(
+            "k8s_status_cache_requests_total",
+            {"prefix": "test:slow", "result": "purge_coalesced"},
+        )
+
+    before = coalesced() or 0
+
+    def purge():
+        with redis_app.app_context():
+            results.append(get_slow(cached=False))
+
+    first = threading.Thread(target=purge)
+    first.start()
+    started.wait(5)
+    second = threading.Thread(target=purge)
+    second.start()
+    deadline = time.monotonic() + 5
+    while coalesced() == before and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    first.join()
+    second.join()
+
+    assert results == [1, 1]
+    assert calls == [1]
+
+
+def test_local_cache_hit(redis_app):
+    """Values loaded once are served from the local cache."""
+    cache.store("test:value", ["a"], 60)
+    value = cache.load("test:value")
+    cache.cache()._write_client.delete(
+        cache.cache()._get_prefix() + "test:value"
+    )
+
+    assert cache.load("test:value") is value
+
+
+def test_local_cache_expires(redis_app, monkeypatch):
+    """Local copies are dropped CACHE_L1_TTL seconds after storing them."""
+    redis_app.config["CACHE_L1_TTL"] = 30
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    cache.store("test:value", ["a"], 60)
+    value = cache.load("test:value")
+
+    now += 30
+    assert cache.load("test:value") is value
+    now += 1
+    assert cache.load("test:value") == ["a"]
+    assert cache.load("test:value") is not value
+
+
+def test_local_cache_flushed_by_other_generation(redis_app, monkeypatch):
+    """A generation bumped by another process drops local copies."""
+    redis_app.config["CACHE_L1_GENERATION_INTERVAL"] = 5
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    cache.store("test:value", ["a"], 60)
+    value = cache.load("test:value")
+    before = cache.generation()
+    # Another process bumps the generation
+    cache.cache()._write_client.incr(
+        cache.cache()._get_prefix() + cache.GENERATION_KEY
+    )
+
+    assert cache.load("test:value") is value
+    now += 5
+    assert cache.generation() == before + 1
+    assert cache.load("test:value") == ["a"]
+    assert cache.load("test:value") is not value
+
+
+def _redis_ttl(key):
+    """Get the seconds Redis keeps a key for."""
+    return cache.cache()._read_client.ttl(cache.cache()._get_prefix() + key)
+
+
+def test_missing_values_are_remembered(redis_app):
+    """Missing values raise NotFound for CACHE_MISSING_TTL seconds."""
+    redis_app.config["CACHE_MISSING_TTL"] = 30
+    calls = []
+
+    @cache.cached("test:value", missing=lambda e: isinstance(e, KeyError))
+    def get_value(name, cached=True):
+        calls.append(name)
+        raise KeyError(name)
+
+    for _ in range(2):
+        with pytest.raises(cache.NotFound):
+            get_value("a")
+
+    assert calls == ["a"]
+    assert 25 < _redis_ttl(get_value.key("a")) <= 30
+    # Once forgotten, the API is asked again
+    cache.cache()._write_client.delete(
+        cache.cache()._get_prefix() + get_value.key("a")
+    )
+    cache.local_cache().clear()
+    with pytest.raises(cache.NotFound):
+        get_value("a")
+    assert calls == ["a", "a"]
+
+
+def _open(name):
+    """Open the breaker of a collector."""
+    breaker = circuit.breaker(name)
+    for _ in range(breaker.failures):
+        breaker.failure()
+    return breaker
+
+
+def test_stale_value_served_while_breaker_open(redis_app):
+    """Stale values are served, marked and kept while calls are refused."""
+    redis_app.config["CACHE_TTLS"] = {"test:value": (0, 60)}
+    calls = []
+
+    @cache.cached("test:value")
+    def get_value(cached=True):
+        calls.append(1)
+        return ["a"]
+
+    get_value()
+    key = get_value.key()
+    cache.cache()._write_client.expire(cache.cache()._get_prefix() + key, 5)
+    breaker = _open("get_value")
+
+    assert get_value() == ["a"]
+    assert calls == [1]
+    assert 55 < _redis_ttl(key) <= 60
+    assert cache._pinned[key] == breaker.until
+    assert circuit.stale_since() is not None
+
+
+def test_breakers_are_per_collector(redis_app):
+    """Collectors sharing a key prefix do not share a breaker."""
+
+    @cache.cached("test:items")
+    def get_item(name, cached=True):
+        return name
+
+    @cache.cached("test:items")
+    def get_items(cached=True):
+        return ["a"]
+
+    _open("get_item")
+
+    with pytest.raises(circuit.CircuitOpen):
+        get_item("a")
+    assert get_items() == ["a"]
+
+
+def test_dependent_value_refused_while_input_breaker_open(redis_app):
+    """A value computed from one served stale is refused, not stored."""
+    redis_app.config["CACHE_TTLS"] = {"test:parent": (0, 60)}
+
+    @cache.cached("test:parent")
+    def get_parent(cached=True):
+        return ["a"]
+
+    @cache.cached("test:child")
+    def get_child(cached=True):
+        return len(get_parent())
+
+    get_parent()
+    parent = _open("get_parent")
+
+    with pytest.raises(circuit.CircuitOpen) as raised:
+        get_child(cached=False)
+
+    assert raised.value.name == "get_parent"
+    assert circuit.breaker("get_child").until == parent.until
+    assert cache.load(get_child.key()) is None
+    assert "stale_since" not in flask.g
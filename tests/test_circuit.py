@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests for k8s.circuit."""
+import types
+
+import flask
+import pytest
+
+from k8s import circuit
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace the clock of breakers with one which only moves when told."""
+    now = types.SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(
+        circuit, "time", types.SimpleNamespace(monotonic=lambda: now.value)
+    )
+    return now
+
+
+def _fail(breaker, times):
+    for _ in range(times):
+        breaker.check()
+        breaker.failure()
+
+
+def test_opens_after_consecutive_failures(clock):
+    """Calls are refused for ``backoff`` seconds after too many failures."""
+    breaker = circuit.Breaker("test", failures=3, backoff=5)
+
+    _fail(breaker, 2)
+    assert not breaker.refusing()
+    breaker.success()
+    _fail(breaker, 2)
+    assert not breaker.refusing()
+    _fail(breaker, 1)
+
+    assert breaker.refusing()
+    with pytest.raises(circuit.CircuitOpen) as raised:
+        breaker.check()
+    assert raised.value.name == "test"
+    assert raised.value.until == 1005.0
+
+
+def test_half_open_lets_one_call_through(clock):
+    """Once the wait is over one call is tried while others are refused."""
+    breaker = circuit.Breaker("test", failures=1, backoff=5)
+    _fail(breaker, 1)
+    clock.value += 5
+
+    breaker.check()
+    with pytest.raises(circuit.CircuitOpen):
+        breaker.check()
+    breaker.success()
+
+    assert not breaker.refusing()
+    breaker.check()
+    breaker.check()
+
+
+def test_failed_retries_double_the_wait(clock):
+    """Each failed retry doubles the wait, up to ``max_backoff``."""
+    breaker = circuit.Breaker("test", failures=2, backoff=5, max_backoff=30)
+    _fail(breaker, 2)
+    waits = [breaker.until - clock.value]
+    for _ in range(4):
+        clock.value = breaker.until
+        _fail(breaker, 1)
+        waits.append(breaker.until - clock.value)
+
+    assert waits == [5, 10, 20, 30, 30]
+
+
+def test_success_closes(clock):
+    """A successful retry resets the failure count and the wait."""
+    breaker = circuit.Breaker("test", failures=2, backoff=5)
+    _fail(breaker, 2)
+    clock.value = breaker.until
+    _fail(breaker, 1)
+    clock.value = breaker.until
+    breaker.check()
+    breaker.success()
+
+    _fail(breaker, 1)
+    assert not breaker.refusing()
+    _fail(breaker, 1)
+    assert breaker.until - clock.value == 5
+
+
+def test_hold_only_extends(clock):
+    """Holding for a dependency never shortens the wait."""
+    breaker = circuit.Breaker("test", failures=1, backoff=60)
+    _fail(breaker, 1)
+
+    breaker.hold(1010.0)
+    assert breaker.until == 1060.0
+    breaker.hold(1100.0)
+    assert breaker.until == 1100.0
+
+
+def test_breakers_are_configured_per_key(app):
+    """breaker() returns one breaker per key configured from the app."""
+    app.config.update(CIRCUIT_FAILURES=7, CIRCUIT_BACKOFF=2)
+    try:
+        assert circuit.breaker("test:a") is circuit.breaker("test:a")
+        assert circuit.breaker("test:a") is not circuit.breaker("test:b")
+        assert circuit.breaker("test:a").failures == 7
+        assert circuit.breaker("test:a").backoff == 2
+    finally:
+        circuit._breakers.clear()
+
+
+def test_mark_stale_keeps_the_oldest(app):
+    """The request is marked with the oldest stale value served to it."""
+    assert circuit.stale_since() is None
+    with app.test_request_context():
+        circuit.mark_stale(200.0)
+        circuit.mark_stale(100.0)
+        circuit.mark_stale(300.0)
+        assert circuit.stale_since() == 100.0
+
+
+def test_mark_stale_outside_app_context():
+    """Marking without an app context does nothing."""
+    assert not flask.has_app_context()
+    circuit.mark_stale(100.0)
+    assert circuit.stale_since() is None
@@ -0,0 +1,508 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests for k8s.client."""
+import concurrent.futures
+import datetime
+import threading
+import time
+import types
+from unittest.mock import ANY
+
+import kubernetes.client
+import orjson
+import pytest
+import yaml
+
+from k8s import api
+from k8s import cache
+from k8s import client
+from k8s import records
+
+
+class FakeList:
+    """List function of a fake API serving items a page at a time.
+
+    Continue tokens are the offset of the next page, as opaque to callers
+    as real ones.
+    """
+
+    def __init__(self, items):
+        """Serve ``items``."""
+        self.items = items
+        self.calls = []
+
+    def _page(self, limit, token):
+        start = int(token or 0)
+        end = start + limit
+        return (
+            self.items[start:end],
+            str(end) if end < len(self.items) else None,
+        )
+
+    def __call__(self, limit=None, _continue=None, _preload_content=True):
+        """Get a page like a kubernetes.client list method."""
+        self.calls.append((limit, _continue))
+        items, token = self._page(limit, _continue)
+        if not _preload_content:
+            body = {"items": items, "metadata": {}}
+            if token:
+                body["metadata"]["continue"] = token
+            return types.SimpleNamespace(data=orjson.dumps(body))
+        return types.SimpleNamespace(
+            items=items, metadata=types.SimpleNamespace(_continue=token)
+        )
+
+
+def _objects(count):
+    return [{"name": "pod-{}".format(i)} for i in range(count)]
+
+
+@pytest.mark.parametrize("raw", [False, True])
+def test_paginate_follows_continue_tokens(app, raw):
+    """Every page is requested with the limit and each item yielded once."""
+    app.config["K8S_RAW_JSON"] = raw
+    fake = FakeList(_objects(7))
+
+    pages = list(client.paginate(fake, page_size=3))
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    names = [obj["name"] for page in pages for obj in page]
+    assert names == [obj["name"] for obj in fake.items]
+    assert fake.calls == [(3, None), (3, "3"), (3, "6")]
+
+
+def test_paginate_uses_configured_page_size(app):
+    """Without a page size K8S_LIST_PAGE_SIZE is sent as the limit."""
+    app.config["K8S_LIST_PAGE_SIZE"] = 4
+    fake = FakeList(_objects(5))
+
+    list(client.paginate(fake))
+
+    assert [limit for limit, _ in fake.calls] == [4, 4]
+
+
+def test_paginate_empty_list(app):
+    """An empty list is a single empty page."""
+    fake = FakeList([])
+
+    assert list(client.paginate(fake, page_size=3)) == [[]]
+    assert fake.calls == [(3, None)]
+
+
+def test_iter_projects_one_page_at_a_time(app, monkeypatch):
+    """Objects are projected before the next page is requested."""
+    app.config["K8S_LIST_PAGE_SIZE"] = 2
+    fake = FakeList(_objects(5))
+    projected = []
+
+    def project(obj):
+        # Pages requested when each object was projected
+        projected.append((obj["name"], len(fake.calls)))
+        return obj["name"]
+
+    monkeypatch.setitem(client.RECORDS, "things", project)
+    objects = client._iter("things", fake)
+
+    assert next(objects) == "pod-0"
+    assert len(fake.calls) == 1
+    assert list(objects) == ["pod-1", "pod-2", "pod-3", "pod-4"]
+    assert projected == [
+        ("pod-0", 1),
+        ("pod-1", 1),
+        ("pod-2", 2),
+        ("pod-3", 2),
+        ("pod-4", 3),
+    ]
+
+
+class LateExecutor:
+    """Executor whose workers pick calls up at once but run them late.
+
+    Like a pool busy with earlier calls, except that picked up calls can no
+    longer be cancelled.
+    """
+
+    def __init__(self):
+        """Create an executor with nothing to run."""
+        self.started = []
+
+    def submit(self, fn, *args):
+        """Pick up a call, leaving it to run()."""
+        future = concurrent.futures.Future()
+        future.set_running_or_notify_cancel()
+        self.started.append((future, fn, args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        """Leave the calls picked up to run()."""
+
+    def run(self):
+        """Run the calls picked up so far in a worker thread."""
+
+        def work():
+            for future, fn, args in self.started:
+                future.set_result(fn(*args))
+
+        worker = threading.Thread(target=work)
+        worker.start()
+        worker.join()
+
+
+def test_fetch_many_late_calls_join_the_batch(app, monkeypatch):
+    """Calls still running after a timeout store into the request's batch."""
+    late = LateExecutor()
+    monkeypatch.setattr(client, "_executor", lambda calls: late)
+    batches = []
+
+    with cache.batch() as pending:
+        results, errors = client.fetch_many(
+            {"slow": lambda: batches.append(cache.current_batch())},
+            timeout=0.01,
+        )
+        late.run()
+
+    assert results == {}
+    assert isinstance(errors["slow"], TimeoutError)
+    assert batches == [pending]
+
+
+class FakeApiClient:
+    """ApiClient recording the keyword arguments of its calls."""
+
+    def __init__(self):
+        """Create a client which has made no calls."""
+        self.calls = []
+
+    def call_api(self, resource_path, method, **kwargs):
+        """Record a call."""
+        self.calls.append(kwargs)
+
+
+def test_deadline_bounds_api_calls():
+    """Calls get the time left as their timeout, and none once it is up."""
+    api = client._bounded(FakeApiClient())
+
+    api.call_api("/api/v1/pods", "GET", _request_timeout=None)
+    with client.deadline(time.monotonic() + 5):
+        api.call_api("/api/v1/pods", "GET", _request_timeout=None)
+        api.call_api("/api/v1/pods", "GET", _request_timeout=1)
+    with client.deadline(time.monotonic() - 1):
+        with pytest.raises(TimeoutError):
+            api.call_api("/api/v1/pods", "GET", _request_timeout=None)
+
+    timeouts = [call["_request_timeout"] for call in api.calls]
+    assert len(timeouts) == 3
+    assert timeouts[0] is None
+    assert 4 < timeouts[1] <= 5
+    assert timeouts[2] == 1
+
+
+def test_fetch_many_calls_share_its_deadline(app):
+    """Calls run under a deadline ending with the fetch timeout."""
+    start = time.monotonic()
+    results, errors = client.fetch_many(
+        {"a": lambda: client._deadlines.until}, timeout=10
+    )
+
+    assert errors == {}
+    assert start + 10 <= results["a"] <= time.monotonic() + 10
+    assert getattr(client._deadlines, "until", None) is None
+
+
+def _pod(name):
+    return records.PodRecord(
+        "tool-a",
+        name,
+        "uid-" + name,
+        "1",
+        "Running",
+        "node-1",
+        None,
+        {},
+        (),
+        (),
+        1,
+        0,
+        0.0,
+        0.0,
+    )
+
+
+@pytest.mark.parametrize("deltas", [None, {}])
+def test_pod_totals_are_not_changed_by_later_lists(
+    redis_app, monkeypatch, deltas
+):
+    """Cached pod totals keep the counts they were computed with."""
+    redis_app.config["CACHE_PURGE_INTERVAL"] = 0
+    lists = [[_pod("a")], [_pod("a"), _pod("b")]]
+    monkeypatch.setattr(client, "_deltas", deltas)
+    monkeypatch.setattr(
+        client, "get_all_pods", lambda cached: {"items": lists.pop(0)}
+    )
+
+    first = client.get_pod_totals(cached=False)
+    second = client.get_pod_totals(cached=False)
+
+    assert (first["totals"].total, first["scheduled"]) == (1, {"node-1": 1})
+    assert (second["totals"].total, second["scheduled"]) == (2, {"node-1": 2})
+    assert cache.load(client.get_pod_totals.key())[1]["totals"].total == 2
+    # Only processes which track deltas keep a store of every pod
+    assert client._deltas == (None if deltas is None else {"pods": ANY})
+
+
+def test_views_read_pods_by_node_and_image(redis_app, monkeypatch):
+    """Pods of a node and containers of an image are read from their keys."""
+    redis_app.register_blueprint(api.blueprint)
+    container = records.ContainerRecord("web", "img:1", True, 0)
+    pods = [_pod("a"), _pod("b")._replace(containers=(container,))]
+    monkeypatch.setattr(client, "get_all_pods", lambda cached: {"items": pods})
+    client.get_node_pods("node-1")
+    client.get_image_containers("img:1")
+
+    def unexpected(cached):
+        raise AssertionError("all pods listed")
+
+    monkeypatch.setattr(client, "get_all_pods", unexpected)
+    resp = redis_app.test_client().get("/api/v1/images/img:1")
+
+    assert resp.status_code == 200
+    assert orjson.loads(resp.get_data()) == {
+        "namespace": "tool-a",
+        "pod": "b",
+        "container": "web",
+    }
+    assert client.get_node_pods("node-1")["items"] == pods
+
+
+def _quota(namespace, hard, used):
+    return {
+        "metadata": {"namespace": namespace},
+        "status": {"hard": hard, "used": used},
+    }
+
+
+@pytest.mark.parametrize(
+    "hard, used, expected",
+    [
+        (
+            {"pods": "10", "requests.cpu": "2"},
+            {"pods": "5", "requests.cpu": "1500m"},
+            0.75,
+        ),
+        ({"limits.memory": "1Gi"}, {}, 0.0),
+        # Limits of zero cannot be used up
+        ({"pods": "0", "services": "4"}, {"pods": "0", "services": "1"}, 0.25),
+        (None, None, 0.0),
+    ],
+)
+def test_quota_usage(hard, used, expected):
+    """Quotas are as used as their most used hard limit."""
+    quota = records.Resource(_quota("tool-a", hard, used))
+
+    assert client._quota_usage(quota) == pytest.approx(expected)
+
+
+def _at(hour):
+    return datetime.datetime(2024, 1, 1, hour, tzinfo=datetime.timezone.utc)
+
+
+def test_namespace_summary(redis_app, monkeypatch):
+    """Namespaces are summarized from the cluster-wide lists."""
+    redis_app.config["K8S_RAW_JSON"] = True
+    pods = [
+        _pod("a")._replace(start_time=_at(1)),
+        _pod("b")._replace(start_time=_at(3)),
+        _pod("c")._replace(phase="Succeeded"),
+        _pod("d")._replace(namespace="tool-b", phase="Failed"),
+        _pod("e")._replace(namespace="kube-system", start_time=_at(2)),
+    ]
+    quotas = [
+        _quota("tool-a", {"pods": "4"}, {"pods": "1"}),
+        _quota("tool-a", {"pods": "4"}, {"pods": "2"}),
+        _quota("tool-c", {"pods": "4"}, {"pods": "0"}),
+    ]
+    namespaces = [
+        records.NamespaceRecord(name, _at(0))
+        for name in ("kube-system", "tool-a", "tool-b", "tool-c", "tool-d")
+    ]
+    monkeypatch.setattr(client, "_deltas", None)
+    monkeypatch.setattr(client, "get_all_pods", lambda cached: {"items": pods})
+    monkeypatch.setattr(
+        client, "get_namespaces", lambda cached: {"items": namespaces}
+    )
+    monkeypatch.setattr(
+        client,
+        "get_cronjobs_by_namespace",
+        lambda cached: {"namespaces": {"tool-c": ["job"]}},
+    )
+    monkeypatch.setattr(
+        client,
+        "get_ingresses_by_namespace",
+        lambda cached: {"namespaces": {"tool-a": ["web", "api"]}},
+    )
+    monkeypatch.setattr(
+        client,
+        "corev1_client",
+        lambda: types.SimpleNamespace(
+            list_resource_quota_for_all_namespaces=FakeList(quotas)
+        ),
+    )
+
+    summary = client.get_namespace_summary()
+
+    assert list(summary["items"]) == [ns.name for ns in namespaces]
+    assert summary["items"]["tool-a"] == records.NamespaceSummary(
+        "tool-a", _at(0), 3, 2, 0, 2, 0.5, _at(3)
+    )
+    assert summary["items"]["tool-b"] == records.NamespaceSummary(
+        "tool-b", _at(0), 1, 0, 0, 0, None, None
+    )
+    assert summary["items"]["tool-c"] == records.NamespaceSummary(
+        "tool-c", _at(0), 0, 0, 1, 0, 0.0, None
+    )
+    assert summary["items"]["kube-system"].last_activity == _at(2)
+    assert summary["active"] == {"kube-system", "tool-a", "tool-b", "tool-c"}
+    assert [row.name for row in summary["tools"].select()] == [
+        "tool-a",
+        "tool-b",
+        "tool-c",
+    ]
+    assert summary["active_pods"] == 3
+
+
+def _pod_metrics(namespace, name, *usage):
+    return {
+        "metadata": {"namespace": namespace, "name": name},
+        "containers": [
+            {"name": str(i), "usage": {"cpu": cpu, "memory": memory}}
+            for i, (cpu, memory) in enumerate(usage)
+        ],
+    }
+
+
+def test_pod_usage(redis_app, monkeypatch):
+    """Pod metrics are joined to pods and totalled by namespace and node."""
+    redis_app.config["USAGE_TOP_PODS"] = 1
+    pods = [
+        _pod("a")._replace(cpu=1.0, memory=2.0**30),
+        _pod("b")._replace(node="node-2", cpu=0.5),
+        _pod("c")._replace(namespace="tool-b"),
+        # Not scheduled yet, so not measured
+        _pod("d")._replace(namespace="tool-b", node=None, cpu=4.0),
+    ]
+    metrics = [
+        _pod_metrics("tool-a", "a", ("250m", "256Mi"), ("250m", "256Mi")),
+        _pod_metrics("tool-a", "b", ("100m", "64Mi")),
+        _pod_metrics("tool-b", "c", ("1", "1Gi")),
+        # Pods which are gone by the time they are listed
+        _pod_metrics("tool-b", "gone", ("2", "1Gi")),
+    ]
+    monkeypatch.setattr(client, "get_all_pods", lambda cached: {"items": pods})
+    monkeypatch.setattr(
+        client, "get_pods_metrics", lambda cached: {"items": metrics}
+    )
+    a = records.PodUsage(
+        "tool-a", "a", "node-1", 0.5, 2.0**29, 1.0, 2.0**30
+    )
+    c = records.PodUsage("tool-b", "c", "node-1", 1.0, 2.0**30, 0.0, 0.0)
+
+    usage = client.get_pod_usage()
+
+    assert usage["namespaces"] == {
+        "tool-a": records.UsageSummary(
+            2, 0.6, 9 * 2.0**26, 1.5, 2.0**30, 0.6 / 1.5, 9 / 16, (a,)
+        ),
+        "tool-b": records.UsageSummary(
+            1, 1.0, 2.0**30, 0.0, 0.0, None, None, (c,)
+        ),
+    }
+    assert set(usage["nodes"]) == {"node-1", "node-2"}
+    assert usage["nodes"]["node-1"].pods == 2
+    assert usage["nodes"]["node-1"].cpu == pytest.approx(1.5)
+    assert usage["nodes"]["node-1"].top == (c,)
+    assert usage["nodes"]["node-2"].top[0].name == "b"
+
+
+@pytest.fixture
+def api_client():
+    """Drop the shared API client before and after a test."""
+    client.api_client.cache_clear()
+    yield client.api_client
+    client.api_client.cache_clear()
+
+
+def test_api_client_is_shared(app, api_client):
+    """The configuration is loaded once, when the API is first used."""
+    loads = []
+
+    def configuration():
+        loads.append(1)
+        return kubernetes.client.Configuration(host="http://fake")
+
+    app.config.update(
+        K8S_CLIENT_CONFIG=configuration, K8S_CONNECTION_POOL_SIZE=3
+    )
+
+    shared = api_client()
+
+    assert client.corev1_client().api_client is shared
+    assert client.custom_client().api_client is shared
+    assert shared.configuration.host == "http://fake"
+    assert shared.configuration.connection_pool_maxsize == 3
+    assert loads == [1]
+    # Rebuilt with the configuration of the time once dropped
+    api_client.cache_clear()
+    assert api_client() is not shared
+    assert loads == [1, 1]
+
+
+def test_kubeconfig_context(app, tmp_path):
+    """The configured context of a kubeconfig file is loaded."""
+    kubeconfig = tmp_path / "config"
+    kubeconfig.write_text(
+        yaml.safe_dump(
+            {
+                "clusters": [
+                    {"name": name, "cluster": {"server": "https://" + name}}
+                    for name in ("prod", "test")
+                ],
+                "users": [{"name": "me", "user": {"token": "secret"}}],
+                "contexts": [
+                    {"name": name, "context": {"cluster": name, "user": "me"}}
+                    for name in ("prod", "test")
+                ],
+                "current-context": "prod",
+            }
+        )
+    )
+    app.config.update(
+        K8S_CLIENT_CONFIG="kubeconfig",
+        K8S_KUBECONFIG=str(kubeconfig),
+        K8S_CONTEXT="test",
+    )
+
+    assert client.configuration().host == "https://test"
+
+
+def test_unknown_configuration(app):
+    """Unknown ways to connect are refused rather than guessed at."""
+    app.config["K8S_CLIENT_CONFIG"] = "kubectl"
+
+    with pytest.raises(ValueError):
+        client.configuration()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests for k8s.codec."""
+import datetime
+import decimal
+import pickle
+
+import pytest
+
+from k8s import codec
+from k8s import records
+
+
+def _value():
+    """Build a value using every type the codecs handle specially."""
+    return {
+        "items": [
+            records.NodeRow(
+                "node-1",
+                True,
+                "worker",
+                12,
+                (0.5, 1.0, 2.0),
+                decimal.Decimal("0.25"),
+                datetime.datetime(2021, 1, 2, 3, 4, 5),
+            ),
+        ],
+        "raw": records.Resource({"metadata": {"name": "pod-1"}}),
+        "counts": {("tool-a", "Running"): 3},
+        "generated": "2021-01-02 03:04",
+    }
+
+
+def _codec(serializer, compression, **kwargs):
+    """Get a codec, skipping the test if its libraries are missing."""
+    for name, table in (
+        (serializer, codec.SERIALIZERS),
+        (compression, codec.COMPRESSIONS),
+    ):
+        if not table[name][3]:
+            pytest.skip("{} is not installed".format(name))
+    return codec.Codec(serializer, compression, **kwargs)
+
+
+@pytest.mark.parametrize("compression", sorted(codec.COMPRESSIONS))
+@pytest.mark.parametrize("serializer", sorted(codec.SERIALIZERS))
+def test_round_trip(serializer, compression):
+    """Values are read back equal and of the same types."""
+    value = _value()
+    encoder = _codec(serializer, compression)
+
+    decoded = encoder.loads(encoder.dumps(value))
+
+    assert decoded == value
+    row = decoded["items"][0]
+    assert type(row) is records.NodeRow
+    assert type(row.load) is tuple
+    assert type(decoded["raw"]) is records.Resource
+    assert decoded["raw"].metadata.name == "pod-1"
+
+
+def test_values_read_whatever_the_configuration():
+    """A codec reads values written with other serializers and compression."""
+    written = _codec("msgpack", "zlib").dumps(_value())
+
+    assert codec.Codec().loads(written) == _value()
+
+
+def test_msgpack_falls_back_to_pickle():
+    """Values msgpack cannot encode are pickled."""
+    raw = _codec("msgpack", "none").dumps({"names": {"a", "b"}})
+
+    assert raw[len(codec.MAGIC) + 1] == codec.SERIALIZERS["pickle"][0]
+    assert codec.Codec().loads(raw) == {"names": {"a", "b"}}
+
+
+def test_compression_threshold():
+    """Only values of at least ``threshold`` bytes are compressed."""
+    encoder = _codec("pickle", "zlib", threshold=100)
+
+    small = encoder.dumps("x")
+    large = encoder.dumps("x" * 1000)
+
+    assert small[codec.HEADER_SIZE - 1] == 0
+    assert large[codec.HEADER_SIZE - 1] == codec.COMPRESSIONS["zlib"][0]
+    assert len(large) < 1000
+    assert encoder.loads(large) == "x" * 1000
+
+
+def test_other_format_versions_are_missing(monkeypatch):
+    """Values written by another format version read as None."""
+    raw = codec.Codec().dumps(_value())
+    monkeypatch.setattr(codec, "FORMAT_VERSION", codec.FORMAT_VERSION + 1)
+
+    assert codec.Codec().loads(raw) is None
+    assert codec.Codec().loads(codec.Codec().dumps("new")) == "new"
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        pickle.dumps({"plain": "cachelib"}),
+        b"",
+        codec.MAGIC,
+        codec.MAGIC + bytes((codec.FORMAT_VERSION, 99, 0)) + b"data",
+    ],
+)
+def test_unreadable_values_are_missing(raw):
+    """Values without a header or in unknown formats read as None."""
+    assert codec.Codec().loads(raw) is None
+
+
+def test_unknown_codec():
+    """Configuring an unknown serializer or compression fails."""
+    with pytest.raises(ValueError):
+        codec.Codec(serializer="json")
+    with pytest.raises(ValueError):
+        codec.Codec(compression="bzip2")
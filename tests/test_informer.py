@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests for k8s.informer fed from a fake watch stream."""
+import types
+
+import kubernetes
+
+from k8s import aggregates
+from k8s import cache
+from k8s import informer
+from k8s import records
+from k8s import snapshot
+
+
+def _pod(name, version, phase="Running", namespace="tool-a", image="img:1"):
+    """Build a pod as parsed JSON."""
+    return records.Resource(
+        {
+            "metadata": {
+                "namespace": namespace,
+                "name": name,
+                "uid": "uid-" + name,
+                "resourceVersion": str(version),
+            },
+            "spec": {
+                "nodeName": "node-1",
+                "containers": [{"name": "web", "image": image}],
+            },
+            "status": {"phase": phase},
+        }
+    )
+
+
+def _event(kind, obj):
+    return {"type": kind, "object": obj, "raw_object": dict(obj)}
+
+
+def _bookmark(version):
+    return {
+        "type": "BOOKMARK",
+        "object": None,
+        "raw_object": {"metadata": {"resourceVersion": str(version)}},
+    }
+
+
+class FakeList:
+    """List function returning a single page of each list in turn."""
+
+    def __init__(self, *lists):
+        """Serve ``lists`` of (resource version, pods), one per call."""
+        self.lists = list(lists)
+        self.calls = 0
+
+    def __call__(self, limit=None, _continue=None):
+        """Get the next list."""
+        version, items = self.lists[min(self.calls, len(self.lists) - 1)]
+        self.calls += 1
+        return types.SimpleNamespace(
+            items=items,
+            metadata=types.SimpleNamespace(
+                _continue=None, resource_version=str(version)
+            ),
+        )
+
+
+class FakeWatch:
+    """Factory of watches playing scripted streams.
+
+    Each stream is a list of events, or an exception to raise instead. The
+    informer is stopped once every stream has been played.
+    """
+
+    def __init__(self, *streams):
+        """Play ``streams`` in order."""
+        self.streams = list(streams)
+        self.versions = []
+        self.informer = None
+
+    def __call__(self):
+        """Start a watch."""
+        return self
+
+    def stream(self, func, resource_version=None, **kwargs):
+        """Yield the events of the next stream."""
+        self.versions.append(resource_version)
+        if not self.streams:
+            self.informer.stop()
+            return
+        stream = self.streams.pop(0)
+        if isinstance(stream, Exception):
+            raise stream
+        yield from stream
+
+    def stop(self):
+        """Stop watching."""
+
+
+def _informer(list_func, watch):
+    inf = informer.Informer(
+        "pods",
+        list_func,
+        transform=records.pod_record,
+        indexers=snapshot.POD_INDEXERS,
+        aggregates={"totals": aggregates.PodTotals},
+        watch=watch,
+        backoff=0,
+    )
+    watch.informer = inf
+    return inf
+
+
+def test_events_update_store_and_aggregates():
+    """ADDED, MODIFIED and DELETED events are applied in order."""
+    watch = FakeWatch(
+        [
+            _event("ADDED", _pod("b", 11, phase="Pending")),
+            _event("MODIFIED", _pod("a", 12, phase="Succeeded")),
+            _event("MODIFIED", _pod("b", 13, image="img:2")),
+            _event("DELETED", _pod("c", 14)),
+        ]
+    )
+    inf = _informer(FakeList((10, [_pod("a", 1), _pod("c", 2)])), watch)
+
+    inf.run()
+
+    store = inf.store
+    assert inf.synced.is_set()
+    assert sorted(pod.name for pod in store.values()) == ["a", "b"]
+    assert store.get("tool-a", "a").phase == "Succeeded"
+    assert store.get("tool-a", "c") is None
+    assert [pod.name for pod in store.by("phase", "Running")] == ["b"]
+    totals = store.aggregate("totals")
+    assert totals.total == 2
+    assert totals.active == 1
+    assert totals.images == {"img:1": 1, "img:2": 1}
+    assert inf.resource_version == "14"
+    assert watch.versions == ["10", "14"]
+
+
+def test_bookmark_moves_resource_version():
+    """A BOOKMARK only moves the version the watch resumes from."""
+    watch = FakeWatch([_bookmark(20)], [_event("ADDED", _pod("b", 21))])
+    inf = _informer(FakeList((10, [_pod("a", 1)])), watch)
+
+    inf.run()
+
+    assert watch.versions == ["10", "20", "21"]
+    assert sorted(pod.name for pod in inf.store.values()) == ["a", "b"]
+
+
+def test_gone_relists():
+    """A 410 from the watch lists everything again and resumes from there."""
+    watch = FakeWatch(
+        [_event("ADDED", _pod("b", 11))],
+        kubernetes.client.ApiException(status=410, reason="Gone"),
+        [_event("ADDED", _pod("d", 31))],
+    )
+    list_func = FakeList(
+        (10, [_pod("a", 1)]),
+        (30, [_pod("a", 1), _pod("c", 25)]),
+    )
+    inf = _informer(list_func, watch)
+
+    inf.run()
+
+    assert list_func.calls == 2
+    assert watch.versions == ["10", "11", "30", "31"]
+    # b was deleted while we were not watching
+    assert sorted(pod.name for pod in inf.store.values()) == ["a", "c", "d"]
+    assert inf.store.aggregate("totals").total == 3
+
+
+def test_purge_stores_value_from_informer(redis_app, monkeypatch):
+    """Purging an informed collector shares its value through the cache."""
+    inf = _informer(FakeList((1, [_pod("a", 1)])), FakeWatch())
+    inf.relist()
+    monkeypatch.setitem(informer._informers, "pods", inf)
+
+    @informer.informed("pods")
+    @cache.cached("test:informed", 300)
+    def count(cached=True):
+        return len(informer.store("pods"))
+
+    assert count() == 1
+    assert cache.load(count.key()) is None
+    assert count(cached=False) == 1
+    assert cache.load(count.key())[1] == 1
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests for k8s.instrumentation."""
+import types
+
+import kubernetes.client
+import prometheus_client
+import pytest
+
+from k8s import instrumentation
+
+
+@pytest.mark.parametrize(
+    "method, path, params, query, expected",
+    [
+        ("GET", "/api/v1/pods", {}, [], ("list", "pods")),
+        ("GET", "/api/v1/pods", {}, [("watch", True)], ("watch", "pods")),
+        (
+            "GET",
+            "/api/v1/namespaces/{namespace}/pods/{name}",
+            {"namespace": "tool-a", "name": "web"},
+            [],
+            ("get", "pods"),
+        ),
+        (
+            "GET",
+            "/api/v1/namespaces/{namespace}/pods/{name}/log",
+            {"namespace": "tool-a", "name": "web"},
+            [],
+            ("get", "pods/log"),
+        ),
+        (
+            "DELETE",
+            "/apis/apps/v1/namespaces/{namespace}/deployments/{name}",
+            {"namespace": "tool-a", "name": "web"},
+            [],
+            ("delete", "deployments"),
+        ),
+        (
+            "GET",
+            "/apis/{group}/{version}/{plural}",
+            {
+                "group": "metrics.k8s.io",
+                "version": "v1beta1",
+                "plural": "pods",
+            },
+            [],
+            ("list", "metrics.k8s.io/pods"),
+        ),
+        ("GET", "/version/", {}, [], ("get", "version")),
+        ("GET", "/api/v1", {}, [], ("get", "other")),
+    ],
+)
+def test_api_call(method, path, params, query, expected):
+    """Calls are labelled with their verb and resource, not their names."""
+    assert instrumentation.api_call(method, path, params, query) == expected
+
+
+def _sample(name, **labels):
+    value = prometheus_client.REGISTRY.get_sample_value(
+        "k8s_status_api_" + name, labels
+    )
+    return value or 0
+
+
+def _client(result):
+    """Get an instrumented fake ApiClient returning or raising result."""
+
+    def call_api(resource_path, method, path_params, query_params, **kwargs):
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return instrumentation.instrument(types.SimpleNamespace(call_api=call_api))
+
+
+def test_api_calls_are_timed():
+    """Each call is observed under its verb and resource."""
+    labels = {"verb": "get", "resource": "nodes"}
+    before = _sample("request_duration_seconds_count", **labels)
+
+    api = _client("node")
+    result = api.call_api("/api/v1/nodes/{name}", "GET", {"name": "n"})
+
+    assert result == "node"
+    assert _sample("request_duration_seconds_count", **labels) == before + 1
+    assert _sample("errors_total", status="error", **labels) == 0
+
+
+@pytest.mark.parametrize(
+    "error, status",
+    [
+        (kubernetes.client.ApiException(status=404), "404"),
+        (kubernetes.client.ApiException(status=0), "error"),
+        (TimeoutError(), "error"),
+    ],
+)
+def test_api_failures_are_counted(error, status):
+    """Failed calls are timed too and counted by their HTTP status."""
+    labels = {"verb": "list", "resource": "services"}
+    before = _sample("request_duration_seconds_count", **labels)
+    errors = _sample("errors_total", status=status, **labels)
+
+    api = _client(error)
+    with pytest.raises(type(error)):
+        api.call_api("/api/v1/services", "GET", {}, [])
+
+    assert _sample("request_duration_seconds_count", **labels) == before + 1
+    assert _sample("errors_total", status=status, **labels) == errors + 1
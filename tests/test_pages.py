@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests for k8s.pages."""
+import gzip
+
+import brotli
+import pytest
+
+from k8s import cache
+from k8s import pages
+
+
+@pytest.fixture
+def client(redis_app):
+    """Get a test client of an app with a cached page counting renders."""
+    renders = []
+
+    @redis_app.route("/list/")
+    @pages.cached_page
+    def listing():
+        renders.append(1)
+        return "rendered {} times".format(len(renders))
+
+    client = redis_app.test_client()
+    client.renders = renders
+    return client
+
+
+def test_matching_etag_is_not_modified(client):
+    """A request with the ETag of the cached page gets a 304."""
+    first = client.get("/list/")
+    again = client.get(
+        "/list/", headers={"If-None-Match": first.headers["ETag"]}
+    )
+
+    assert first.status_code == 200
+    assert again.status_code == 304
+    assert again.get_data() == b""
+    assert len(client.renders) == 1
+
+
+@pytest.mark.parametrize(
+    "encoding, decompress",
+    [
+        ("br", brotli.decompress),
+        ("gzip", gzip.decompress),
+        ("identity", lambda body: body),
+    ],
+)
+def test_accepted_encoding_is_served(client, encoding, decompress):
+    """Pages are served in the encoding asked for, varying on it."""
+    client.get("/list/")
+
+    resp = client.get("/list/", headers={"Accept-Encoding": encoding})
+
+    assert decompress(resp.get_data()) == b"rendered 1 times"
+    assert resp.headers.get("Content-Encoding", "identity") == encoding
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert len(client.renders) == 1
+
+
+def test_uncacheable_args_render(client):
+    """Free text arguments and purges render the page every time."""
+    client.get("/list/")
+
+    assert client.get("/list/?q=web").get_data() == b"rendered 2 times"
+    assert client.get("/list/?q=web").get_data() == b"rendered 3 times"
+    assert client.get("/list/?purge").get_data() == b"rendered 4 times"
+    # The purge stored its page
+    assert client.get("/list/").get_data() == b"rendered 4 times"
+
+
+def test_new_generation_renders(client):
+    """Pages cached for an older cache generation are not served."""
+    assert client.get("/list/").get_data() == b"rendered 1 times"
+    assert client.get("/list/").get_data() == b"rendered 1 times"
+
+    cache.bump_generation()
+
+    assert client.get("/list/").get_data() == b"rendered 2 times"
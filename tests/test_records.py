@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests for k8s.records."""
+import datetime
+import types
+
+import kubernetes.client
+import orjson
+import pytest
+
+from k8s import records
+
+
+POD = {
+    "apiVersion": "v1",
+    "kind": "Pod",
+    "metadata": {
+        "namespace": "tool-a",
+        "name": "web-1",
+        "uid": "uid-1",
+        "resourceVersion": "42",
+        "creationTimestamp": "2024-01-01T00:00:00Z",
+        "labels": {"app": "web"},
+        "ownerReferences": [
+            {
+                "apiVersion": "apps/v1",
+                "kind": "ReplicaSet",
+                "name": "web",
+                "uid": "uid-rs",
+            }
+        ],
+        "managedFields": [{"manager": "kubectl", "operation": "Update"}],
+    },
+    "spec": {
+        "nodeName": "node-1",
+        "containers": [
+            {
+                "name": "web",
+                "image": "img:1",
+                "resources": {"requests": {"cpu": "250m", "memory": "256Mi"}},
+            },
+            {"name": "sidecar", "image": "img:2"},
+        ],
+    },
+    "status": {
+        "phase": "Running",
+        "startTime": "2024-01-01T00:00:05Z",
+        "containerStatuses": [
+            {
+                "name": "web",
+                "image": "img:1",
+                "imageID": "",
+                "ready": True,
+                "restartCount": 2,
+            },
+            {
+                "name": "sidecar",
+                "image": "img:2",
+                "imageID": "",
+                "ready": False,
+                "restartCount": 1,
+            },
+        ],
+    },
+}
+
+NODE = {
+    "apiVersion": "v1",
+    "kind": "Node",
+    "metadata": {
+        "name": "node-1",
+        "creationTimestamp": "2024-01-01T00:00:00Z",
+        "labels": {"kubernetes.io/role": "worker"},
+    },
+    "status": {
+        "allocatable": {"cpu": "3500m", "memory": "8Gi"},
+        "conditions": [
+            {"type": "MemoryPressure", "status": "False"},
+            {"type": "Ready", "status": "True"},
+        ],
+    },
+}
+
+NAMESPACE = {
+    "apiVersion": "v1",
+    "kind": "Namespace",
+    "metadata": {
+        "name": "tool-a",
+        "creationTimestamp": "2024-01-01T00:00:00Z",
+    },
+}
+
+# Objects with only the fields the API always sets
+BARE_POD = {
+    "metadata": {"namespace": "tool-a", "name": "web-1"},
+    "spec": {"containers": [{"name": "web", "image": "img:1"}]},
+    "status": {"phase": "Pending"},
+}
+BARE_NODE = {"metadata": {"name": "node-1"}, "status": {}}
+
+
+def _at(second):
+    return datetime.datetime(
+        2024, 1, 1, 0, 0, second, tzinfo=datetime.timezone.utc
+    )
+
+
+def _model(obj, kind):
+    """Deserialize a JSON object through the kubernetes.client models."""
+    response = types.SimpleNamespace(data=orjson.dumps(obj))
+    return kubernetes.client.ApiClient().deserialize(response, kind)
+
+
+def test_resource_attributes():
+    """Fields are read by their snake_case names, missing ones as None."""
+    pod = records.Resource(POD)
+
+    assert pod.metadata.resource_version == "42"
+    assert pod.metadata.labels == {"app": "web"}
+    assert pod.spec.node_name == "node-1"
+    assert pod.metadata.deletion_timestamp is None
+    assert pod.spec.containers[1].resources is None
+    assert isinstance(pod.status.container_statuses[0], records.Resource)
+
+
+def test_resource_times_are_datetimes():
+    """Timestamps are parsed like the models parse them."""
+    pod = records.Resource(POD)
+
+    assert pod.metadata.creation_timestamp == _at(0)
+    assert pod.status.start_time == _at(5)
+    assert pod.status.start_time == _model(POD, "V1Pod").status.start_time
+
+
+def test_resource_is_not_a_mapping_of_dunders():
+    """Special names are not looked up as fields."""
+    with pytest.raises(AttributeError):
+        records.Resource(POD).__deepcopy__
+
+
+def test_pod_record():
+    """Pods are projected to the fields list views render."""
+    assert records.pod_record(records.Resource(POD)) == records.PodRecord(
+        "tool-a",
+        "web-1",
+        "uid-1",
+        "42",
+        "Running",
+        "node-1",
+        _at(5),
+        {"app": "web"},
+        (("ReplicaSet", "web"),),
+        (
+            records.ContainerRecord("web", "img:1", True, 2),
+            records.ContainerRecord("sidecar", "img:2", False, 1),
+        ),
+        1,
+        3,
+        0.25,
+        256 * 2.0**20,
+    )
+
+
+def test_pod_record_missing_fields():
+    """Pods which are not scheduled or started yet can be projected."""
+    assert records.pod_record(records.Resource(BARE_POD)) == records.PodRecord(
+        "tool-a",
+        "web-1",
+        None,
+        None,
+        "Pending",
+        None,
+        None,
+        {},
+        (),
+        (records.ContainerRecord("web", "img:1", False, 0),),
+        0,
+        0,
+        0.0,
+        0.0,
+    )
+
+
+def test_node_record():
+    """Nodes are projected with their readiness and capacity."""
+    node = records.node_record(records.Resource(NODE))
+
+    assert node == records.NodeRecord(
+        "node-1",
+        {"kubernetes.io/role": "worker"},
+        "True",
+        {"cpu": "3500m", "memory": "8Gi"},
+        _at(0),
+        3.5,
+        8 * 2.0**30,
+    )
+
+
+def test_node_record_missing_fields():
+    """Nodes which report no status yet can be projected."""
+    assert records.node_record(
+        records.Resource(BARE_NODE)
+    ) == records.NodeRecord("node-1", {}, None, {}, None, 0.0, 0.0)
+
+
+@pytest.mark.parametrize(
+    "project, obj, kind",
+    [
+        (records.pod_record, POD, "V1Pod"),
+        (records.pod_record, BARE_POD, "V1Pod"),
+        (records.node_record, NODE, "V1Node"),
+        (records.node_record, BARE_NODE, "V1Node"),
+        (records.namespace_record, NAMESPACE, "V1Namespace"),
+        (records.object_record, POD, "V1Service"),
+    ],
+)
+def test_raw_json_matches_models(project, obj, kind):
+    """Records projected from orjson and from the models are the same."""
+    raw = records.Resource(orjson.loads(orjson.dumps(obj)))
+
+    assert project(raw) == project(_model(obj, kind))
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("250m", 0.25),
+        ("2", 2.0),
+        ("1k", 1000.0),
+        ("64Mi", 2.0**26),
+        (0, 0.0),
+    ],
+)
+def test_quantity(value, expected):
+    """Quantities are parsed to floats."""
+    assert records.quantity(value) == expected
+
+
+def test_quantity_is_memoized():
+    """Repeated quantity strings are only parsed once."""
+    records.quantity("123Mi")
+    hits = records.quantity.cache_info().hits
+
+    records.quantity("123Mi")
+
+    assert records.quantity.cache_info().hits == hits + 1
+
+
+def test_pod_derived_fields():
+    """Readiness, restarts and requests are totalled over containers."""
+    pod = records.Resource(
+        {
+            "metadata": {"namespace": "tool-a", "name": "web-1"},
+            "spec": {
+                "containers": [
+                    {
+                        "name": "a",
+                        "resources": {
+                            "requests": {"cpu": "1", "memory": "1Gi"}
+                        },
+                    },
+                    {"name": "b", "resources": {"requests": {"cpu": "500m"}}},
+                    {"name": "c", "resources": {"limits": {"cpu": "2"}}},
+                    # Not reported on yet
+                    {"name": "d"},
+                ]
+            },
+            "status": {
+                "containerStatuses": [
+                    {"name": "a", "ready": True, "restartCount": 3},
+                    {"name": "b", "ready": True, "restartCount": 0},
+                    {"name": "c", "ready": False, "restartCount": 4},
+                ]
+            },
+        }
+    )
+
+    record = records.pod_record(pod)
+
+    assert [c.ready for c in record.containers] == [True, True, False, False]
+    assert [c.restarts for c in record.containers] == [3, 0, 4, 0]
+    assert (record.ready, record.restarts) == (2, 7)
+    assert (record.cpu, record.memory) == (1.5, 2.0**30)
+
+
+def test_container_usage():
+    """The usage of a pod is the sum of that of its containers."""
+    metrics = {
+        "containers": [
+            {"name": "a", "usage": {"cpu": "100m", "memory": "64Mi"}},
+            {"name": "b", "usage": {"cpu": "150m", "memory": "32Mi"}},
+        ]
+    }
+
+    assert records.container_usage(metrics) == (0.25, 96 * 2.0**20)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests for k8s.refresh."""
+import collections
+import concurrent.futures
+import threading
+import types
+
+import pytest
+
+from k8s import cache
+from k8s import client
+from k8s import informer
+from k8s import refresh
+
+
+@pytest.fixture
+def collectors(monkeypatch):
+    """Add a collector and one derived from it to k8s.client.
+
+    Returns the items the parent collects and the number of times each
+    collector was called.
+    """
+    items = ["a", "b"]
+    calls = collections.Counter()
+
+    @cache.cached("test:parent", 300)
+    def get_parent(cached=True):
+        calls["parent"] += 1
+        return {"items": list(items)}
+
+    @cache.cached("test:child", 300)
+    def get_child(cached=True):
+        calls["child"] += 1
+        return {"count": len(get_parent(cached=cached)["items"])}
+
+    monkeypatch.setattr(client, "get_parent", get_parent, raising=False)
+    monkeypatch.setattr(client, "get_child", get_child, raising=False)
+    return items, calls
+
+
+def test_round_derives_from_inputs_refreshed_in_it(redis_app, collectors):
+    """A derived value reflects its input after a single round."""
+    items, calls = collectors
+    # Derived collectors listed first are the worst case
+    schedule = [
+        {"collector": "get_child", "interval": 60},
+        {"collector": "get_parent", "interval": 60},
+    ]
+    assert client.get_child()["count"] == 2
+    items.append("c")
+    calls.clear()
+    before = cache.generation()
+
+    refresh.Refresher(redis_app, schedule=schedule, jitter=0).run(once=True)
+
+    assert client.get_parent()["items"] == ["a", "b", "c"]
+    assert client.get_child()["count"] == 3
+    assert calls == {"parent": 1, "child": 1}
+    assert cache.generation() == before + 1
+
+
+def test_round_reads_inputs_scheduled_less_often(redis_app, collectors):
+    """Inputs with a longer interval are not recomputed by shorter rounds."""
+    items, calls = collectors
+    redis_app.config["CACHE_PURGE_INTERVAL"] = 0
+    schedule = [
+        {"collector": "get_parent", "interval": 600},
+        {"collector": "get_child", "interval": 240},
+    ]
+    refresher = refresh.Refresher(redis_app, schedule=schedule, jitter=0)
+    assert client.get_child()["count"] == 2
+    items.append("c")
+    calls.clear()
+
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        jobs = [refresh.Job("get_child", (), 240, True)]
+        refresher._round(executor, 240, jobs)
+        assert calls == {"child": 1}
+        assert client.get_child()["count"] == 2
+
+        jobs = [refresh.Job("get_parent", (), 600, True)]
+        refresher._round(executor, 600, jobs)
+        assert calls == {"child": 1, "parent": 1}
+        assert client.get_parent()["items"] == ["a", "b", "c"]
+
+
+def test_round_of_per_item_entries_keeps_generation(redis_app, collectors):
+    """Entries which do not invalidate leave the generation alone."""
+    items, calls = collectors
+    schedule = [
+        {"collector": "get_parent", "interval": 60, "invalidate": False}
+    ]
+    client.get_parent()
+    items.append("c")
+    before = cache.generation()
+
+    refresh.Refresher(redis_app, schedule=schedule, jitter=0).run(once=True)
+
+    assert client.get_parent()["items"] == ["a", "b", "c"]
+    assert cache.generation() == before
+
+
+def test_round_computes_informed_values_once(redis_app, monkeypatch):
+    """Values computed from informer stores are computed once per round."""
+    synced = threading.Event()
+    synced.set()
+    store = ["a", "b"]
+    monkeypatch.setitem(
+        informer._informers,
+        "things",
+        types.SimpleNamespace(synced=synced, store=store),
+    )
+    calls = collections.Counter()
+
+    @informer.informed("things")
+    @cache.cached("test:parent", 300)
+    def get_parent(cached=True):
+        calls["parent"] += 1
+        return {"items": list(informer.store("things"))}
+
+    @informer.informed("things")
+    @cache.cached("test:child", 300)
+    def get_child(cached=True):
+        calls["child"] += 1
+        return {"count": len(get_parent(cached=cached)["items"])}
+
+    @cache.cached("test:other", 300)
+    def get_other(cached=True):
+        calls["other"] += 1
+        return {"first": get_parent(cached=cached)["items"][0]}
+
+    monkeypatch.setattr(client, "get_parent", get_parent, raising=False)
+    monkeypatch.setattr(client, "get_child", get_child, raising=False)
+    monkeypatch.setattr(client, "get_other", get_other, raising=False)
+    schedule = [
+        {"collector": "get_child", "interval": 60},
+        {"collector": "get_other", "interval": 60},
+        {"collector": "get_parent", "interval": 60},
+    ]
+    redis_app.config["CACHE_PURGE_INTERVAL"] = 0
+    store.append("c")
+
+    refresh.Refresher(redis_app, schedule=schedule, jitter=0).run(once=True)
+
+    assert calls == {"parent": 1, "child": 1, "other": 1}
+    assert cache.load(get_child.key())[1] == {"count": 3}
+    assert cache.load(get_other.key())[1] == {"first": "a"}
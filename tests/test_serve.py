@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests for k8s.serve."""
+import signal
+import sys
+
+import app
+import gevent
+import gevent.pywsgi
+
+from k8s import serve
+
+
+def test_server_uses_configured_concurrency(app):
+    """Requests are handled in a pool of SERVE_CONCURRENCY greenlets."""
+    app.config["SERVE_CONCURRENCY"] = 12
+
+    http = serve.server(app, "127.0.0.1", 0)
+
+    assert http.application is app
+    assert http.pool.size == 12
+    assert http.address == ("127.0.0.1", 0)
+    assert serve.server(app, concurrency=3).pool.size == 3
+
+
+def test_main_serves_the_app(monkeypatch):
+    """The entry point patches I/O, then serves the app until stopped."""
+    calls = []
+    monkeypatch.setattr(serve, "patch", lambda: calls.append("patch"))
+    monkeypatch.setattr(
+        gevent.pywsgi.WSGIServer,
+        "serve_forever",
+        lambda self: calls.append(self),
+    )
+    monkeypatch.setattr(
+        gevent, "signal_handler", lambda *args: calls.append(args)
+    )
+    monkeypatch.setattr(
+        sys, "argv", ["serve", "--port", "8080", "--concurrency", "7"]
+    )
+
+    serve.main()
+
+    patched, (signum, stop, timeout), http = calls
+    assert patched == "patch"
+    assert signum == signal.SIGTERM
+    assert (stop, timeout) == (http.stop, 5)
+    assert http.application is app.app
+    assert http.address == ("0.0.0.0", 8080)
+    assert http.pool.size == 7
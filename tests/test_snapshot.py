@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests for k8s.snapshot."""
+import datetime
+
+import pytest
+
+from k8s import aggregates
+from k8s import informer
+from k8s import records
+from k8s import snapshot
+
+
+def _pod(name, version, phase="Running", namespace="tool-a", image="img:1"):
+    """Build a PodRecord with a single container."""
+    return records.PodRecord(
+        namespace,
+        name,
+        "uid-" + name,
+        str(version),
+        phase,
+        "node-1",
+        None,
+        {},
+        (),
+        (records.ContainerRecord("web", image, True, 0),),
+        1,
+        0,
+        0.0,
+        0.0,
+    )
+
+
+def _items(*pods):
+    return [(snapshot.record_key(pod), pod) for pod in pods]
+
+
+def _totals(store):
+    totals = store.aggregate("totals")
+    return {
+        "total": totals.total,
+        "active": totals.active,
+        "namespaces": dict(totals.namespaces),
+        "active_namespaces": dict(totals.active_namespaces),
+        "images": dict(totals.images),
+    }
+
+
+@pytest.fixture(params=[snapshot.Snapshot, informer.Store])
+def store(request):
+    """Get an empty pod store with totals, as a Snapshot and a Store."""
+    return request.param(
+        indexers=snapshot.POD_INDEXERS,
+        aggregates={"totals": aggregates.PodTotals},
+    )
+
+
+def _update(store, *pods):
+    return store.update(_items(*pods), version=snapshot.pod_version)
+
+
+def test_latest_start_by_namespace(store):
+    """The latest start time of a namespace follows its pods."""
+    first, last = (
+        datetime.datetime(2024, 1, 1, hour, tzinfo=datetime.timezone.utc)
+        for hour in (1, 2)
+    )
+    a = _pod("a", 1)._replace(start_time=first)
+    b = _pod("b", 1)._replace(start_time=last)
+    _update(store, a, b, _pod("c", 1), _pod("d", 1, namespace="tool-b"))
+    totals = store.aggregate("totals")
+
+    assert totals.latest_start("tool-a") == last
+    assert totals.latest_start("tool-b") is None
+    assert totals.latest_start("tool-c") is None
+
+    _update(store, a, _pod("c", 1))
+    totals = store.aggregate("totals")
+
+    assert totals.latest_start("tool-a") == first
+    assert "tool-b" not in totals.starts
+
+
+def test_update_adds(store):
+    """New objects are indexed and counted."""
+    changes = _update(
+        store,
+        _pod("a", 1),
+        _pod("b", 1, phase="Pending", image="img:2"),
+        _pod("c", 1, phase="Succeeded", namespace="tool-b"),
+    )
+
+    assert changes == (3, 0, 0)
+    assert _totals(store) == {
+        "total": 3,
+        "active": 2,
+        "namespaces": {"tool-a": 2, "tool-b": 1},
+        "active_namespaces": {"tool-a": 2},
+        "images": {"img:1": 2, "img:2": 1},
+    }
+    assert store.counts("phase") == {
+        "Running": 1,
+        "Pending": 1,
+        "Succeeded": 1,
+    }
+
+
+def test_update_modifies_changed_versions_only(store):
+    """Objects are re-counted only when their version changes."""
+    _update(store, _pod("a", 1), _pod("b", 1))
+
+    changes = _update(
+        store,
+        _pod("a", 2, phase="Succeeded", image="img:2"),
+        _pod("b", 1, phase="Failed"),
+    )
+
+    assert changes == (0, 1, 0)
+    assert _totals(store) == {
+        "total": 2,
+        "active": 1,
+        "namespaces": {"tool-a": 2},
+        "active_namespaces": {"tool-a": 1},
+        "images": {"img:1": 1, "img:2": 1},
+    }
+    assert [pod.name for pod in store.by("phase", "Succeeded")] == ["a"]
+    assert store.keys("image") == ["img:1", "img:2"]
+
+
+def test_update_deletes(store):
+    """Objects missing from an update are uncounted and unindexed."""
+    _update(
+        store,
+        _pod("a", 1),
+        _pod("b", 1, namespace="tool-b", image="img:2"),
+    )
+
+    changes = _update(store, _pod("a", 1))
+
+    assert changes == (0, 0, 1)
+    assert _totals(store) == {
+        "total": 1,
+        "active": 1,
+        "namespaces": {"tool-a": 1},
+        "active_namespaces": {"tool-a": 1},
+        "images": {"img:1": 1},
+    }
+    assert store.keys("namespace") == ["tool-a"]
+    assert store.by("image", "img:2") == []
+
+
+def test_updates_match_a_rebuild(store):
+    """Aggregates after any churn equal those of a fresh snapshot."""
+    rounds = [
+        [_pod(name, 1) for name in "abcd"],
+        [
+            _pod("a", 2, phase="Succeeded"),
+            _pod("b", 1),
+            _pod("e", 1, namespace="tool-b", image="img:2"),
+        ],
+        [
+            _pod("b", 2, phase="Pending", namespace="tool-b"),
+            _pod("e", 2, phase="Failed", image="img:3"),
+            _pod("f", 1),
+        ],
+        [],
+    ]
+    for pods in rounds:
+        _update(store, *pods)
+        rebuilt = snapshot.Snapshot(
+            _items(*pods),
+            snapshot.POD_INDEXERS,
+            {"totals": aggregates.PodTotals},
+        )
+        assert _totals(store) == _totals(rebuilt)
+        for index in snapshot.POD_INDEXERS:
+            assert store.counts(index) == rebuilt.counts(index)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of k8s-status
+#
+# Copyright (c) 2019 Bryan Davis and contributors
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Tests for k8s.tables."""
+import flask
+import pytest
+
+from k8s import tables
+
+
+NAMES = ["tool-{}".format(name) for name in "dbeacgf"]
+
+
+@pytest.fixture
+def table():
+    """Get a table of (name, size) rows sortable by either."""
+    rows = [(name, len(NAMES) - i) for i, name in enumerate(NAMES)]
+    return tables.Table(
+        rows,
+        {"name": lambda row: row[0], "size": lambda row: row[1]},
+        text=lambda row: row[0].upper(),
+    )
+
+
+def _names(page):
+    return [row[0] for row in page.rows]
+
+
+def test_default_sort(table):
+    """The first column sorts rows unless told otherwise."""
+    page = table.window(limit=3)
+
+    assert _names(page) == ["tool-a", "tool-b", "tool-c"]
+    assert (page.total, page.page, page.pages, page.sort) == (7, 1, 3, "name")
+
+
+@pytest.mark.parametrize("sort", ["-name", "--name"])
+def test_descending_pages(table, sort):
+    """Descending pages walk the sort order backwards."""
+    pages = [table.window(sort=sort, page=n, limit=3) for n in (1, 2, 3)]
+
+    assert [_names(page) for page in pages] == [
+        ["tool-g", "tool-f", "tool-e"],
+        ["tool-d", "tool-c", "tool-b"],
+        ["tool-a"],
+    ]
+    assert {page.sort for page in pages} == {"-name"}
+
+
+def test_sort_by_other_column(table):
+    """Rows sort by the key of the chosen column."""
+    page = table.window(sort="-size", limit=2)
+
+    assert [row[1] for row in page.rows] == [7, 6]
+    assert _names(page) == ["tool-d", "tool-b"]
+
+
+def test_filtered_pages(table):
+    """Queries match the text of rows case-insensitively before paging."""
+    rows = [("web-a", 1), ("api-b", 2), ("web-c", 3), ("WEB-d", 4)]
+    filtered = tables.Table(rows, {"size": lambda row: row[1]}, text=str)
+
+    first = filtered.window(sort="-size", query="Web", limit=2)
+    second = filtered.window(sort="-size", query="Web", page=2, limit=2)
+
+    assert _names(first) == ["WEB-d", "web-c"]
+    assert _names(second) == ["web-a"]
+    assert (second.total, second.pages, second.query) == (3, 2, "Web")
+
+
+def test_pages_past_the_end(table):
+    """Pages past the end show the last page, and page 0 the first."""
+    last = table.window(page=99, limit=3)
+    first = table.window(page=0, limit=3)
+    nothing = table.window(query="nomatch", page=5, limit=3)
+
+    assert (_names(last), last.page) == (["tool-g"], 3)
+    assert (_names(first), first.page) == (["tool-a", "tool-b", "tool-c"], 1)
+    assert (nothing.rows, nothing.total, nothing.page) == ([], 0, 1)
+    assert nothing.pages == 1
+
+
+def test_unknown_sort_uses_default(table):
+    """Unknown columns fall back to the default sort."""
+    page = table.window(sort="-nope", limit=2)
+
+    assert (_names(page), page.sort) == (["tool-a", "tool-b"], "name")
+
+
+def test_select_matches_window(table):
+    """select() yields the rows of all pages in order."""
+    pages = [table.window(sort="-size", page=n, limit=2) for n in (1, 2, 3, 4)]
+
+    assert list(table.select(sort="-size")) == [
+        row for page in pages for row in page.rows
+    ]
+
+
+def test_window_from_request(app, table):
+    """The request picks the window; invalid numbers use the defaults."""
+    app.config.update(TABLE_PAGE_SIZE=2, TABLE_MAX_PAGE_SIZE=4)
+
+    with app.test_request_context("/?sort=-name&page=2&limit=x"):
+        page = tables.window(table)
+        assert _names(page) == ["tool-e", "tool-d"]
+        assert flask.g.table_args == {
+            "sort": "-name",
+            "page": "2",
+            "limit": "2",
+        }
+    with app.test_request_context("/?page=-1&limit=50"):
+        page = tables.window(table)
+        assert (page.page, page.limit) == (1, 4)
+
+
+def test_url_ignores_args_named_like_view_args(app):
+    """Query parameters cannot collide with the view's arguments."""
+    app.add_url_rule("/namespaces/<namespace>/", "namespace")
+
+    query = "?namespace=x&_external=1&_anchor=a&sort=name&q=web"
+    with app.test_request_context("/namespaces/tool-0/" + query):
+        url = tables.url(page=2)
+
+    assert url == "/namespaces/tool-0/?sort=name&q=web&page=2"